@@ -0,0 +1,350 @@
+"""main.py の同期パイプライン用ベンチマーク
+
+使い方:
+    python benchmark.py fetch --playlists 40 --items 500 --latency 0.05
+    python benchmark.py delta --playlists 40 --new-items 10
+    python benchmark.py store --rows 17000 1000000
+    python benchmark.py vectorize --rows 1000000
+    python benchmark.py dedupe --rows 1000000 --new-items 500
+    API_CACHE_MODE=record API_CACHE_DIR=api-cache python main.py  # 一度だけ録画
+    python benchmark.py replay --cache-dir api-cache
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+import httplib2
+from googleapiclient.errors import HttpError
+
+import main
+
+
+# ----------------------------------------
+# playlistItems().list のローカルフェイク
+# ----------------------------------------
+
+class FakeRequest:
+    def __init__(self, service, playlist_id, page_token):
+        self.service = service
+        self.playlist_id = playlist_id
+        self.page_token = page_token
+        self.headers = {}
+
+    def execute(self):
+        return self.service.page(self.playlist_id, self.page_token, self.headers.get('If-None-Match'))
+
+
+class FakePlaylistItems:
+    def __init__(self, service):
+        self.service = service
+
+    def list(self, part, playlistId, maxResults=50, pageToken=None):
+        return FakeRequest(self.service, playlistId, pageToken)
+
+
+class FakeYouTube:
+    """playlistItems().list(...).execute() だけを模したフェイククライアント
+
+    項目は新しいものが先頭に並び、先頭ページはETagによる条件付きリクエストに対応する。
+    """
+
+    def __init__(self, item_counts, latency=0.0, page_size=50):
+        self.item_counts = item_counts
+        self.latency = latency
+        self.page_size = page_size
+        self.calls = 0
+
+    def playlistItems(self):
+        return FakePlaylistItems(self)
+
+    def page(self, playlist_id, page_token, if_none_match=None):
+        self.calls += 1
+        time.sleep(self.latency)
+        count = self.item_counts[playlist_id]
+        etag = f'etag-{playlist_id}-{count}'
+        if page_token is None and if_none_match == etag:
+            raise HttpError(httplib2.Response({'status': 304}), b'')
+        start = int(page_token or 0)
+        end = min(start + self.page_size, count)
+        items = [{
+            'id': f'{playlist_id}-item-{i}',
+            'snippet': {
+                'title': f'video {i}',
+                'channelTitle': 'owner',
+                'videoOwnerChannelTitle': f'channel {i % 50}',
+                'publishedAt': '2025-08-05T03:44:27Z',
+                'resourceId': {'videoId': f'{playlist_id[-4:]}{i:07d}'},
+            },
+        } for i in reversed(range(count - end, count - start))]
+        response = {'etag': etag, 'items': items}
+        if end < count:
+            response['nextPageToken'] = str(end)
+        return response
+
+
+def make_playlists(count, items):
+    return [{
+        'title': f'RECOMMEND MUSIC {i}',
+        'playlist_id': f'PLfake{i:04d}',
+        'video_count': items,
+    } for i in range(count)]
+
+
+# ----------------------------------------
+# ベンチマーク
+# ----------------------------------------
+
+def bench_fetch(args):
+    playlists = make_playlists(args.playlists, args.items)
+    item_counts = {p['playlist_id']: p['video_count'] for p in playlists}
+
+    # 従来方式: 1クライアントで直列取得し、ページごとに固定スリープ
+    fake = FakeYouTube(item_counts, args.latency)
+    started = time.perf_counter()
+    for playlist in playlists:
+        nextPageToken = None
+        while True:
+            response = fake.playlistItems().list(
+                part='snippet', playlistId=playlist['playlist_id'], pageToken=nextPageToken
+            ).execute()
+            time.sleep(args.legacy_sleep)
+            nextPageToken = response.get('nextPageToken')
+            if not nextPageToken:
+                break
+    serial = time.perf_counter() - started
+
+    clients = []
+
+    def client_factory():
+        client = FakeYouTube(item_counts, args.latency)
+        clients.append(client)
+        return client
+
+    started = time.perf_counter()
+    results = main.fetch_playlists_concurrently(
+        playlists,
+        client_factory=client_factory,
+        max_workers=args.workers,
+        rate_limiter=main.TokenBucket(args.rate, args.burst),
+    )
+    concurrent = time.perf_counter() - started
+
+    fetched = sum(len(videos) for _, videos, _ in results)
+    assert fetched == args.playlists * args.items, fetched
+    print(f'pages: {fake.calls}, items: {fetched}, clients built: {len(clients)}')
+    print(f'serial (sleep={args.legacy_sleep}s/page): {serial:.2f}s')
+    print(f'concurrent (workers={args.workers}, rate={args.rate}/s): {concurrent:.2f}s')
+    print(f'speedup: {serial / concurrent:.1f}x')
+
+
+def bench_delta(args):
+    playlists = make_playlists(args.playlists, args.items)
+    item_counts = {p['playlist_id']: p['video_count'] for p in playlists}
+    fake = FakeYouTube(item_counts, args.latency)
+
+    def run(sync_state):
+        calls = fake.calls
+        started = time.perf_counter()
+        results = main.fetch_playlists_concurrently(
+            playlists, client_factory=lambda: fake, rate_limiter=main.TokenBucket(0), sync_state=sync_state
+        )
+        elapsed = time.perf_counter() - started
+        appended = sum(len(videos) for _, videos, _ in results)
+        return results, fake.calls - calls, elapsed, appended
+
+    results, pages, elapsed, appended = run(None)
+    print(f'initial full sync: {pages} pages, {appended} items, {elapsed:.2f}s')
+    sync_state = {playlist['playlist_id']: sync_entry for playlist, _, sync_entry in results}
+
+    _, pages, elapsed, appended = run(sync_state)
+    print(f'unchanged (304): {pages} pages, {appended} items, {elapsed:.2f}s')
+
+    # 最初のプレイリストにだけ新着を追加
+    item_counts[playlists[0]['playlist_id']] += args.new_items
+    playlists[0]['video_count'] += args.new_items
+    _, pages, elapsed, appended = run(None)
+    print(f'full refetch after {args.new_items} new: {pages} pages, {appended} items, {elapsed:.2f}s')
+    _, pages, elapsed, appended = run(sync_state)
+    print(f'delta after {args.new_items} new: {pages} pages, {appended} items, {elapsed:.2f}s')
+
+
+def make_main_data(rows, seed=0):
+    """main-data.csv と同じ形の合成データ（チャンネル約4000・プレイリスト40）"""
+    rng = np.random.default_rng(seed)
+    dates = pd.Timestamp('2020-01-01', tz='UTC') + pd.to_timedelta(
+        rng.integers(0, 5 * 365 * 24 * 3600, rows), unit='s')
+    return pd.DataFrame({
+        'id': np.arange(1, rows + 1),
+        'title': [f'【歌ってみた】synthetic cover {i} / Covered by VTuber' for i in range(rows)],
+        'channel': pd.Series(rng.integers(0, 4000, rows)).map(lambda i: f'チャンネル {i} Ch.'),
+        'date': dates.strftime('%Y-%m-%dT%H:%M:%SZ'),
+        'url': [f'https://www.youtube.com/watch?v={i:011d}' for i in range(rows)],
+        'playlist': pd.Series(rng.integers(1, 41, rows)).map(lambda i: f'Gilzaren III RECOMMEND MUSIC {i:02d}'),
+    })
+
+
+def timed(func):
+    started = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - started
+
+
+def bench_store(args):
+    for rows in args.rows:
+        df = make_main_data(rows)
+        with tempfile.TemporaryDirectory() as tmp:
+            main.MAIN_DATA_CSV = os.path.join(tmp, 'main-data.csv')
+            df.to_csv(main.MAIN_DATA_CSV, index=False)
+            typed = main.to_typed_main_data(df)
+
+            print(f'--- {rows} rows')
+            raw, load = timed(lambda: pd.read_csv(main.MAIN_DATA_CSV))
+            print(f'{"csv (untyped)":>14}: load {load:.3f}s, memory {raw.memory_usage(deep=True).sum() / 2**20:.1f} MiB')
+
+            for backend in ['csv', 'parquet', 'feather']:
+                main.MAIN_DATA_STORE = None if backend == 'csv' else os.path.join(tmp, f'main-data.{backend}')
+                _, save = timed(lambda: main.save_main_data(typed))
+                loaded, load = timed(main.load_main_data)
+                path = main.MAIN_DATA_STORE or main.MAIN_DATA_CSV
+                print(f'{backend:>14}: save {save:.3f}s, load {load:.3f}s, '
+                      f'size {os.path.getsize(path) / 2**20:.1f} MiB, '
+                      f'memory {loaded.memory_usage(deep=True).sum() / 2**20:.1f} MiB')
+
+
+def bench_dedupe(args):
+    results = [({'title': 'bench', 'playlist_id': 'PLbench'}, [{
+        'title': f'new video {i}',
+        'channel': 'channel',
+        'date': f'2023-06-{1 + i % 28:02d}T00:00:00Z',
+        'url': f'https://www.youtube.com/watch?v=new{i:08d}',
+        'playlist': 'bench',
+    } for i in range(args.new_items)], {'item_ids': []})]
+
+    for rows in args.rows:
+        df = main.to_typed_main_data(make_main_data(rows))
+        print(f'--- {rows} rows + {args.new_items} new')
+        with tempfile.TemporaryDirectory() as tmp:
+            main.MAIN_DATA_STORE = os.path.join(tmp, 'main-data.parquet')
+            main.PLAYLISTS_CSV = os.path.join(tmp, 'playlists.csv')
+
+            # 従来方式: 追記してから全体を重複削除・並べ替え・id振り直し
+            main.DEDUPE_INDEX_DB = None
+            main.save_main_data(df)
+            _, legacy = timed(lambda: (main.save_sync_results(results), main.clean_and_sort_main_data()))
+
+            main.DEDUPE_INDEX_DB = os.path.join(tmp, 'dedupe.sqlite3')
+            main.save_main_data(df)
+            _, build = timed(lambda: main.save_sync_results(results))  # 初回は索引の作成を含む
+            _, indexed = timed(lambda: main.save_sync_results(results))
+            print(f'legacy append + clean_and_sort: {legacy:.3f}s')
+            print(f'index first run (build): {build:.3f}s, next run: {indexed:.3f}s')
+
+
+def bench_replay(args):
+    """録画済みのAPIレスポンスだけで、プレイリスト一覧と全プレイリストの取得を計測する"""
+    main.API_CACHE_DIR = args.cache_dir
+    main.API_CACHE_MODE = 'replay'
+    clients = []
+
+    def client_factory():
+        client = main.build_youtube_client()
+        clients.append(client._http)
+        return client
+
+    playlists, list_time = timed(lambda: main.get_playlists(main.API_KEY, main.CHANNEL_ID))
+    results, fetch_time = timed(lambda: main.fetch_playlists_concurrently(
+        playlists, client_factory=client_factory, max_workers=args.workers, rate_limiter=main.TokenBucket(0)))
+    fetched = sum(len(videos) for _, videos, _ in results)
+    pages = sum(http.hits for http in clients)
+    print(f'playlists: {len(playlists)} ({list_time:.3f}s)')
+    print(f'fetched {len(results)} playlists, {pages} pages, {fetched} items in {fetch_time:.3f}s')
+
+
+def bench_vectorize(args):
+    rng = np.random.default_rng(0)
+    rows = args.rows
+    ids = pd.Series([f'PL{i:020d}' for i in range(rows)], dtype=object)
+    as_url = rng.random(rows) < 0.5
+    pids = ids.where(~as_url, 'https://www.youtube.com/playlist?list=' + ids)
+    pids[rng.random(rows) < 0.01] = np.nan
+    titles = pd.Series([f'Gilzaren III RECOMMEND MUSIC {i}' if i % 3 else f'Extra episode {i}a'
+                        for i in range(rows)])
+    counts = pd.DataFrame({'playlist_id': ids, 'count': rng.integers(0, 500, rows)})
+    playlist_map = dict(zip(ids[::2], rng.integers(0, 500, len(ids[::2]))))
+
+    def update_count(row):
+        return playlist_map.get(row['playlist_id'], row['count'])
+
+    cases = [
+        ('normalize_playlist_id',
+         lambda: pids.apply(main.normalize_playlist_id),
+         lambda: main.normalize_playlist_ids(pids)),
+        ('extract_number_from_title',
+         lambda: titles.apply(main.extract_number_from_title),
+         lambda: main.extract_numbers_from_titles(titles)),
+        ('to_playlist_url',
+         lambda: ids.apply(main.to_playlist_url),
+         lambda: main.to_playlist_urls(ids)),
+        ('update_count',
+         lambda: counts.apply(update_count, axis=1),
+         lambda: counts['playlist_id'].map(playlist_map).fillna(counts['count']).astype(counts['count'].dtype)),
+    ]
+
+    print(f'--- {rows} rows')
+    for name, scalar, vector in cases:
+        expected, scalar_time = timed(scalar)
+        actual, vector_time = timed(vector)
+        pd.testing.assert_series_equal(actual.astype(object), expected.astype(object), check_names=False)
+        print(f'{name:>26}: apply {scalar_time:.3f}s, vectorized {vector_time:.3f}s '
+              f'({scalar_time / vector_time:.1f}x)')
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    fetch = subparsers.add_parser('fetch', help='直列取得と並列取得の実行時間を比較')
+    fetch.add_argument('--playlists', type=int, default=10)
+    fetch.add_argument('--items', type=int, default=500)
+    fetch.add_argument('--latency', type=float, default=0.05, help='1ページあたりの擬似レイテンシ（秒）')
+    fetch.add_argument('--legacy-sleep', type=float, default=0.1, help='従来方式のページごとの固定スリープ（秒）')
+    fetch.add_argument('--workers', type=int, default=main.FETCH_WORKERS)
+    fetch.add_argument('--rate', type=float, default=main.API_RATE_LIMIT)
+    fetch.add_argument('--burst', type=int, default=main.API_RATE_BURST)
+    fetch.set_defaults(func=bench_fetch)
+
+    delta = subparsers.add_parser('delta', help='全件取得と差分同期のページ数を比較')
+    delta.add_argument('--playlists', type=int, default=10)
+    delta.add_argument('--items', type=int, default=500)
+    delta.add_argument('--new-items', type=int, default=10)
+    delta.add_argument('--latency', type=float, default=0.01)
+    delta.set_defaults(func=bench_delta)
+
+    store = subparsers.add_parser('store', help='CSVと列指向ストアの読み書き時間・メモリを比較')
+    store.add_argument('--rows', type=int, nargs='+', default=[17000, 1000000])
+    store.set_defaults(func=bench_store)
+
+    vectorize = subparsers.add_parser('vectorize', help='apply と列単位処理の結果一致と速度を比較')
+    vectorize.add_argument('--rows', type=int, default=1000000)
+    vectorize.set_defaults(func=bench_vectorize)
+
+    dedupe = subparsers.add_parser('dedupe', help='追記後の全体整理と重複判定インデックスを比較')
+    dedupe.add_argument('--rows', type=int, nargs='+', default=[17000, 1000000])
+    dedupe.add_argument('--new-items', type=int, default=500)
+    dedupe.set_defaults(func=bench_dedupe)
+
+    replay = subparsers.add_parser('replay', help='録画済みのAPIレスポンスでオフラインに取得処理を計測')
+    replay.add_argument('--cache-dir', default=main.API_CACHE_DIR or 'api-cache')
+    replay.add_argument('--workers', type=int, default=main.FETCH_WORKERS)
+    replay.set_defaults(func=bench_replay)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main_cli()
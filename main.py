@@ -1,9 +1,24 @@
 import os
 import re
+import json
+import base64
+import hashlib
 import time
 import shutil
+import sqlite3
+import tempfile
+import threading
+from collections import Counter, defaultdict
+from contextlib import contextmanager, nullcontext
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+import httplib2
+import numpy as np
 import pandas as pd
 from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
+from googleapiclient.http import build_http
 from dotenv import load_dotenv
 
 # 環境変数の読み込み
@@ -13,9 +28,20 @@ API_KEY = os.getenv('YOUTUBE_API_KEY')
 CHANNEL_ID = os.getenv('CHANNEL_ID')
 PLAYLISTS_CSV = os.getenv('PLAYLISTS_CSV')
 MAIN_DATA_CSV = os.getenv('MAIN_DATA_CSV')
+MAIN_DATA_STORE = os.getenv('MAIN_DATA_STORE')  # .parquet / .feather を指定すると列指向ストアを使う
 CATEGORIZE_CSV = os.getenv('CATEGORIZE_CSV')
 FILTERED_DATA_CSV = os.getenv('FILTERED_DATA_CSV')
 OUTPUT_PATH = os.getenv('OUTPUT_PATH')
+FETCH_WORKERS = int(os.getenv('FETCH_WORKERS', '4'))
+API_RATE_LIMIT = float(os.getenv('API_RATE_LIMIT', '10'))  # 1秒あたりのAPIリクエスト数（0以下で無制限）
+API_RATE_BURST = int(os.getenv('API_RATE_BURST', '10'))
+API_CACHE_DIR = os.getenv('API_CACHE_DIR')  # 設定するとAPIのレスポンスをディスクにキャッシュする
+API_CACHE_TTL = float(os.getenv('API_CACHE_TTL', '3600'))  # キャッシュの有効期間（秒）
+API_CACHE_MODE = os.getenv('API_CACHE_MODE', 'cache')  # cache / record（常に取得して保存）/ replay（キャッシュのみ）
+SYNC_REPORT_JSON = os.getenv('SYNC_REPORT_JSON')  # 実行ごとの計測結果（JSON）の出力先
+SYNC_METRICS_PROM = os.getenv('SYNC_METRICS_PROM')  # node_exporter の textfile collector 用の出力先（.prom）
+SYNC_STATE_JSON = os.getenv('SYNC_STATE_JSON')  # 設定すると差分同期モード（ETag・取得済みID）
+DEDUPE_INDEX_DB = os.getenv('DEDUPE_INDEX_DB')  # 設定すると重複判定を永続インデックスで行い、id を振り直さない
 
 # ----------------------------------------
 # ユーティリティ関数
@@ -34,13 +60,372 @@ def to_playlist_url(playlist_id):
     """playlist IDからURLを生成"""
     return f"https://www.youtube.com/playlist?list={playlist_id}"
 
+# 以下は上記関数のSeries版（行ごとの apply を使わずに列単位で処理する）
+
+def extract_numbers_from_titles(titles):
+    """extract_number_from_title のSeries版"""
+    numbers = titles.astype('string').str.extract(r'(\d+)$', expand=False)
+    return pd.to_numeric(numbers).fillna(-1).astype('int64')
+
+def normalize_playlist_ids(pids):
+    """normalize_playlist_id のSeries版（文字列以外はそのまま）"""
+    # split('list=')[1] と同じく、最初の list= から次の list= までを取り出す
+    ids = pids.astype('string').str.extract(r'list=(.*?)(?:list=|\Z)', flags=re.DOTALL, expand=False)
+    return pids.mask(ids.notna().to_numpy(dtype=bool), ids.astype(object))
+
+def to_playlist_urls(playlist_ids):
+    """to_playlist_url のSeries版"""
+    return 'https://www.youtube.com/playlist?list=' + playlist_ids.astype(str)
+
+class TokenBucket:
+    """スレッド間で共有するトークンバケット方式のレートリミッタ"""
+
+    def __init__(self, rate, capacity=None, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.capacity = capacity if capacity else max(1, int(rate))
+        self.tokens = float(self.capacity)
+        self._clock = clock
+        self._sleep = sleep
+        self._updated_at = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """トークンを1つ消費する（足りなければ補充されるまで待機）"""
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = self._clock()
+                self.tokens = min(self.capacity, self.tokens + (now - self._updated_at) * self.rate)
+                self._updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            self._sleep(wait)
+
+# ----------------------------------------
+# 計測
+# ----------------------------------------
+
+QUOTA_COSTS = {'playlists.list': 1, 'playlistItems.list': 1}  # APIの呼び出し1回あたりのクォータ消費量
+VERB_METHODS = {'GET': 'list', 'POST': 'insert', 'PUT': 'update', 'DELETE': 'delete'}  # Data API のメソッド名
+LATENCY_BUCKETS = [0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]  # ページ取得時間のヒストグラムの境界（秒）
+
+class SyncMetrics:
+    """1回の同期処理の計測値（APIの呼び出し・クォータ・ページの取得時間・行数・処理ごとの時間）
+
+    main() が実行ごとに作り、各処理に sync_metrics として渡す。ワーカースレッドからも
+    記録するのでロックで守る。時間の計測は入れ子になった同じ名前を二重に数えない
+    （CSV保存の中の atomic_to_csv など）。
+    """
+
+    def __init__(self, clock=time.perf_counter):
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.started_at = datetime.now(timezone.utc)
+        self.started = clock()
+        self.calls = Counter()
+        self.statuses = Counter()
+        self.bytes = 0
+        self.network_seconds = 0.0
+        self.cache_hits = 0
+        self.latency_buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.timers = defaultdict(float)
+        self.rows = Counter()
+        self.playlists = []
+
+    def record_call(self, endpoint, seconds, size, status):
+        with self._lock:
+            self.calls[endpoint] += 1
+            self.statuses[str(status)] += 1
+            self.bytes += size
+            self.network_seconds += seconds
+            self.latency_buckets[next((i for i, le in enumerate(LATENCY_BUCKETS) if seconds <= le), -1)] += 1
+
+    def record_cache_hit(self):
+        with self._lock:
+            self.cache_hits += 1
+
+    def record_playlist(self, playlist, pages, seconds, items):
+        with self._lock:
+            self.playlists.append({
+                'playlist_id': playlist['playlist_id'],
+                'title': playlist['title'],
+                'pages': pages,
+                'seconds': round(seconds, 3),
+                'items': items,
+            })
+
+    def add_rows(self, kind, count):
+        with self._lock:
+            self.rows[kind] += count
+
+    @contextmanager
+    def timer(self, name):
+        depth = getattr(self._local, name, 0)
+        setattr(self._local, name, depth + 1)
+        started = self._clock()
+        try:
+            yield
+        finally:
+            setattr(self._local, name, depth)
+            if depth == 0:
+                with self._lock:
+                    self.timers[name] += self._clock() - started
+
+    def quota_units(self):
+        return sum(QUOTA_COSTS.get(endpoint, 1) * count for endpoint, count in self.calls.items())
+
+    def report(self):
+        with self._lock:
+            cumulative = 0
+            histogram = {}
+            for le, count in zip([*map(str, LATENCY_BUCKETS), '+Inf'], self.latency_buckets):
+                cumulative += count
+                histogram[le] = cumulative
+            return {
+                'started_at': self.started_at.isoformat(timespec='seconds'),
+                'duration_seconds': round(self._clock() - self.started, 3),
+                'api': {
+                    'calls': dict(self.calls),
+                    'quota_units': self.quota_units(),
+                    'statuses': dict(self.statuses),
+                    'bytes': self.bytes,
+                    'network_seconds': round(self.network_seconds, 3),
+                    'cache_hits': self.cache_hits,
+                    'page_latency_seconds': histogram,
+                },
+                'timers': {name: round(seconds, 3) for name, seconds in self.timers.items()},
+                'rows': dict(self.rows),
+                'playlists': sorted(self.playlists, key=lambda p: p['seconds'], reverse=True),
+            }
+
+    def prometheus(self, report=None):
+        """Prometheus のテキスト形式"""
+        report = report or self.report()
+        api = report['api']
+        lines = [
+            '# HELP youtube_sync_api_calls YouTube Data API calls in the last sync run.',
+            '# TYPE youtube_sync_api_calls gauge',
+            *(f'youtube_sync_api_calls{{endpoint="{endpoint}"}} {count}' for endpoint, count in sorted(api['calls'].items())),
+            '# HELP youtube_sync_quota_units Estimated quota units used by the last sync run.',
+            '# TYPE youtube_sync_quota_units gauge',
+            f'youtube_sync_quota_units {api["quota_units"]}',
+            '# HELP youtube_sync_api_bytes Response bytes received from the API in the last sync run.',
+            '# TYPE youtube_sync_api_bytes gauge',
+            f'youtube_sync_api_bytes {api["bytes"]}',
+            '# HELP youtube_sync_api_cache_hits Requests served from the local API cache.',
+            '# TYPE youtube_sync_api_cache_hits gauge',
+            f'youtube_sync_api_cache_hits {api["cache_hits"]}',
+            '# HELP youtube_sync_page_latency_seconds Latency of API page requests in the last sync run.',
+            '# TYPE youtube_sync_page_latency_seconds histogram',
+            *(f'youtube_sync_page_latency_seconds_bucket{{le="{le}"}} {count}' for le, count in api['page_latency_seconds'].items()),
+            f'youtube_sync_page_latency_seconds_sum {api["network_seconds"]}',
+            f'youtube_sync_page_latency_seconds_count {sum(api["calls"].values())}',
+            '# HELP youtube_sync_phase_seconds Time spent per phase in the last sync run.',
+            '# TYPE youtube_sync_phase_seconds gauge',
+            *(f'youtube_sync_phase_seconds{{phase="{name}"}} {seconds}' for name, seconds in sorted(report['timers'].items())),
+            '# HELP youtube_sync_rows Rows parsed from the API and written to main-data in the last sync run.',
+            '# TYPE youtube_sync_rows gauge',
+            *(f'youtube_sync_rows{{kind="{kind}"}} {count}' for kind, count in sorted(report['rows'].items())),
+            '# HELP youtube_sync_duration_seconds Wall time of the last sync run.',
+            '# TYPE youtube_sync_duration_seconds gauge',
+            f'youtube_sync_duration_seconds {report["duration_seconds"]}',
+            '# HELP youtube_sync_last_run_timestamp_seconds Start time of the last sync run.',
+            '# TYPE youtube_sync_last_run_timestamp_seconds gauge',
+            f'youtube_sync_last_run_timestamp_seconds {self.started_at.timestamp():.0f}',
+        ]
+        return '\n'.join(lines) + '\n'
+
+    def write(self, report_json=None, prometheus_path=None):
+        """JSONのレポートとPrometheusのテキストファイルを書き出す（指定されたものだけ）"""
+        report = self.report()
+        if report_json:
+            atomic_write(report_json, lambda f: json.dump(report, f, ensure_ascii=False, indent=2), suffix='.json')
+        if prometheus_path:
+            atomic_write(prometheus_path, lambda f: f.write(self.prometheus(report)), suffix='.prom')
+        return report
+
+class NullMetrics:
+    """計測しないときに SyncMetrics の代わりに渡す（記録はすべて捨てる）"""
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: None
+
+    def timer(self, name):
+        return nullcontext()
+
+NO_METRICS = NullMetrics()
+
+def api_method(uri, method):
+    """リクエストから Data API のメソッド名を求める
+
+    /youtube/v3/playlistItems への GET → playlistItems.list、
+    /youtube/v3/videos/getRating への GET → videos.getRating。
+    """
+    path = urlsplit(uri).path.strip('/')
+    resource, _, action = path.split('youtube/v3/', 1)[-1].partition('/')
+    return f"{resource}.{action or VERB_METHODS.get(method, method.lower())}"
+
+class MeteredHttp:
+    """httplib2.Http を包み、実際に送ったリクエストの件数・時間・バイト数を sync_metrics に記録する"""
+
+    def __init__(self, http=None, sync_metrics=NO_METRICS):
+        self.http = http or build_http()
+        self.metrics = sync_metrics
+
+    def __getattr__(self, name):
+        return getattr(self.http, name)
+
+    def request(self, uri, method='GET', *args, **kwargs):
+        started = time.perf_counter()
+        response, content = self.http.request(uri, method, *args, **kwargs)
+        self.metrics.record_call(api_method(uri, method), time.perf_counter() - started,
+                                 len(content or b''), response.status)
+        return response, content
+
+def read_csv(path, sync_metrics=NO_METRICS):
+    """pd.read_csv（読み込み時間を sync_metrics の pandas_io に含める）"""
+    with sync_metrics.timer('pandas_io'):
+        return pd.read_csv(path)
+
+# ----------------------------------------
+# APIレスポンスのキャッシュ
+# ----------------------------------------
+
+class CacheMiss(Exception):
+    """replay モードでキャッシュにないリクエストが来た"""
+
+def read_cache_entry(path):
+    """キャッシュファイルを読み込む（読めなければ None）"""
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def cache_entry_expired(entry, ttl, now):
+    """保存時刻（stored_at）から有効期間を過ぎたか（ファイルの mtime はコピーや touch で変わるので見ない）"""
+    return now - entry.get('stored_at', 0) > ttl
+
+class CachingHttp:
+    """httplib2.Http を包み、GETのレスポンスをディスクに保存・再生する
+
+    mode:
+      cache  有効期間内のキャッシュがあれば使い、なければ取得して保存する
+      record 常に取得して保存する（フィクスチャの録画用）
+      replay キャッシュだけを使う（有効期間は見ない、なければ CacheMiss）
+
+    キーとファイルにはAPIキー（key パラメータ）を含めない。If-None-Match が
+    キャッシュしたレスポンスの ETag と一致すれば 304 を返す。
+    """
+
+    def __init__(self, cache_dir, ttl=API_CACHE_TTL, mode=API_CACHE_MODE, http=None, clock=time.time,
+                 sync_metrics=NO_METRICS):
+        if mode not in ('cache', 'record', 'replay'):
+            raise ValueError(f'API_CACHE_MODE が不正です: {mode}')
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.mode = mode
+        self.http = http or MeteredHttp(sync_metrics=sync_metrics)
+        self.metrics = sync_metrics
+        self._clock = clock
+        self.hits = self.misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def __getattr__(self, name):
+        return getattr(self.http, name)
+
+    @staticmethod
+    def redact(uri):
+        """URIから key パラメータを除く"""
+        parts = urlsplit(uri)
+        query = urlencode([(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k != 'key'])
+        return urlunsplit(parts._replace(query=query))
+
+    def path(self, uri):
+        return os.path.join(self.cache_dir, hashlib.sha256(self.redact(uri).encode()).hexdigest() + '.json')
+
+    def load(self, path):
+        entry = read_cache_entry(path)
+        if entry is None or (self.mode == 'cache' and cache_entry_expired(entry, self.ttl, self._clock())):
+            return None
+        return entry
+
+    @staticmethod
+    def body_etag(content):
+        """Data API はレスポンス本文にも etag を持つ"""
+        try:
+            return json.loads(content).get('etag')
+        except ValueError:
+            return None
+
+    def request(self, uri, method='GET', body=None, headers=None, *args, **kwargs):
+        if method != 'GET':
+            return self.http.request(uri, method, body, headers, *args, **kwargs)
+
+        path = self.path(uri)
+        entry = self.load(path) if self.mode != 'record' else None
+        if entry is None:
+            if self.mode == 'replay':
+                raise CacheMiss(f'キャッシュにありません: {self.redact(uri)}')
+            self.misses += 1
+            response, content = self.http.request(uri, method, body, headers, *args, **kwargs)
+            if response.status != 200:
+                return response, content
+            entry = {
+                'uri': self.redact(uri),
+                'stored_at': self._clock(),
+                'headers': dict(response),
+                'content': base64.b64encode(content).decode('ascii'),
+            }
+            atomic_write(path, lambda f: json.dump(entry, f), suffix='.json')
+            return response, content
+
+        self.hits += 1
+        self.metrics.record_cache_hit()
+        content = base64.b64decode(entry['content'])
+        if_none_match = (headers or {}).get('If-None-Match') or (headers or {}).get('if-none-match')
+        if if_none_match and if_none_match == entry['headers'].get('etag', self.body_etag(content)):
+            return httplib2.Response({'status': 304}), b''
+        return httplib2.Response(entry['headers']), content
+
+def prune_api_cache(cache_dir=None, ttl=API_CACHE_TTL, clock=time.time):
+    """有効期間を過ぎたキャッシュファイル（読めないものを含む）を削除し、削除した件数を返す
+
+    期限は CachingHttp.load と同じく、ファイルに記録した stored_at で判定する。
+    """
+    cache_dir = cache_dir or API_CACHE_DIR
+    if not cache_dir or not os.path.isdir(cache_dir):
+        return 0
+    removed = 0
+    now = clock()
+    for file in os.scandir(cache_dir):
+        if not file.name.endswith('.json') or file.name.startswith('.tmp-'):  # 書き込み中の一時ファイルは残す
+            continue
+        entry = read_cache_entry(file.path)
+        if entry is None or cache_entry_expired(entry, ttl, now):
+            os.remove(file.path)
+            removed += 1
+    return removed
+
 # ----------------------------------------
 # YouTube API 操作
 # ----------------------------------------
 
-def get_playlists(api_key, channel_id):
+def build_youtube_client(api_key=None, sync_metrics=NO_METRICS):
+    """YouTube APIクライアントを生成（API_CACHE_DIR があればレスポンスキャッシュを挟む）"""
+    if API_CACHE_DIR:
+        http = CachingHttp(API_CACHE_DIR, API_CACHE_TTL, API_CACHE_MODE, sync_metrics=sync_metrics)
+    else:
+        http = MeteredHttp(sync_metrics=sync_metrics)
+    return build('youtube', 'v3', developerKey=api_key or API_KEY, http=http)
+
+def get_playlists(api_key, channel_id, sync_metrics=NO_METRICS):
     """YouTube APIからプレイリスト一覧を取得"""
-    youtube = build('youtube', 'v3', developerKey=api_key)
+    youtube = build_youtube_client(api_key, sync_metrics)
     playlists = []
     nextPageToken = None
 
@@ -70,43 +455,261 @@ def get_playlists(api_key, channel_id):
 # CSV操作
 # ----------------------------------------
 
-def update_csv_counts(csv_path, youtube_playlists):
+def atomic_write(path, write, suffix='', binary=False):
+    """write(f) で一時ファイルに書き出してからrenameで置き換える（途中で落ちても元ファイルは壊れない）"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix='.tmp-', suffix=suffix, dir=directory)
+    try:
+        with (os.fdopen(fd, 'wb') if binary else os.fdopen(fd, 'w', encoding='utf-8', newline='')) as f:
+            write(f)
+        # mkstemp は 0600 で作るので、既存ファイルのパーミッションを引き継ぐ
+        os.chmod(tmp_path, os.stat(path).st_mode & 0o777 if os.path.exists(path) else 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+def atomic_to_csv(df, csv_path, sync_metrics=NO_METRICS):
+    """DataFrameをCSVとして一時ファイル経由で保存"""
+    with sync_metrics.timer('pandas_io'):
+        atomic_write(csv_path, lambda f: df.to_csv(f, index=False), suffix='.csv')
+
+def update_csv_counts(csv_path, youtube_playlists, sync_metrics=NO_METRICS):
     """CSV内のcount列をYouTube上の実数で更新"""
-    df = pd.read_csv(csv_path)
-    df['playlist_id'] = df['url'].apply(normalize_playlist_id)
+    df = read_csv(csv_path, sync_metrics)
+    df['playlist_id'] = normalize_playlist_ids(df['url'])
     playlist_map = {p['playlist_id']: p['video_count'] for p in youtube_playlists}
 
-    def update_count(row):
-        return playlist_map.get(row['playlist_id'], row['count'])
-
-    df['count'] = df.apply(update_count, axis=1)
+    df['count'] = df['playlist_id'].map(playlist_map).fillna(df['count']).astype(df['count'].dtype)
     df.drop(columns=['playlist_id'], inplace=True)
-    df.to_csv(csv_path, index=False)
+    atomic_to_csv(df, csv_path, sync_metrics)
 
     print('✅ count を更新しました')
 
+def load_sync_state(path=None):
+    """差分同期用の状態（プレイリストごとのETagと取得済みplaylistItem ID）を読み込む"""
+    path = path or SYNC_STATE_JSON
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+def save_sync_state(sync_state, path=None):
+    """差分同期用の状態を一時ファイル経由で保存"""
+    path = path or SYNC_STATE_JSON
+    atomic_write(path, lambda f: json.dump(sync_state, f, ensure_ascii=False), suffix='.json')
+
+# ----------------------------------------
+# メインデータストア
+# ----------------------------------------
+
+MAIN_DATA_COLUMNS = ['id', 'title', 'channel', 'date', 'url', 'playlist']
+LOCAL_TIMEZONE = 'Asia/Tokyo'  # タイムゾーンのない旧形式の日付（"2024/7/8 8:00" など）は日本時間とみなす
+
+def parse_dates(dates):
+    """日付の列を datetime64[UTC] にする（タイムゾーンのない値は LOCAL_TIMEZONE の時刻として変換する）"""
+    text = dates.astype('string').str.strip()
+    naive = ~text.str.contains(r'(?:Z|[+-]\d{2}:?\d{2})$', na=True).to_numpy(dtype=bool)
+    parsed = pd.to_datetime(text.mask(naive), format='mixed', utc=True)
+    if naive.any():
+        local = pd.to_datetime(text[naive], format='mixed').dt.tz_localize(LOCAL_TIMEZONE)
+        parsed[naive] = local.dt.tz_convert('UTC')
+    return parsed
+
+def to_typed_main_data(df):
+    """main-dataの列を型付けする（date: datetime64[UTC], channel/playlist: category）"""
+    df = df.reindex(columns=MAIN_DATA_COLUMNS)
+    df['id'] = df['id'].astype('int64')
+    if not pd.api.types.is_datetime64_any_dtype(df['date']):
+        df['date'] = parse_dates(df['date'])
+    df['channel'] = df['channel'].astype('category')
+    df['playlist'] = df['playlist'].astype('category')
+    return df
+
+def to_csv_frame(df):
+    """CSV出力用に日付をISO 8601文字列へ戻す"""
+    df = df.copy()
+    df['date'] = df['date'].dt.strftime('%Y-%m-%dT%H:%M:%SZ')
+    return df
+
+def main_data_exists():
+    return bool(MAIN_DATA_STORE and os.path.exists(MAIN_DATA_STORE)) or os.path.exists(MAIN_DATA_CSV)
+
+def load_main_data(sync_metrics=NO_METRICS):
+    """main-dataを型付きDataFrameで読み込む（列指向ストアがなければCSVから移行）"""
+    with sync_metrics.timer('pandas_io'):
+        if MAIN_DATA_STORE and os.path.exists(MAIN_DATA_STORE):
+            if MAIN_DATA_STORE.endswith('.feather'):
+                df = pd.read_feather(MAIN_DATA_STORE)
+            else:
+                df = pd.read_parquet(MAIN_DATA_STORE)
+        elif os.path.exists(MAIN_DATA_CSV):
+            df = pd.read_csv(MAIN_DATA_CSV)
+        else:
+            df = pd.DataFrame({'id': pd.Series(dtype='int64')})
+        return to_typed_main_data(df)
+
+def merge_sorted(df_sorted, df_new):
+    """日付の新しい順に並んだ df_sorted に df_new を挿入する（全体の並べ替えはしない）
+
+    同じ日付なら既存の行を先に置く。
+    """
+    df_new = df_new.sort_values('date', ascending=False, kind='stable')
+    if df_sorted.empty:
+        return df_new.reset_index(drop=True)
+    existing_dates = df_sorted['date'].to_numpy(dtype='datetime64[ns]')[::-1]  # 昇順
+    n, m = len(df_sorted), len(df_new)
+    # 各新規行の前に来る既存行の数（日付が同じか新しい行）
+    positions = n - np.searchsorted(existing_dates, df_new['date'].to_numpy(dtype='datetime64[ns]'), side='left')
+
+    order = np.empty(n + m, dtype='int64')
+    order[positions + np.arange(m)] = np.arange(n, n + m)
+    order[np.arange(n) + np.searchsorted(positions, np.arange(n), side='right')] = np.arange(n)
+    return pd.concat([df_sorted, df_new], ignore_index=True).take(order).reset_index(drop=True)
+
+def save_main_data(df, sync_metrics=NO_METRICS):
+    """main-dataを保存（列指向ストアが設定されていればCSVは書かない）"""
+    with sync_metrics.timer('pandas_io'):
+        df = to_typed_main_data(df)
+        if MAIN_DATA_STORE:
+            if MAIN_DATA_STORE.endswith('.feather'):
+                write = lambda f: df.reset_index(drop=True).to_feather(f)
+            else:
+                write = lambda f: df.to_parquet(f, index=False)
+            atomic_write(MAIN_DATA_STORE, write, suffix=os.path.splitext(MAIN_DATA_STORE)[1], binary=True)
+        else:
+            atomic_to_csv(to_csv_frame(df), MAIN_DATA_CSV, sync_metrics)
+
+# ----------------------------------------
+# 重複判定インデックス
+# ----------------------------------------
+
+def extract_video_ids(urls):
+    """URLから動画IDを取り出す（取り出せなければURLそのもの）"""
+    urls = urls.astype('string')
+    return urls.str.extract(r'[?&]v=([^&#]+)', expand=False).fillna(urls)
+
+class DedupeIndex:
+    """取得済みの動画ID → main-data の id を保持するSQLiteの索引
+
+    with ブロックを抜けるときにコミットし、例外ならロールバックする。
+    main-data の保存が終わってからコミットすれば、保存に失敗しても索引だけが進むことはない。
+    """
+
+    def __init__(self, path):
+        self.conn = sqlite3.connect(path)
+        self.conn.execute('CREATE TABLE IF NOT EXISTS videos (video_id TEXT PRIMARY KEY, id INTEGER NOT NULL)')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.conn.commit()
+        else:
+            self.conn.rollback()
+        self.conn.close()
+
+    def __len__(self):
+        return self.conn.execute('SELECT COUNT(*) FROM videos').fetchone()[0]
+
+    def max_id(self):
+        return self.conn.execute('SELECT COALESCE(MAX(id), 0) FROM videos').fetchone()[0]
+
+    def known(self, video_ids, chunk_size=500):
+        """video_ids のうち登録済みのもの"""
+        video_ids = list(video_ids)
+        found = set()
+        for start in range(0, len(video_ids), chunk_size):
+            chunk = video_ids[start:start + chunk_size]
+            placeholders = ','.join('?' * len(chunk))
+            found.update(row[0] for row in self.conn.execute(
+                f'SELECT video_id FROM videos WHERE video_id IN ({placeholders})', chunk))
+        return found
+
+    def add(self, video_ids, ids):
+        self.conn.executemany('INSERT INTO videos (video_id, id) VALUES (?, ?)', zip(video_ids, map(int, ids)))
+
+def build_dedupe_index(index, df):
+    """既存の main-data から索引を作る（初回のみ、重複削除と並べ替えもここで一度だけ行う）"""
+    df = df[~extract_video_ids(df['url']).duplicated()]
+    df = df.sort_values(by='date', ascending=False, kind='stable').reset_index(drop=True)
+    index.add(extract_video_ids(df['url']), df['id'])
+    return df
+
+def append_with_index(index, df_existing, df_new):
+    """未登録の動画だけに新しい id を振って日付順の位置に挿入し、(結合後, 追加した行) を返す
+
+    追加した行は df_new での行ラベルを保つ。
+    """
+    if not len(index) and not df_existing.empty:
+        df_existing = build_dedupe_index(index, df_existing)
+
+    video_ids = extract_video_ids(df_new['url'])
+    is_new = ~video_ids.duplicated() & ~video_ids.isin(index.known(video_ids.unique()))
+    df_new = df_new[is_new.to_numpy()]
+    video_ids = video_ids[is_new].reset_index(drop=True)
+
+    max_id = max(index.max_id(), df_existing['id'].max() if not df_existing.empty else 0)
+    df_new.insert(0, 'id', range(max_id + 1, max_id + 1 + len(df_new)))
+    index.add(video_ids, df_new['id'])
+    return merge_sorted(df_existing, df_new), df_new
+
 # ----------------------------------------
 # データ取得・比較処理
 # ----------------------------------------
 
-def fetch_playlist_data(playlist):
-    youtube = build('youtube', 'v3', developerKey=API_KEY)
+def fetch_playlist_items(youtube, playlist, rate_limiter=None, sync_entry=None, sync_metrics=NO_METRICS):
+    """プレイリスト内の動画をページングしながら取得し、(videos, sync_entry) を返す
+
+    sync_entry（前回の先頭ページETagと取得済みplaylistItem ID）を渡すと差分だけを取得する。
+    先頭ページが304なら何も取得せず、既知の項目に到達して増加分をすべて拾った時点で
+    ページングを打ち切る。
+    """
     playlist_id = playlist['playlist_id']
     playlist_title = playlist['title']
+    known_ids = set(sync_entry['item_ids']) if sync_entry else set()
+    expected_new = playlist.get('video_count', 0) - len(known_ids)
+    # 項目数が減っていれば削除された項目がある。既知のIDを引き継ぐと削除分が残るので、
+    # 全ページを読んで実際に見えたIDだけを保存する
+    can_stop_early = expected_new >= 0
 
     videos = []
+    item_ids = []
+    etag = None
+    reached_known = False
     nextPageToken = None
+    pages = 0
+    started = time.perf_counter()
     while True:
+        if rate_limiter is not None:
+            rate_limiter.acquire()
         request = youtube.playlistItems().list(
             part='snippet',
             playlistId=playlist_id,
             maxResults=50,
             pageToken=nextPageToken
         )
-        response = request.execute()
-        time.sleep(1)
+        if sync_entry and sync_entry.get('etag') and nextPageToken is None:
+            request.headers['If-None-Match'] = sync_entry['etag']
+        pages += 1
+        try:
+            response = request.execute()
+        except HttpError as e:
+            if e.resp.status == 304:
+                sync_metrics.record_playlist(playlist, pages, time.perf_counter() - started, 0)
+                return [], sync_entry
+            raise
+
+        if nextPageToken is None:
+            etag = response.get('etag')
 
         for item in response['items']:
+            item_ids.append(item['id'])
+            if item['id'] in known_ids:
+                reached_known = True
+                continue
+
             snippet = item['snippet']
             video_id = snippet['resourceId']['videoId']
             video_title = snippet['title']
@@ -125,50 +728,121 @@ def fetch_playlist_data(playlist):
         nextPageToken = response.get('nextPageToken')
         if not nextPageToken:
             break
+        if can_stop_early and reached_known and len(videos) >= expected_new:
+            # 残りのページは取得済みの項目だけなので打ち切る
+            item_ids = list(known_ids.union(item_ids))
+            break
 
-    if os.path.exists(MAIN_DATA_CSV):
-        df_existing = pd.read_csv(MAIN_DATA_CSV)
-        max_id = df_existing['id'].max() if not df_existing.empty else 0
-    else:
-        df_existing = pd.DataFrame()
-        max_id = 0
-
-    df_new = pd.DataFrame(videos)
-    df_new.insert(0, 'id', range(max_id + 1, max_id + 1 + len(df_new)))
+    sync_metrics.record_playlist(playlist, pages, time.perf_counter() - started, len(videos))
+    sync_metrics.add_rows('parsed', len(videos))
+    return videos, {'etag': etag, 'item_ids': item_ids}
+
+def fetch_playlists_concurrently(playlists, client_factory=None, max_workers=FETCH_WORKERS,
+                                 rate_limiter=None, sync_state=None, sync_metrics=NO_METRICS):
+    """複数プレイリストを並列に取得し、(playlist, videos, sync_entry) のリストを入力順で返す
+
+    クライアントはワーカースレッドごとに1つだけ生成して使い回す（既定は build_youtube_client）。
+    sync_state を渡すとプレイリストごとに差分取得する。
+    取得に失敗したプレイリストは結果から除外する。
+    """
+    if rate_limiter is None:
+        rate_limiter = TokenBucket(API_RATE_LIMIT, API_RATE_BURST)
+    if client_factory is None:
+        client_factory = lambda: build_youtube_client(sync_metrics=sync_metrics)
+
+    worker = threading.local()
+
+    def init_worker():
+        worker.youtube = client_factory()
+
+    def fetch(playlist):
+        sync_entry = sync_state.get(playlist['playlist_id']) if sync_state else None
+        return fetch_playlist_items(worker.youtube, playlist, rate_limiter, sync_entry, sync_metrics)
+
+    results = []
+    with ThreadPoolExecutor(max_workers=max(1, max_workers), initializer=init_worker) as executor:
+        futures = [(playlist, executor.submit(fetch, playlist)) for playlist in playlists]
+        for playlist, future in futures:
+            try:
+                videos, sync_entry = future.result()
+                results.append((playlist, videos, sync_entry))
+            except Exception as e:
+                print(f"❌ プレイリスト『{playlist['title']}』の取得に失敗しました: {e}")
+
+    return results
+
+def fetch_playlist_data(playlist, sync_metrics=NO_METRICS):
+    """単一プレイリストを取得してCSVに保存"""
+    rate_limiter = TokenBucket(API_RATE_LIMIT, API_RATE_BURST)
+    youtube = build_youtube_client(sync_metrics=sync_metrics)
+    videos, sync_entry = fetch_playlist_items(youtube, playlist, rate_limiter, sync_metrics=sync_metrics)
+    save_sync_results([(playlist, videos, sync_entry)], sync_metrics)
+
+def save_sync_results(results, sync_metrics=NO_METRICS):
+    """取得結果をまとめてmain-data.csvとplaylists.csvに1回ずつ書き込む
+
+    results は (playlist, videos, sync_entry) のリスト。どちらのファイルも読み込み1回・
+    書き込み1回で済ませ、書き込みは一時ファイル経由で置き換える。
+    """
+    if not results:
+        return
 
-    df_combined = pd.concat([df_existing, df_new], ignore_index=True) if not df_existing.empty else df_new
-    df_combined.to_csv(MAIN_DATA_CSV, index=False)
+    # main-data
+    df_existing = load_main_data(sync_metrics)
 
-    print(f"✅ プレイリスト『{playlist_title}』の動画データを {MAIN_DATA_CSV} に追記しました（{len(df_new)}件）")
+    df_new = pd.DataFrame([video for _, videos, _ in results for video in videos],
+                          columns=['title', 'channel', 'date', 'url', 'playlist'])
+    df_new['date'] = parse_dates(df_new['date'])
 
+    if DEDUPE_INDEX_DB:
+        with DedupeIndex(DEDUPE_INDEX_DB) as index:
+            df_combined, df_new = append_with_index(index, df_existing, df_new)
+            save_main_data(df_combined, sync_metrics)
+    else:
+        max_id = df_existing['id'].max() if not df_existing.empty else 0
+        df_new.insert(0, 'id', range(max_id + 1, max_id + 1 + len(df_new)))
+        df_combined = pd.concat([df_existing, df_new], ignore_index=True) if not df_existing.empty else df_new
+        save_main_data(df_combined, sync_metrics)
+
+    sync_metrics.add_rows('written', len(df_new))
+    # プレイリストごとの書き込み件数（重複として捨てた行は数えない）
+    sources = np.repeat(np.arange(len(results)), [len(videos) for _, videos, _ in results])
+    written = np.bincount(sources[df_new.index], minlength=len(results))
+    for (playlist, _, _), count in zip(results, written):
+        print(f"✅ プレイリスト『{playlist['title']}』の動画データを追記しました（{count}件）")
+    print(f"✅ {MAIN_DATA_STORE or MAIN_DATA_CSV} に合計 {len(df_new)} 件を書き込みました")
+
+    # playlists.csv
     if os.path.exists(PLAYLISTS_CSV):
-        df_playlists = pd.read_csv(PLAYLISTS_CSV)
-        df_playlists['playlist_id'] = df_playlists['playlist_id'].apply(normalize_playlist_id)
+        df_playlists = read_csv(PLAYLISTS_CSV, sync_metrics)
+        df_playlists['playlist_id'] = normalize_playlist_ids(df_playlists['playlist_id'])
     else:
         df_playlists = pd.DataFrame(columns=['title', 'playlist_id', 'video_count'])
 
-    video_count = len(videos)
+    df_updates = pd.DataFrame([{
+        'title': playlist['title'],
+        'playlist_id': playlist['playlist_id'],
+        'video_count': playlist.get('video_count', len(sync_entry['item_ids']))
+    } for playlist, _, sync_entry in results]).drop_duplicates(subset='playlist_id', keep='last')
 
-    if playlist_id in df_playlists['playlist_id'].values:
-        df_playlists.loc[df_playlists['playlist_id'] == playlist_id, ['title', 'video_count']] = [playlist_title, video_count]
-    else:
-        df_playlists = pd.concat([df_playlists, pd.DataFrame([{
-            'title': playlist_title,
-            'playlist_id': playlist_id,
-            'video_count': video_count
-        }])], ignore_index=True)
+    df_playlists = df_playlists.set_index('playlist_id')
+    df_updates = df_updates.set_index('playlist_id')
+    df_playlists.update(df_updates)
+    df_playlists = pd.concat([df_playlists, df_updates[~df_updates.index.isin(df_playlists.index)]])
+    df_playlists = df_playlists.reset_index()[['title', 'playlist_id', 'video_count']]
 
     # ✅ 保存前に playlist_id を URL形式に戻す
-    df_playlists['playlist_id'] = df_playlists['playlist_id'].apply(to_playlist_url)
-    df_playlists.to_csv(PLAYLISTS_CSV, index=False)
+    df_playlists['playlist_id'] = to_playlist_urls(df_playlists['playlist_id'])
+    atomic_to_csv(df_playlists, PLAYLISTS_CSV, sync_metrics)
 
-    print(f"✅ プレイリスト情報を {PLAYLISTS_CSV} に更新しました")
+    print(f"✅ プレイリスト情報を {PLAYLISTS_CSV} に更新しました（{len(df_updates)}件）")
 
-def identify_and_fetch_target_playlists(youtube_playlists, csv_path):
-    df = pd.read_csv(csv_path)
-    df['playlist_id'] = df['playlist_id'].apply(normalize_playlist_id)
+def identify_and_fetch_target_playlists(youtube_playlists, csv_path, sync_metrics=NO_METRICS):
+    df = read_csv(csv_path, sync_metrics)
+    df['playlist_id'] = normalize_playlist_ids(df['playlist_id'])
     csv_map = df.set_index('playlist_id').to_dict(orient='index')
 
+    targets = []
     for playlist in youtube_playlists:
         pid = playlist['playlist_id']
         youtube_count = playlist['video_count']
@@ -176,15 +850,32 @@ def identify_and_fetch_target_playlists(youtube_playlists, csv_path):
 
         if csv_entry is None:
             print(f"🆕 CSVに存在しないプレイリスト: {playlist['title']}")
-            fetch_playlist_data(playlist)
+            targets.append(playlist)
         elif youtube_count != csv_entry['video_count']:
             print(f"⚠️ count不一致: {playlist['title']}（CSV: {csv_entry['video_count']} → YouTube: {youtube_count}）")
-            fetch_playlist_data(playlist)
+            targets.append(playlist)
+
+    if not targets:
+        return
+
+    sync_state = load_sync_state() if SYNC_STATE_JSON else None
+
+    started = time.perf_counter()
+    with sync_metrics.timer('fetch'):
+        results = fetch_playlists_concurrently(targets, sync_state=sync_state, sync_metrics=sync_metrics)
+    print(f"⏱️ {len(targets)}件のプレイリストを {time.perf_counter() - started:.1f} 秒で取得しました")
 
-def check_csv_latest_playlist(youtube_playlists, csv_path):
-    df = pd.read_csv(csv_path)
-    df['playlist_id'] = df['playlist_id'].apply(normalize_playlist_id)
-    df['number'] = df['title'].apply(extract_number_from_title)
+    save_sync_results(results, sync_metrics)
+
+    if sync_state is not None:
+        for playlist, _, sync_entry in results:
+            sync_state[playlist['playlist_id']] = sync_entry
+        save_sync_state(sync_state)
+
+def check_csv_latest_playlist(youtube_playlists, csv_path, sync_metrics=NO_METRICS):
+    df = read_csv(csv_path, sync_metrics)
+    df['playlist_id'] = normalize_playlist_ids(df['playlist_id'])
+    df['number'] = extract_numbers_from_titles(df['title'])
     latest_row = df.loc[df['number'].idxmax()]
     latest_title = latest_row['title']
     csv_count = latest_row['video_count']
@@ -202,12 +893,17 @@ def check_csv_latest_playlist(youtube_playlists, csv_path):
     else:
         print(f'❌ 不一致です（CSV: {csv_count}, YouTube: {youtube_count}）')
 
-def clean_and_sort_main_data():
-    if not os.path.exists(MAIN_DATA_CSV):
-        print(f"❌ {MAIN_DATA_CSV} が存在しません")
+def clean_and_sort_main_data(sync_metrics=NO_METRICS):
+    if not main_data_exists():
+        print(f"❌ {MAIN_DATA_STORE or MAIN_DATA_CSV} が存在しません")
+        return
+
+    if DEDUPE_INDEX_DB and os.path.exists(DEDUPE_INDEX_DB):
+        # 追記時に重複を除いて日付順に挿入しているので、全体の整理と id の振り直しは不要
+        print(f"🧹 main-data は {DEDUPE_INDEX_DB} で重複を除いて追記済みです")
         return
 
-    df = pd.read_csv(MAIN_DATA_CSV)
+    df = load_main_data(sync_metrics)
     before_count = len(df)
     df = df.drop_duplicates(subset='url')
     df = df.sort_values(by='date', ascending=False).reset_index(drop=True)
@@ -216,21 +912,21 @@ def clean_and_sort_main_data():
         df = df.drop(columns=['id'])
 
     df.insert(0, 'id', range(1, len(df) + 1))
-    df.to_csv(MAIN_DATA_CSV, index=False)
+    save_main_data(df, sync_metrics)
     after_count = len(df)
 
-    print(f"🧹 main-data.csv を整理しました（{before_count} → {after_count}件、最新順・重複削除）")
+    print(f"🧹 main-data を整理しました（{before_count} → {after_count}件、最新順・重複削除）")
 
-def filter_checked_channels(output_csv=FILTERED_DATA_CSV, verbose=True):
-    if not os.path.exists(MAIN_DATA_CSV) or not os.path.exists(CATEGORIZE_CSV):
+def filter_checked_channels(output_csv=FILTERED_DATA_CSV, verbose=True, sync_metrics=NO_METRICS):
+    if not main_data_exists() or not os.path.exists(CATEGORIZE_CSV):
         print("❌ 必要なCSVファイルが存在しません")
         return
 
-    df_main = pd.read_csv(MAIN_DATA_CSV)
-    df_categorize = pd.read_csv(CATEGORIZE_CSV)
+    df_main = load_main_data(sync_metrics)
+    df_categorize = read_csv(CATEGORIZE_CSV, sync_metrics)
     checked_channels = df_categorize[df_categorize['check'] == 1]['channel'].unique()
     df_filtered = df_main[df_main['channel'].isin(checked_channels)]
-    df_filtered.to_csv(output_csv, index=False)
+    atomic_to_csv(to_csv_frame(df_filtered), output_csv, sync_metrics)
 
     if verbose:
         print(f"✅ check=1 のチャンネルの動画を {output_csv} に保存しました（{len(df_filtered)}件）")
@@ -242,14 +938,21 @@ def filter_checked_channels(output_csv=FILTERED_DATA_CSV, verbose=True):
 # ----------------------------------------
 
 def main():
+    sync_metrics = SyncMetrics()
+    if API_CACHE_DIR and API_CACHE_MODE == 'cache':
+        removed = prune_api_cache()
+        if removed:
+            print(f'🗑️ 期限切れのAPIキャッシュを {removed} 件削除しました')
+
     print('▶️ プレイリスト取得中...')
-    playlists = get_playlists(API_KEY, CHANNEL_ID)
+    with sync_metrics.timer('list_playlists'):
+        playlists = get_playlists(API_KEY, CHANNEL_ID, sync_metrics)
 
     print('🔍 CSVとの比較・データ取得対象を判定中...')
-    identify_and_fetch_target_playlists(playlists, PLAYLISTS_CSV)
+    identify_and_fetch_target_playlists(playlists, PLAYLISTS_CSV, sync_metrics)
 
-    clean_and_sort_main_data()
-    filter_checked_channels()
+    clean_and_sort_main_data(sync_metrics)
+    filter_checked_channels(sync_metrics=sync_metrics)
 
     try:
         shutil.copy(FILTERED_DATA_CSV, OUTPUT_PATH)
@@ -257,5 +960,10 @@ def main():
     except Exception as e:
         print(f"❌ コピーに失敗しました: {e}")
 
+    report = sync_metrics.write(SYNC_REPORT_JSON, SYNC_METRICS_PROM)
+    print(f"📊 API {sum(report['api']['calls'].values())} 回（クォータ {report['api']['quota_units']}）、"
+          f"通信 {report['api']['network_seconds']:.1f} 秒、pandas I/O {report['timers'].get('pandas_io', 0):.1f} 秒、"
+          f"全体 {report['duration_seconds']:.1f} 秒")
+
 if __name__ == '__main__':
     main()
@@ -9,8 +9,13 @@ class PlaylistVideoInline(admin.TabularInline):
     autocomplete_fields = ['video']
     ordering = ['order']
 
+    def get_queryset(self, request):
+        # PlaylistVideo.__str__ が参照する video / playlist をまとめて取得
+        return super().get_queryset(request).select_related('video', 'playlist')
+
 
 @admin.register(Playlist)
 class PlaylistAdmin(admin.ModelAdmin):
     list_display = ['name', 'user']
+    list_select_related = ['user']
     inlines = [PlaylistVideoInline]
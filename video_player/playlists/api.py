@@ -0,0 +1,91 @@
+"""プレイリストのJSON API（ログインユーザー自身のプレイリストのみ）
+
+videos.api と同じく values_list() で fields= の列だけを読み、updated_at の集計で条件付きGETにする。
+"""
+from functools import wraps
+
+from django.db.models import Count, Max
+from django.http import JsonResponse
+from django.views.decorators.gzip import gzip_page
+from django.views.decorators.http import require_GET
+
+from videos.api import InvalidFields, error, parse_fields, project
+from videos.conditional import conditional_view, latest
+from .models import Playlist, PlaylistVideo
+from .views import playlist_state
+
+PLAYLIST_FIELDS = {
+    'id': 'id',
+    'name': 'name',
+    'created_at': 'created_at',
+    'video_count': 'video_count',
+}
+
+PLAYLIST_VIDEO_FIELDS = {
+    'id': 'id',
+    'order': 'order',
+    'video_id': 'video__id',
+    'title': 'video__title',
+    'channel': 'video__channel__name',
+    'date': 'video__date',
+    'url': 'video__url',
+    'youtube_id': 'video__youtube_id',
+}
+
+
+def api_login_required(view):
+    """ログインページへリダイレクトせず 401 を返す login_required"""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return error('ログインが必要です', status=401)
+        return view(request, *args, **kwargs)
+    return wrapper
+
+
+def playlist_list_validators(request):
+    if not request.user.is_authenticated:
+        return None
+    state = Playlist.objects.filter(user=request.user).aggregate(count=Count('id'), updated=Max('updated_at'))
+    return (request.user.pk, state['count'], state['updated'], request.GET.urlencode()), state['updated']
+
+
+def playlist_detail_validators(request, pk):
+    if not request.user.is_authenticated:
+        return None
+    state = playlist_state(request.user, pk)
+    if state is None:
+        return None
+    return (pk, state, request.GET.urlencode()), latest(*state[:1], *state[2:])
+
+
+@require_GET
+@gzip_page
+@conditional_view(playlist_list_validators, csrf=False)
+@api_login_required
+def playlist_list(request):
+    try:
+        fields = parse_fields(request.GET, PLAYLIST_FIELDS)
+    except InvalidFields as e:
+        return error(str(e))
+    playlists = Playlist.objects.filter(user=request.user).order_by('name')
+    if 'video_count' in fields:
+        playlists = playlists.annotate(video_count=Count('videos'))
+    return JsonResponse({'results': project(playlists, fields, PLAYLIST_FIELDS)})
+
+
+@require_GET
+@gzip_page
+@conditional_view(playlist_detail_validators, csrf=False)
+@api_login_required
+def playlist_detail(request, pk):
+    """プレイリストと、その動画を order 順に返す（fields= は動画の項目に効く）"""
+    try:
+        fields = parse_fields(request.GET, PLAYLIST_VIDEO_FIELDS)
+    except InvalidFields as e:
+        return error(str(e))
+    playlist = Playlist.objects.filter(pk=pk, user=request.user).values('id', 'name', 'created_at').first()
+    if playlist is None:
+        return error('プレイリストが見つかりません', status=404)
+    items = PlaylistVideo.objects.filter(playlist_id=pk).order_by('order', 'id')
+    return JsonResponse({**playlist, 'videos': project(items, fields, PLAYLIST_VIDEO_FIELDS)})
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('playlists', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='playlist',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='playlistvideo',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
@@ -1,6 +1,7 @@
 # playlists/models.py
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils import timezone
 from videos.models import Video
 
 
@@ -8,6 +9,8 @@ class Playlist(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='playlists')
     name = models.CharField(max_length=100)
     created_at = models.DateTimeField(auto_now_add=True)
+    # 名前の変更に加え、動画の追加・削除・並び替えでも更新する（touch_playlist）
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"{self.name}（{self.user.username}）"
@@ -17,6 +20,7 @@ class PlaylistVideo(models.Model):
     playlist = models.ForeignKey(Playlist, on_delete=models.CASCADE, related_name='videos')
     video = models.ForeignKey(Video, on_delete=models.CASCADE)
     order = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         unique_together = ('playlist', 'video')  # 同じプレイリストに重複登録を防ぐ
@@ -24,3 +28,12 @@ class PlaylistVideo(models.Model):
 
     def __str__(self):
         return f"{self.video.title} in {self.playlist.name} (order: {self.order})"
+
+
+def touch_playlist(playlist_id):
+    """プレイリストの中身が変わったことを updated_at に記録する"""
+    Playlist.objects.filter(pk=playlist_id).update(updated_at=timezone.now())
+
+
+async def atouch_playlist(playlist_id):
+    await Playlist.objects.filter(pk=playlist_id).aupdate(updated_at=timezone.now())
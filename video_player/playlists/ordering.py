@@ -0,0 +1,74 @@
+"""プレイリスト内の並び順（order）の操作
+
+order は ORDER_GAP 間隔で振っておき、1件の移動は前後の order の中間値を
+書き換えるだけで済ませる。間が詰まったときだけプレイリスト全体を振り直す。
+"""
+from django.db import models, transaction
+from django.utils import timezone
+
+from .models import PlaylistVideo, touch_playlist
+
+ORDER_GAP = 1024
+MAX_ORDER = 2 ** 31 - 1  # PositiveIntegerField の上限（PostgreSQL の integer）
+
+
+async def anext_order(playlist):
+    """末尾に追加する動画の order"""
+    max_order = (await playlist.videos.aaggregate(max_order=models.Max('order')))['max_order'] or 0
+    return max_order + ORDER_GAP
+
+
+def renumber(playlist_id):
+    """プレイリスト全体を現在の並びのまま ORDER_GAP 間隔で振り直す"""
+    items = list(PlaylistVideo.objects.filter(playlist_id=playlist_id).only('id', 'order').order_by('order', 'id'))
+    now = timezone.now()
+    for index, item in enumerate(items, start=1):
+        item.order = index * ORDER_GAP
+        item.updated_at = now
+    PlaylistVideo.objects.bulk_update(items, ['order', 'updated_at'])
+
+
+def apply_orders(items, orders):
+    """{id: order} のとおりに order を書き換え、変わった行だけを一括更新する
+
+    items は同じプレイリストの PlaylistVideo（所有者の確認は呼び出し側で済ませる）。
+    """
+    changed = []
+    now = timezone.now()
+    for item in items:
+        if item.order != orders[item.pk]:
+            item.order = orders[item.pk]
+            item.updated_at = now
+            changed.append(item)
+    if changed:
+        # bulk_update は auto_now を更新しないので updated_at も明示して書く
+        with transaction.atomic():
+            PlaylistVideo.objects.bulk_update(changed, ['order', 'updated_at'])
+            touch_playlist(changed[0].playlist_id)
+    return len(changed)
+
+
+def move(item, after=None):
+    """item を after の直後（None なら先頭）へ移動する"""
+    with transaction.atomic():
+        lower = after.order if after is not None else 0
+        following = PlaylistVideo.objects.filter(playlist_id=item.playlist_id).exclude(pk=item.pk)
+        if after is not None:
+            following = following.filter(order__gte=lower).exclude(pk=after.pk)
+        upper = following.order_by('order').values_list('order', flat=True).first()
+
+        if upper is None:
+            new_order = lower + ORDER_GAP
+        elif upper - lower >= 2:
+            new_order = (lower + upper) // 2
+        else:
+            # 間に入る整数がないので全体を振り直してからやり直す
+            renumber(item.playlist_id)
+            if after is not None:
+                after.refresh_from_db(fields=['order'])
+            return move(item, after)
+
+        PlaylistVideo.objects.filter(pk=item.pk).update(order=new_order, updated_at=timezone.now())
+        touch_playlist(item.playlist_id)
+        item.order = new_order
+    return item
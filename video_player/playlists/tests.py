@@ -1,3 +1,279 @@
+import json
+from datetime import datetime, timedelta, timezone
+
+from django.contrib.auth.models import User
 from django.test import TestCase
+from django.urls import reverse
+
+from videos.models import Channel, Video
+from .models import Playlist, PlaylistVideo
+from .ordering import ORDER_GAP
+
+
+def make_playlist(user, size, name='list'):
+    """size 件の動画を ORDER_GAP 間隔で並べたプレイリストを作る"""
+    channel, _ = Channel.objects.get_or_create(name='ch')
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    videos = Video.objects.bulk_create([
+        Video(title=f'{name} {i}', channel=channel, date=start + timedelta(minutes=i),
+              url=f'https://www.youtube.com/watch?v={name}{i}', youtube_id=f'{name}{i}')
+        for i in range(size)
+    ])
+    playlist = Playlist.objects.create(user=user, name=name)
+    PlaylistVideo.objects.bulk_create([
+        PlaylistVideo(playlist=playlist, video=video, order=(i + 1) * ORDER_GAP)
+        for i, video in enumerate(videos)
+    ])
+    return playlist
+
+
+class PlaylistReorderTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('alice', password='pw')
+        self.client.force_login(self.user)
+
+    def post(self, playlist, data):
+        return self.client.post(
+            reverse('playlist_reorder', args=[playlist.pk]), json.dumps(data), content_type='application/json'
+        )
+
+    def ids(self, playlist):
+        return list(playlist.videos.values_list('id', flat=True))
+
+    def test_bulk_reorder_query_count_is_constant(self):
+        playlist = make_playlist(self.user, 1000)
+        ids = self.ids(playlist)
+        data = [{'id': pk, 'order': (i + 1) * ORDER_GAP} for i, pk in enumerate(reversed(ids))]
+
+        # セッション・ユーザー・所有者確認・SAVEPOINT/RELEASE・プレイリストの touch と
+        # CASE UPDATE（SQLite はパラメータ数の上限で分割され、1000件で5回）
+        with self.assertNumQueries(11):
+            response = self.post(playlist, data)
+        self.assertEqual(response.json(), {'success': True, 'updated': 1000})
+        self.assertEqual(self.ids(playlist), ids[::-1])
+
+    def test_bulk_reorder_skips_unchanged_rows(self):
+        playlist = make_playlist(self.user, 1000)
+        ids = self.ids(playlist)
+        data = [{'id': pk, 'order': (i + 1) * ORDER_GAP} for i, pk in enumerate(ids)]
+        data[0]['order'], data[1]['order'] = data[1]['order'], data[0]['order']
+
+        response = self.post(playlist, data)
+        self.assertEqual(response.json()['updated'], 2)
+        self.assertEqual(self.ids(playlist)[:2], [ids[1], ids[0]])
+
+    def test_move_rewrites_one_row(self):
+        playlist = make_playlist(self.user, 1000)
+        ids = self.ids(playlist)
+
+        with self.assertNumQueries(8):
+            self.post(playlist, {'id': ids[-1], 'after': ids[0]})
+        self.assertEqual(self.ids(playlist)[:3], [ids[0], ids[-1], ids[1]])
+        self.assertEqual(PlaylistVideo.objects.get(pk=ids[-1]).order, ORDER_GAP + ORDER_GAP // 2)
+
+        self.post(playlist, {'id': ids[500], 'after': None})
+        self.assertEqual(self.ids(playlist)[:2], [ids[500], ids[0]])
+
+    def test_move_renumbers_when_gap_is_exhausted(self):
+        playlist = make_playlist(self.user, 3)
+        ids = self.ids(playlist)
+        PlaylistVideo.objects.filter(pk=ids[0]).update(order=1)
+        PlaylistVideo.objects.filter(pk=ids[1]).update(order=2)
+
+        self.post(playlist, {'id': ids[2], 'after': ids[0]})
+        self.assertEqual(self.ids(playlist), [ids[0], ids[2], ids[1]])
+        orders = list(playlist.videos.values_list('order', flat=True))
+        self.assertTrue(all(b - a >= 2 for a, b in zip(orders, orders[1:])))
+
+    def test_rejects_items_of_other_users(self):
+        other = make_playlist(User.objects.create_user('bob', password='pw'), 2, name='other')
+        other_ids = self.ids(other)
+
+        response = self.post(other, [{'id': pk, 'order': 0} for pk in other_ids])
+        self.assertEqual(response.status_code, 404)
+        response = self.post(other, {'id': other_ids[1], 'after': None})
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(list(other.videos.values_list('order', flat=True)), [ORDER_GAP, 2 * ORDER_GAP])
+
+    def test_rejects_out_of_range_orders(self):
+        playlist = make_playlist(self.user, 2)
+        ids = self.ids(playlist)
+        for order in (-1, 2 ** 31, 2 ** 63):
+            response = self.post(playlist, [{'id': ids[0], 'order': order}])
+            self.assertEqual(response.status_code, 400)
+        self.assertEqual(playlist.videos.get(pk=ids[0]).order, ORDER_GAP)
+        self.assertEqual(self.post(playlist, []).status_code, 400)
+
+        # 一覧画面のフォームでも範囲外の値は無視する
+        url = reverse('playlist_detail', args=[playlist.pk])
+        response = self.client.post(url, {f'order_{ids[0]}': 2 ** 31, f'order_{ids[1]}': -1})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(list(playlist.videos.order_by('pk').values_list('order', flat=True)), [ORDER_GAP, 2 * ORDER_GAP])
+
+
+class PlaylistViewQueryTests(TestCase):
+    """動画の件数によらずクエリ数が一定であること（N+1 の回帰防止）
+
+    各ビューの件数にはセッション・ユーザーの取得と、base.html のナビで
+    user.playlists を読む1クエリが含まれる。
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user('alice', password='pw')
+        self.client.force_login(self.user)
+        self.playlist = make_playlist(self.user, 50)
+
+    def test_playlist_list(self):
+        Playlist.objects.create(user=self.user, name='another')
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse('playlists_list'))
+        self.assertContains(response, 'another')
+
+    def test_playlist_detail(self):
+        with self.assertNumQueries(5):
+            response = self.client.get(reverse('playlist_detail', args=[self.playlist.pk]))
+        self.assertContains(response, 'list 49')
+
+    def test_playlist_detail_post(self):
+        pv = self.playlist.videos.last()
+        with self.assertNumQueries(8):
+            self.client.post(reverse('playlist_detail', args=[self.playlist.pk]), {f'order_{pv.pk}': 1})
+        self.assertEqual(self.playlist.videos.first(), pv)
+
+    def test_playlist_play(self):
+        with self.assertNumQueries(7):  # ETag / Last-Modified 用の集計2回を含む
+            response = self.client.get(reverse('playlist_play', args=[self.playlist.pk]))
+        self.assertEqual(len(response.context['videos']), 50)
+        self.assertEqual(response.context['videos'][0]['video_id'], 'list0')
+
+    def test_playlist_edit(self):
+        with self.assertNumQueries(4):
+            self.client.post(reverse('playlist_edit', args=[self.playlist.pk]), {'name': 'renamed'})
+        self.playlist.refresh_from_db()
+        self.assertEqual(self.playlist.name, 'renamed')
+
+    def test_playlist_delete(self):
+        with self.assertNumQueries(5):
+            self.client.post(reverse('playlist_delete', args=[self.playlist.pk]))
+        self.assertFalse(Playlist.objects.exists())
+
+    def test_playlist_video_remove(self):
+        pv = self.playlist.videos.first()
+        with self.assertNumQueries(5):
+            self.client.post(reverse('playlist_video_remove', args=[pv.pk]))
+        self.assertEqual(self.playlist.videos.count(), 49)
+
+
+class PlaylistApiTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('alice', password='pw')
+        self.playlist = make_playlist(self.user, 3)
+        Playlist.objects.create(user=self.user, name='empty')
+
+    def test_requires_login(self):
+        self.assertEqual(self.client.get(reverse('api_playlists')).status_code, 401)
+
+    def test_playlist_list(self):
+        self.client.force_login(self.user)
+        data = self.client.get(reverse('api_playlists'), {'fields': 'name,video_count'}).json()
+        self.assertEqual(data['results'], [{'name': 'empty', 'video_count': 0}, {'name': 'list', 'video_count': 3}])
+
+    def test_playlist_detail(self):
+        self.client.force_login(self.user)
+        url = reverse('api_playlist_detail', args=[self.playlist.pk])
+        with self.assertNumQueries(5):  # セッション・ユーザー・ETag 用の集計・プレイリスト・動画
+            response = self.client.get(url, {'fields': 'title,youtube_id'})
+        data = response.json()
+        self.assertEqual(data['name'], 'list')
+        self.assertEqual(data['videos'][0], {'title': 'list 0', 'youtube_id': 'list0'})
+
+        # フォームを描画しないので、ログイン中でも Last-Modified を送る
+        self.assertIn('Last-Modified', response)
+        with self.assertNumQueries(3):
+            response = self.client.get(url, {'fields': 'title,youtube_id'}, headers={'if-none-match': response['ETag']})
+        self.assertEqual(response.status_code, 304)
+        Video.objects.filter(pk=self.playlist.videos.first().video_id).update(title='renamed', updated_at=datetime.now(timezone.utc))
+        response = self.client.get(url, {'fields': 'title,youtube_id'}, headers={'if-none-match': response['ETag']})
+        self.assertEqual(response.json()['videos'][0]['title'], 'renamed')
+
+        self.client.force_login(User.objects.create_user('bob', password='pw'))
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+
+
+class PlaylistConditionalGetTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('alice', password='pw')
+        self.client.force_login(self.user)
+        self.playlist = make_playlist(self.user, 3)
+        self.url = reverse('playlist_play', args=[self.playlist.pk])
+
+    def revalidate(self, response):
+        return self.client.get(self.url, headers={'if-none-match': response['ETag']})
+
+    def test_not_modified_without_rendering(self):
+        response = self.client.get(self.url)
+        self.assertIn('ETag', response)
+        self.assertNotIn('Last-Modified', response)  # ログイン中は ETag（CSRF トークンを含む）だけで検証する
+        # セッション・ユーザー・集計2回だけで、プレイリストや動画の一覧は読まない
+        with self.assertNumQueries(4):
+            self.assertEqual(self.revalidate(response).status_code, 304)
+
+    def test_changes_invalidate_the_etag(self):
+        ids = list(self.playlist.videos.values_list('id', flat=True))
+        changes = [
+            lambda: self.client.post(
+                reverse('playlist_reorder', args=[self.playlist.pk]),
+                json.dumps({'id': ids[2], 'after': None}), content_type='application/json',
+            ),
+            lambda: self.client.post(reverse('playlist_video_remove', args=[ids[0]])),
+            lambda: Video.objects.filter(pk=PlaylistVideo.objects.get(pk=ids[1]).video_id).get().save(),
+            lambda: Playlist.objects.create(user=self.user, name='new'),  # サイドバーの一覧が変わる
+        ]
+        for change in changes:
+            response = self.client.get(self.url)
+            change()
+            self.assertEqual(self.revalidate(response).status_code, 200)
+
+
+class AsyncPlaylistViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('alice', password='pw')
+        cls.other = User.objects.create_user('bob', password='pw')
+        cls.playlist = make_playlist(cls.user, 2)
+        cls.video = Video.objects.create(
+            title='added', channel=Channel.objects.get(), date=datetime(2025, 1, 1, tzinfo=timezone.utc),
+            url='https://youtu.be/aaaaaaaaaaa',
+        )
+
+    async def test_add_to_playlist_and_play(self):
+        await self.async_client.aforce_login(self.user)
+        url = reverse('ajax_add_to_playlist', args=[self.video.pk])
+        response = await self.async_client.post(url, {'playlist_id': self.playlist.pk})
+        self.assertTrue(response.json()['success'])
+        response = await self.async_client.post(url, {'playlist_id': self.playlist.pk})
+        self.assertFalse(response.json()['success'])
+
+        response = await self.async_client.get(reverse('playlist_play', args=[self.playlist.pk]))
+        self.assertEqual([video['video_id'] for video in response.context['videos']], ['list0', 'list1', 'aaaaaaaaaaa'])
+        self.assertEqual(
+            await PlaylistVideo.objects.filter(video=self.video).values_list('order', flat=True).aget(), 3 * ORDER_GAP
+        )
+
+    async def test_plays_videos_left_without_youtube_id(self):
+        # 移行 0004 で重複として youtube_id を NULL にされた動画も URL から再生できる
+        await Video.objects.filter(pk=self.video.pk).aupdate(youtube_id=None)
+        await PlaylistVideo.objects.acreate(playlist=self.playlist, video=self.video, order=3 * ORDER_GAP)
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(reverse('playlist_play', args=[self.playlist.pk]))
+        self.assertEqual([video['video_id'] for video in response.context['videos']], ['list0', 'list1', 'aaaaaaaaaaa'])
 
-# Create your tests here.
+    async def test_other_users_playlist_is_404(self):
+        await self.async_client.aforce_login(self.other)
+        response = await self.async_client.get(reverse('playlist_play', args=[self.playlist.pk]))
+        self.assertEqual(response.status_code, 404)
+        response = await self.async_client.post(
+            reverse('ajax_add_to_playlist', args=[self.video.pk]), {'playlist_id': self.playlist.pk}
+        )
+        self.assertEqual(response.status_code, 404)
@@ -1,5 +1,5 @@
 from django.urls import path
-from . import views
+from . import api, views
 
 urlpatterns = [
     path('', views.playlist_list, name='playlists_list'),  # プレイリスト一覧
@@ -9,4 +9,6 @@ urlpatterns = [
     path('<int:pk>/reorder/', views.playlist_reorder, name='playlist_reorder'),  # 並び替え保存
     path('video/<int:pk>/remove/', views.playlist_video_remove, name='playlist_video_remove'),  # 削除
     path('playlists/<int:pk>/play/', views.playlist_play, name='playlist_play'),
+    path('api/', api.playlist_list, name='api_playlists'),
+    path('api/<int:pk>/', api.playlist_detail, name='api_playlist_detail'),
 ]
@@ -1,11 +1,15 @@
 from django.shortcuts import render, redirect, get_object_or_404
-from .models import Playlist, PlaylistVideo
+from .models import Playlist, PlaylistVideo, touch_playlist
 from .forms import PlaylistForm, PlaylistVideoOrderForm
+from . import ordering
+from videos.conditional import conditional_view, latest, user_state
+from videos.models import extract_youtube_id
+from videos.shortcuts import aget_object_or_404, arender, auser
 from django.contrib.auth.decorators import login_required
+from django.db.models import Count, Max
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 import json
-from urllib.parse import urlparse, parse_qs
 
 
 @login_required
@@ -46,21 +50,31 @@ def playlist_delete(request, pk):
     return redirect('playlists_list')
 
 
+def parse_order(value):
+    order = int(value)
+    if not 0 <= order <= ordering.MAX_ORDER:
+        raise ValueError(f'order は 0〜{ordering.MAX_ORDER} で指定してください: {order}')
+    return order
+
+
 @login_required
 def playlist_detail(request, pk):
     playlist = get_object_or_404(Playlist, pk=pk, user=request.user)
-    videos = playlist.videos.all()
+    # 表示に使う列だけを動画と JOIN して1クエリで取得
+    videos = playlist.videos.select_related('video').only('id', 'playlist', 'order', 'video__id', 'video__title')
 
     if request.method == 'POST':
         # 並び替えと名前変更
-        for pv in videos:
+        items = list(playlist.videos.only('id', 'playlist', 'order'))
+        orders = {pv.id: pv.order for pv in items}
+        for pv in items:
             field_name = f'order_{pv.id}'
             if field_name in request.POST:
                 try:
-                    pv.order = int(request.POST[field_name])
-                    pv.save()
+                    orders[pv.id] = parse_order(request.POST[field_name])
                 except ValueError:
-                    pass  # 無視
+                    pass  # 無視（範囲外の値も DB に渡さない）
+        ordering.apply_orders(items, orders)
         if 'rename' in request.POST:
             playlist.name = request.POST.get('name', playlist.name)
             playlist.save()
@@ -76,20 +90,44 @@ def playlist_detail(request, pk):
 @csrf_exempt
 @login_required
 def playlist_reorder(request, pk):
-    playlist = get_object_or_404(Playlist, pk=pk, user=request.user)
-
-    if request.method == 'POST':
-        try:
-            data = json.loads(request.body)
-            for item in data:
-                pv = PlaylistVideo.objects.get(pk=item['id'], playlist=playlist)
-                pv.order = item['order']
-                pv.save()
-            return JsonResponse({'success': True})
-        except Exception as e:
-            return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    """並び順の保存
+
+    {"id": 動画, "after": 直前の動画 or null} … 1件だけ移動（前後の隙間に order を入れる）
+    [{"id": 動画, "order": 順番}, ...]       … まとめて指定（変わった行だけ一括更新）
+    """
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'error': 'Invalid method'}, status=405)
+
+    try:
+        data = json.loads(request.body)
+        if isinstance(data, dict):
+            ids = {int(data['id'])}
+            if data.get('after') is not None:
+                ids.add(int(data['after']))
+                if len(ids) == 1:
+                    raise ValueError('id と after が同じです')
+        else:
+            orders = {int(item['id']): parse_order(item['order']) for item in data}
+            ids = set(orders)
+            if not ids:
+                raise ValueError('並び順が指定されていません')
+    except (ValueError, TypeError, KeyError) as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+
+    # 所有者の確認を兼ねて1クエリで取得
+    items = PlaylistVideo.objects.filter(
+        playlist_id=pk, playlist__user=request.user, pk__in=ids
+    ).only('id', 'playlist_id', 'order').in_bulk()
+    if len(items) != len(ids):
+        return JsonResponse({'success': False, 'error': 'Not found'}, status=404)
+
+    if isinstance(data, dict):
+        after = items[int(data['after'])] if data.get('after') is not None else None
+        ordering.move(items[int(data['id'])], after)
+        return JsonResponse({'success': True})
 
-    return JsonResponse({'success': False, 'error': 'Invalid method'}, status=405)
+    updated = ordering.apply_orders(items.values(), orders)
+    return JsonResponse({'success': True, 'updated': updated})
 
 
 @csrf_exempt
@@ -98,28 +136,43 @@ def playlist_video_remove(request, pk):
     if request.method == 'POST':
         pv = get_object_or_404(PlaylistVideo, pk=pk, playlist__user=request.user)
         pv.delete()
+        touch_playlist(pv.playlist_id)
         return JsonResponse({'success': True})
     return JsonResponse({'success': False, 'error': 'Invalid method'}, status=405)
 
 
-@login_required
-def playlist_play(request, pk):
-    playlist = get_object_or_404(Playlist, pk=pk, user=request.user)
-    videos = playlist.videos.all()
-
-    # URLからYouTubeの動画IDを取り出す関数
-    def extract_youtube_id(url):
-        parsed_url = urlparse(url)
-        if parsed_url.hostname in ['www.youtube.com', 'youtube.com']:
-            qs = parse_qs(parsed_url.query)
-            return qs.get('v', [None])[0]
-        elif parsed_url.hostname == 'youtu.be':
-            return parsed_url.path[1:]
+def playlist_state(user, pk):
+    """プレイリスト・その動画・動画自体の (updated_at, 件数, 項目の最終更新, 動画の最終更新)"""
+    return (
+        Playlist.objects.filter(pk=pk, user=user)
+        .annotate(
+            count=Count('videos'), items_updated=Max('videos__updated_at'),
+            videos_updated=Max('videos__video__updated_at'),
+        )
+        .values_list('updated_at', 'count', 'items_updated', 'videos_updated').first()
+    )
+
+
+def playlist_play_validators(request, pk):
+    """プレイリスト・その動画・動画自体の updated_at と件数から検証子を作る"""
+    state = playlist_state(request.user, pk)
+    if state is None:
         return None
+    user = user_state(request)
+    return (pk, state, user), latest(*state[:1], *state[2:], user[2])
+
 
+@login_required
+@conditional_view(playlist_play_validators)
+async def playlist_play(request, pk):
+    playlist = await aget_object_or_404(Playlist.objects.all(), pk=pk, user=await auser(request))
+    # youtube_id は保存時に取り出し済み。重複のため NULL のまま残した動画（移行 0004）は URL から取り出す
+    videos = playlist.videos.select_related('video').only(
+        'id', 'playlist', 'order', 'video__id', 'video__title', 'video__youtube_id', 'video__url'
+    )
     video_list = []
-    for pv in videos:
-        video_id = extract_youtube_id(pv.video.url)
+    async for pv in videos:
+        video_id = pv.video.youtube_id or extract_youtube_id(pv.video.url)
         if video_id:
             video_list.append({
                 'title': pv.video.title,
@@ -136,7 +189,7 @@ def playlist_play(request, pk):
                 start_index = idx
                 break
 
-    return render(request, 'playlists/playlist_play.html', {
+    return await arender(request, 'playlists/playlist_play.html', {
         'playlist': playlist,
         'videos': video_list,
         'start_index': start_index,
@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'video_player.settings')
+# 非同期ビューのクエリはリクエストごとに別スレッドで実行されるので、接続を使い回さない
+os.environ.setdefault('CONN_MAX_AGE', '0')
 
 application = get_asgi_application()
@@ -0,0 +1,58 @@
+"""DATABASES の設定
+
+DATABASE_ENGINE=sqlite（既定）/ postgresql で切り替える。
+
+SQLite は Web のリクエストと import_videos が同時に動いても "database is locked" に
+ならないよう、接続ごとに WAL などの PRAGMA を設定する。
+"""
+import os
+
+from django.core.exceptions import ImproperlyConfigured
+
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',  # 読み込みが書き込みのコミットを待たない
+    'synchronous': 'NORMAL',  # WAL ならコミットごとの fsync を省いても壊れない
+    'mmap_size': 256 * 1024 * 1024,
+    'busy_timeout': 5000,  # ロック中は即エラーにせず最大5秒待つ（ミリ秒）
+}
+
+
+def sqlite_init_command(pragmas=None):
+    return ';'.join(f'PRAGMA {name}={value}' for name, value in (pragmas or SQLITE_PRAGMAS).items())
+
+
+def database_config(base_dir, env=None):
+    """環境変数から DATABASES['default'] を組み立てる"""
+    env = os.environ if env is None else env
+    engine = env.get('DATABASE_ENGINE', 'sqlite')
+    common = {
+        'CONN_MAX_AGE': int(env.get('CONN_MAX_AGE', 60)),  # 接続をリクエストをまたいで使い回す
+        'CONN_HEALTH_CHECKS': True,
+    }
+
+    if engine == 'sqlite':
+        pragmas = {**SQLITE_PRAGMAS, 'busy_timeout': int(env.get('SQLITE_BUSY_TIMEOUT', SQLITE_PRAGMAS['busy_timeout']))}
+        return {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': env.get('DATABASE_NAME', base_dir / 'db.sqlite3'),
+            'OPTIONS': {
+                'init_command': sqlite_init_command(pragmas),
+                # 書き込むトランザクションは BEGIN 時点でロックを取る。DEFERRED のままだと
+                # 読み込みから書き込みへの昇格時に busy_timeout を待たずに失敗する
+                'transaction_mode': 'IMMEDIATE',
+            },
+            **common,
+        }
+
+    if engine == 'postgresql':
+        return {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': env.get('DATABASE_NAME', 'video_player'),
+            'USER': env.get('DATABASE_USER', ''),
+            'PASSWORD': env.get('DATABASE_PASSWORD', ''),
+            'HOST': env.get('DATABASE_HOST', ''),
+            'PORT': env.get('DATABASE_PORT', ''),
+            **common,
+        }
+
+    raise ImproperlyConfigured(f"DATABASE_ENGINE は sqlite か postgresql を指定してください: {engine}")
@@ -0,0 +1,163 @@
+"""リクエスト単位の計測（処理時間・SQL の件数と時間・最も遅いクエリ）
+
+PROFILING_SAMPLE_RATE（0〜1）を設定すると MIDDLEWARE に ProfilingMiddleware が入る。
+抽出されたリクエストだけを計測し、Server-Timing ヘッダーを付けて URL 名ごとに
+直近 PROFILING_WINDOW 件を集計する。集計はプロセス内なので、ワーカーごとに別々になる。
+
+SQL は接続ごとの execute_wrappers で計測する。非同期ビューのクエリは別スレッドの
+接続で実行されるため、計測中のリクエストは ContextVar で受け渡す。
+"""
+import random
+import threading
+import time
+from collections import defaultdict, deque
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import JsonResponse
+from django.utils.decorators import sync_and_async_middleware
+
+current_profile = ContextVar('current_profile', default=None)
+
+
+class Profile:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_ms = 0.0
+        self.slowest_ms = 0.0
+        self.slowest_sql = None
+
+    def add_query(self, sql, elapsed_ms):
+        self.queries += 1
+        self.db_ms += elapsed_ms
+        if elapsed_ms >= self.slowest_ms:
+            self.slowest_ms = elapsed_ms
+            self.slowest_sql = sql
+
+    def finish(self):
+        self.total_ms = (time.perf_counter() - self.started) * 1000
+        return self
+
+    def server_timing(self):
+        timings = [
+            f'app;dur={self.total_ms:.1f}',
+            f'db;dur={self.db_ms:.1f};desc="{self.queries} queries"',
+        ]
+        if self.queries:
+            timings.append(f'db-slowest;dur={self.slowest_ms:.1f}')
+        return ', '.join(timings)
+
+
+def record_query(execute, sql, params, many, context):
+    profile = current_profile.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        profile.add_query(sql, (time.perf_counter() - started) * 1000)
+
+
+def instrument(connection, **kwargs):
+    # execute_wrapper() は末尾に積んで末尾から外すので、常設のものは先頭に置く
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, record_query)
+
+
+def percentile(values, q):
+    """values の q パーセンタイル（最近傍法）"""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(q / 100 * len(ordered)) - 1))]
+
+
+class Stats:
+    """URL 名ごとに直近のリクエストの計測値を保持する"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.samples = defaultdict(lambda: deque(maxlen=settings.PROFILING_WINDOW))
+            self.slowest = {}
+
+    def record(self, name, profile):
+        with self.lock:
+            self.samples[name].append((profile.total_ms, profile.db_ms, profile.queries))
+            if profile.slowest_sql and profile.slowest_ms >= self.slowest.get(name, (0, None))[0]:
+                self.slowest[name] = (profile.slowest_ms, profile.slowest_sql)
+
+    def snapshot(self):
+        with self.lock:
+            samples = {name: list(values) for name, values in self.samples.items()}
+            slowest = dict(self.slowest)
+
+        result = {}
+        for name, values in sorted(samples.items()):
+            total, db, queries = zip(*values)
+            result[name] = {
+                'count': len(values),
+                **{f'p{q}_ms': round(percentile(total, q), 1) for q in (50, 95, 99)},
+                'db_p50_ms': round(percentile(db, 50), 1),
+                'db_p95_ms': round(percentile(db, 95), 1),
+                'queries_p50': percentile(queries, 50),
+                'queries_max': max(queries),
+            }
+            if name in slowest:
+                result[name]['slowest_query'] = {'ms': round(slowest[name][0], 1), 'sql': slowest[name][1]}
+        return result
+
+
+stats = Stats()
+
+
+@sync_and_async_middleware
+def ProfilingMiddleware(get_response):
+    connection_created.connect(instrument)
+    for connection in connections.all(initialized_only=True):
+        instrument(connection)
+
+    def start():
+        if random.random() >= settings.PROFILING_SAMPLE_RATE:
+            return None, None
+        profile = Profile()
+        return profile, current_profile.set(profile)
+
+    def finish(request, response, profile, token):
+        current_profile.reset(token)
+        profile.finish()
+        response['Server-Timing'] = profile.server_timing()
+        match = request.resolver_match
+        stats.record(match.view_name if match else '<unresolved>', profile)
+        return response
+
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            profile, token = start()
+            if profile is None:
+                return await get_response(request)
+            return finish(request, await get_response(request), profile, token)
+    else:
+        def middleware(request):
+            profile, token = start()
+            if profile is None:
+                return get_response(request)
+            return finish(request, get_response(request), profile, token)
+    return middleware
+
+
+@staff_member_required
+def stats_view(request):
+    """URL 名ごとの処理時間・DB時間のパーセンタイル"""
+    return JsonResponse({
+        'sample_rate': settings.PROFILING_SAMPLE_RATE,
+        'window': settings.PROFILING_WINDOW,
+        'views': stats.snapshot(),
+    }, json_dumps_params={'ensure_ascii': False})
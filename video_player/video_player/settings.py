@@ -10,8 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
+from .database import database_config
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -52,6 +55,12 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# リクエストの計測（video_player/profiling.py）。PROFILING_SAMPLE_RATE=0.01 なら 1% を計測する
+PROFILING_SAMPLE_RATE = float(os.environ.get('PROFILING_SAMPLE_RATE', 0))
+PROFILING_WINDOW = int(os.environ.get('PROFILING_WINDOW', 1000))  # URL 名ごとに集計する直近の件数
+if PROFILING_SAMPLE_RATE:
+    MIDDLEWARE.insert(0, 'video_player.profiling.ProfilingMiddleware')
+
 ROOT_URLCONF = 'video_player.urls'
 
 TEMPLATES = [
@@ -74,11 +83,28 @@ WSGI_APPLICATION = 'video_player.wsgi.application'
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
+# DATABASE_ENGINE=sqlite（既定）/ postgresql、詳細は video_player/database.py
 
 DATABASES = {
+    'default': database_config(BASE_DIR),
+}
+
+
+# Cache
+# CACHE_BACKEND=locmem（既定）/ file / redis、CACHE_LOCATION で保存先を指定
+# locmem はプロセスごとなので、複数ワーカーで動かすときは file か redis を使う
+
+CACHE_BACKENDS = {
+    'locmem': ('django.core.cache.backends.locmem.LocMemCache', 'video-player'),
+    'file': ('django.core.cache.backends.filebased.FileBasedCache', str(BASE_DIR / 'cache')),
+    'redis': ('django.core.cache.backends.redis.RedisCache', 'redis://127.0.0.1:6379/1'),
+}
+CACHE_BACKEND, CACHE_DEFAULT_LOCATION = CACHE_BACKENDS[os.environ.get('CACHE_BACKEND', 'locmem')]
+
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': os.environ.get('CACHE_LOCATION', CACHE_DEFAULT_LOCATION),
     }
 }
 
@@ -18,6 +18,7 @@ from django.contrib import admin
 from django.urls import path
 from django.urls import path, include
 from django.contrib.auth.views import LogoutView
+from . import profiling
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -25,5 +26,6 @@ urlpatterns = [
     path('', include('videos.urls')),
     path('accounts/', include('users.urls')),
     path('playlists/', include('playlists.urls')),
+    path('_profiling/', profiling.stats_view, name='profiling_stats'),
     path('logout/', LogoutView.as_view(next_page='video_search'), name='logout'),
 ]
@@ -1,9 +1,17 @@
 from django.contrib import admin
-from .models import Video
+from .models import Channel, Video
+
+
+@admin.register(Channel)
+class ChannelAdmin(admin.ModelAdmin):
+    list_display = ('name', 'checked', 'agency')
+    search_fields = ('name', 'agency')
+    list_filter = ('checked', 'agency')
 
 
 @admin.register(Video)
 class VideoAdmin(admin.ModelAdmin):
     list_display = ('title', 'channel', 'date', 'playlist')  # 一覧に表示したいフィールド
-    search_fields = ('title', 'channel', 'playlist')  # 管理画面で検索できるフィールド
+    list_select_related = ('channel',)
+    search_fields = ('title', 'channel__name', 'playlist')  # 管理画面で検索できるフィールド
     list_filter = ('channel', 'playlist', 'date')  # フィルタサイドバーに表示
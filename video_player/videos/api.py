@@ -0,0 +1,134 @@
+"""動画のJSON API
+
+values_list() で必要な列だけを読み、モデルを生成せずに辞書へ詰めて返す。
+fields= で返す項目を絞れる（例: ?fields=id,title,youtube_id）。
+ETag / Last-Modified は updated_at の集計から求め、一致すれば検索もシリアライズもせずに
+304 を返す。gzip 圧縮は Django 標準のデコレータに任せる。
+"""
+from django.core.cache import cache
+from django.db.models import Count, Max
+from django.http import JsonResponse
+from django.views.decorators.gzip import gzip_page
+from django.views.decorators.http import require_GET
+
+from . import catalogue, pagination
+from .conditional import conditional_view
+from .models import Video
+from .response_cache import cache_anonymous
+from .views import PER_PAGE, build_search_queryset
+
+# 公開する項目名 → ORM のパス
+VIDEO_FIELDS = {
+    'id': 'id',
+    'title': 'title',
+    'channel': 'channel__name',
+    'date': 'date',
+    'url': 'url',
+    'youtube_id': 'youtube_id',
+    'playlist': 'playlist',
+}
+
+
+STATE_KEY_PREFIX = 'videos:api-state'
+STATE_TIMEOUT = 60 * 5
+
+
+class InvalidFields(ValueError):
+    pass
+
+
+def parse_fields(params, available):
+    """fields= の値を項目名のリストにする（未指定なら全項目）"""
+    raw = params.get('fields', '')
+    fields = list(dict.fromkeys(name.strip() for name in raw.split(',') if name.strip()))
+    if not fields:
+        return list(available)
+    unknown = [name for name in fields if name not in available]
+    if unknown:
+        raise InvalidFields(f"不明な項目です: {', '.join(unknown)}")
+    return fields
+
+
+def project(queryset, fields, available):
+    """fields の列だけを読み、{項目名: 値} の辞書のリストで返す"""
+    paths = [available[name] for name in fields]
+    return [dict(zip(fields, row)) for row in queryset.values_list(*paths)]
+
+
+def error(message, status=400):
+    return JsonResponse({'error': message}, status=status)
+
+
+def video_list_validators(request):
+    """どの動画が変わっても検索結果は変わりうるので、全体の件数と最終更新日時で検証する
+
+    集計はカタログの世代ごとにキャッシュする（検索結果のキャッシュと同じく、保存や取り込みで世代が進む）。
+    """
+    state = cache.get_or_set(
+        f'{STATE_KEY_PREFIX}:{catalogue.generation()}',
+        lambda: Video.objects.aggregate(count=Count('id'), updated=Max('updated_at')),
+        STATE_TIMEOUT,
+    )
+    return (request.GET.urlencode(), state['count'], state['updated']), state['updated']
+
+
+def video_detail_validators(request, pk):
+    updated_at = Video.objects.filter(pk=pk).values_list('updated_at', flat=True).first()
+    if updated_at is None:
+        return None
+    return (pk, updated_at, request.GET.urlencode()), updated_at
+
+
+@require_GET
+@gzip_page
+@conditional_view(video_list_validators, csrf=False)
+@cache_anonymous('api-videos')
+def video_list(request):
+    """検索条件（video_search と同じパラメータ）に一致する動画をキーセット方式で返す"""
+    try:
+        fields = parse_fields(request.GET, VIDEO_FIELDS)
+    except InvalidFields as e:
+        return error(str(e))
+    # 関連度順はキーセット方式のカーソルと両立しないので受け付けない
+    if request.GET.get('sort') == 'relevance':
+        return error('sort=relevance は使えません（結果は日付の新しい順です）')
+    try:
+        per_page = max(1, min(int(request.GET.get('per_page', PER_PAGE)), PER_PAGE))
+    except ValueError:
+        per_page = PER_PAGE
+
+    videos, _ = build_search_queryset(request.GET)
+    # カーソルを作るため date / id は常に読む
+    paths = [VIDEO_FIELDS[name] for name in fields]
+    rows = videos.values(*dict.fromkeys(paths + ['date', 'id']))
+    try:
+        page = pagination.paginate(
+            rows, after=request.GET.get('after'), before=request.GET.get('before'), per_page=per_page
+        )
+    except pagination.InvalidCursor as e:
+        return error(str(e))
+
+    data = {
+        'results': [{name: row[VIDEO_FIELDS[name]] for name in fields} for row in page],
+        'next': page.next_cursor,
+        'previous': page.previous_cursor,
+    }
+    if request.GET.get('estimate'):
+        count, capped = pagination.estimated_count(videos)
+        data['estimated_count'] = count
+        data['estimated_count_capped'] = capped
+    return JsonResponse(data)
+
+
+@require_GET
+@gzip_page
+@conditional_view(video_detail_validators, csrf=False)
+def video_detail(request, pk):
+    try:
+        fields = parse_fields(request.GET, VIDEO_FIELDS)
+    except InvalidFields as e:
+        return error(str(e))
+    rows = project(Video.objects.filter(pk=pk), fields, VIDEO_FIELDS)
+    if not rows:
+        return error('動画が見つかりません', status=404)
+    return JsonResponse(rows[0])
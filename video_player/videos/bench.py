@@ -0,0 +1,105 @@
+"""ベンチマーク用の合成データと使い捨てDB"""
+import os
+import random
+import statistics
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from itertools import islice
+
+from django.db import connection
+
+from .models import Channel, Video
+
+TITLE_WORDS = ['歌ってみた', 'Cover', 'covered by', 'オリジナル曲', 'MV', '弾き語り', 'shorts', 'ライブ', 'remix', 'feat.']
+SONGS = ['明日の私に幸あれ', '名前のない怪物', 'Beyond the way', 'アイドル', 'KING', 'シャルル', 'ロキ', '夜に駆ける', 'ヴァンパイア', '強風オールバック']
+
+
+@contextmanager
+def scratch_database(verbosity=0, on_disk=False):
+    """テスト用DBを作成して切り替え、終了時に破棄する（開発用DBには触れない）
+
+    on_disk=True なら SQLite でもメモリ上ではなく一時ファイルに作る（複数接続での計測用）。
+    """
+    test_settings = connection.settings_dict['TEST']
+    old_test_name = test_settings.get('NAME')
+    with tempfile.TemporaryDirectory() as tmpdir:
+        if on_disk and connection.vendor == 'sqlite':
+            test_settings['NAME'] = os.path.join(tmpdir, 'scratch.sqlite3')
+        old_name = connection.creation.create_test_db(verbosity=verbosity, autoclobber=True, serialize=False)
+        try:
+            yield
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity)
+            test_settings['NAME'] = old_test_name
+
+
+def seed_channels(count=4000):
+    """categorize.csv と同程度の数の合成チャンネル（1/4 を check=1 にする）"""
+    Channel.objects.bulk_create([
+        Channel(name=f'チャンネル{i} Ch.', checked=i % 4 == 0, agency='にじさんじ' if i % 2 else 'ホロライブ')
+        for i in range(count)
+    ], batch_size=1000)
+    return list(Channel.objects.all())
+
+
+def synthetic_videos(count, channels, seed=0, offset=0):
+    """main-data.csv と同じ形の動画を count 件生成（動画IDは offset から連番）"""
+    rng = random.Random(seed)
+    start = datetime(2020, 1, 1, tzinfo=timezone.utc)
+    for i in range(offset, offset + count):
+        channel = rng.choice(channels)
+        youtube_id = f'{i:011d}'
+        yield Video(
+            title=f'【{rng.choice(TITLE_WORDS)}】{rng.choice(SONGS)} #{i} / {channel.name}',
+            channel=channel,
+            date=start + timedelta(seconds=rng.randrange(5 * 365 * 24 * 3600)),
+            url=f'https://www.youtube.com/watch?v={youtube_id}',
+            youtube_id=youtube_id,
+            playlist=f'Gilzaren III RECOMMEND MUSIC {rng.randrange(1, 41):02d}',
+        )
+
+
+def seed_videos(count, channels=4000, batch_size=5000, seed=0):
+    """合成動画を batch_size 件ずつ投入する（100万件でも全件をメモリに載せない）"""
+    videos = synthetic_videos(count, seed_channels(channels), seed=seed)
+    while batch := list(islice(videos, batch_size)):
+        Video.objects.bulk_create(batch)
+    return count
+
+
+def measure(func, repeat=5):
+    """func を repeat 回実行し、経過時間（ミリ秒）のリストを返す"""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+def peak_memory(func):
+    """func を1回実行したときの Python のメモリ確保量のピーク（KiB）"""
+    tracemalloc.start()
+    try:
+        func()
+        return round(tracemalloc.get_traced_memory()[1] / 1024, 1)
+    finally:
+        tracemalloc.stop()
+
+
+def percentile(timings, q):
+    """timings の q パーセンタイル（最近傍法）"""
+    ordered = sorted(timings)
+    return ordered[min(len(ordered) - 1, max(0, round(q / 100 * len(ordered)) - 1))]
+
+
+def summarize(timings):
+    return {
+        'median_ms': round(statistics.median(timings), 3),
+        'p99_ms': round(percentile(timings, 99), 3),
+        'min_ms': round(min(timings), 3),
+        'max_ms': round(max(timings), 3),
+    }
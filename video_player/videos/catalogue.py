@@ -0,0 +1,62 @@
+"""検索フォームのチャンネル候補（動画のあるチャンネル名一覧）のキャッシュ
+
+一覧はキャッシュに載せ、前方一致は大文字小文字を無視したソート済みキーへの
+二分探索で行う。動画・チャンネルの保存や import_videos で無効化する。
+ローカルメモリキャッシュでは別プロセスからの無効化が届かないため、TIMEOUT で
+期限切れにもする。
+
+無効化のたびに「カタログの世代」を進める。検索結果のキャッシュは世代をキーに
+含めるので、古い世代のエントリは削除しなくても参照されなくなる。
+"""
+import time
+from bisect import bisect_left
+
+from django.core.cache import cache
+from django.db.models import Exists, OuterRef
+
+from .models import Channel, Video
+
+CACHE_KEY = 'videos:channel-catalogue'
+GENERATION_KEY = 'videos:catalogue-generation'
+TIMEOUT = 60 * 10
+
+
+def _load():
+    names = Channel.objects.filter(
+        Exists(Video.objects.filter(channel=OuterRef('pk')))
+    ).values_list('name', flat=True)
+    entries = sorted((name.strip().casefold(), name) for name in names)
+    return [key for key, _ in entries], [name for _, name in entries]
+
+
+def get_catalogue():
+    """(検索用キーのリスト, チャンネル名のリスト) をキャッシュから返す"""
+    return cache.get_or_set(CACHE_KEY, _load, TIMEOUT)
+
+
+def generation():
+    """現在のカタログの世代"""
+    # キャッシュから追い出されても過去の世代に戻らないよう、初期値は現在時刻にする
+    cache.add(GENERATION_KEY, time.time_ns(), None)
+    return cache.get(GENERATION_KEY)
+
+
+def invalidate():
+    cache.delete(CACHE_KEY)
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        cache.add(GENERATION_KEY, time.time_ns(), None)
+
+
+def match_prefix(prefix, limit=20):
+    """前方一致するチャンネル名を最大 limit 件返す"""
+    keys, names = get_catalogue()
+    prefix = prefix.strip().casefold()
+    start = bisect_left(keys, prefix)
+    matches = []
+    for key, name in zip(keys[start:], names[start:]):
+        if not key.startswith(prefix) or len(matches) >= limit:
+            break
+        matches.append(name)
+    return matches
@@ -0,0 +1,74 @@
+"""条件付きGET（ETag / Last-Modified）
+
+各ページの検証子は updated_at の集計だけで求め、一致すればテンプレートを描画せずに
+304 を返す。condition() は ETag と Last-Modified を別々に問い合わせるので、
+1リクエスト中は集計結果を request に覚えておき、クエリは一度だけにする。
+"""
+import hashlib
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.db.models import Count, Max
+from django.middleware.csrf import get_token
+from django.views.decorators.http import condition
+
+from playlists.models import Playlist
+from .shortcuts import auser
+
+
+def user_state(request):
+    """base.html に描画されるユーザーの状態（ユーザーとプレイリスト一覧）
+
+    (ユーザーID, プレイリスト数, 最終更新日時, CSRFトークンの秘密値) を返す。未ログインなら
+    (None, 0, None, None)。ログイン中のページはフォームに {% csrf_token %} を含むので、
+    ログインし直してトークンが変わったら 304 で古いページを使わせないよう ETag に含める。
+    """
+    if not request.user.is_authenticated:
+        return None, 0, None, None
+    state = Playlist.objects.filter(user=request.user).aggregate(count=Count('id'), updated=Max('updated_at'))
+    get_token(request)  # 初回でも描画前にトークンを決めておく（304 でもクッキーは送られる）
+    return request.user.pk, state['count'], state['updated'], request.META['CSRF_COOKIE']
+
+
+def conditional_view(validators, csrf=True):
+    """validators(request, *args, **kwargs) が返す (ETag の元になる値, 最終更新日時) で条件付きGETにする
+
+    validators が None を返したとき（対象が存在しないなど）は検証せずにビューを実行する。
+    非同期ビューにも使える（condition() は検証子を同期で呼ぶので、先にスレッドで集計しておく）。
+    フォームを描画しないビュー（JSON API）は csrf=False にすると、ログイン中も Last-Modified を送る。
+    """
+    def get_state(request, *args, **kwargs):
+        if not hasattr(request, '_conditional_state'):
+            request._conditional_state = validators(request, *args, **kwargs)
+        return request._conditional_state
+
+    def etag(request, *args, **kwargs):
+        state = get_state(request, *args, **kwargs)
+        if state is None:
+            return None
+        return hashlib.md5(repr(state[0]).encode()).hexdigest()
+
+    def last_modified(request, *args, **kwargs):
+        state = get_state(request, *args, **kwargs)
+        # If-Modified-Since だけでは CSRF トークンの変化を検出できないので、ログイン中は ETag だけで検証する
+        if state is None or (csrf and request.user.is_authenticated):
+            return None
+        return state[1]
+
+    def decorator(view):
+        conditioned = condition(etag_func=etag, last_modified_func=last_modified)(view)
+        if not iscoroutinefunction(view):
+            return conditioned
+
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method in ('GET', 'HEAD'):
+                await auser(request)
+                await sync_to_async(get_state)(request, *args, **kwargs)
+            return await conditioned(request, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def latest(*timestamps):
+    return max((t for t in timestamps if t is not None), default=None)
@@ -0,0 +1,58 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from videos.models import Video, extract_youtube_id
+
+
+class Command(BaseCommand):
+    help = 'youtube_id が未設定の動画に URL から取り出した動画IDを設定します（チャンク単位で処理）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000, help='1トランザクションで処理する行数')
+
+    def handle(self, *args, **kwargs):
+        batch_size = kwargs['batch_size']
+        filled = duplicated = invalid = 0
+        last_pk = 0
+
+        while True:
+            # pk のキーセットで進めるので、更新しなかった行を何度も読むことはない
+            chunk = list(
+                Video.objects.filter(youtube_id__isnull=True, pk__gt=last_pk)
+                .order_by('pk').only('id', 'url')[:batch_size]
+            )
+            if not chunk:
+                break
+            last_pk = chunk[-1].pk
+
+            ids = {}
+            for video in chunk:
+                youtube_id = extract_youtube_id(video.url)
+                if not youtube_id:
+                    invalid += 1
+                elif youtube_id in ids:
+                    duplicated += 1
+                else:
+                    ids[youtube_id] = video
+
+            with transaction.atomic():
+                # 登録済みの動画IDと重なる行は一意制約に反するので設定しない
+                taken = set(Video.objects.filter(youtube_id__in=list(ids)).values_list('youtube_id', flat=True))
+                updates = []
+                now = timezone.now()
+                for youtube_id, video in ids.items():
+                    if youtube_id in taken:
+                        duplicated += 1
+                        continue
+                    video.youtube_id = youtube_id
+                    video.updated_at = now
+                    updates.append(video)
+                Video.objects.bulk_update(updates, ['youtube_id', 'updated_at'])
+
+            filled += len(updates)
+            if kwargs['verbosity'] >= 2:
+                self.stdout.write(f"pk {last_pk} まで処理（設定 {filled} 件）")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{filled} 件の動画IDを設定しました。（重複 {duplicated} 件、ID を取り出せない URL {invalid} 件）"
+        ))
@@ -0,0 +1,102 @@
+import random
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, connections, transaction
+from video_player.database import sqlite_init_command
+from videos import bench, pagination, search
+from videos.models import Video
+from videos.views import build_search_queryset
+
+# 調整前（Django の既定）に近い設定。比較用
+BASELINE_OPTIONS = {'init_command': sqlite_init_command({'journal_mode': 'DELETE'})}
+
+
+class Command(BaseCommand):
+    help = 'インポート（書き込み）と検索（読み込み）を同時に流し、ロック待ちとエラーを計測します（使い捨てDBを使用）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=50000, help='事前に投入する動画の件数')
+        parser.add_argument('--duration', type=float, default=10, help='計測時間（秒）')
+        parser.add_argument('--readers', type=int, default=4, help='検索するスレッド数')
+        parser.add_argument('--batch-size', type=int, default=2000, help='インポート1トランザクションあたりの件数')
+        parser.add_argument('--baseline', action='store_true', help='WAL などの調整をせずに計測する')
+
+    def handle(self, *args, **kwargs):
+        if connection.vendor != 'sqlite':
+            raise CommandError('このベンチマークはSQLiteのロック競合を計測するためのものです。')
+
+        options = connection.settings_dict['OPTIONS']
+        saved_options = dict(options)
+        if kwargs['baseline']:
+            options.clear()
+            options.update(BASELINE_OPTIONS)
+        try:
+            with bench.scratch_database(on_disk=True):
+                self.run(**kwargs)
+        finally:
+            options.clear()
+            options.update(saved_options)
+
+    def run(self, **kwargs):
+        channels = bench.seed_channels()
+        Video.objects.bulk_create(bench.synthetic_videos(kwargs['rows'], channels), batch_size=5000)
+        search.rebuild_index()
+        mode = connection.cursor().execute('PRAGMA journal_mode').fetchone()[0]
+        self.stdout.write(
+            f"{kwargs['rows']} 件の合成データで {kwargs['duration']:.0f} 秒計測します"
+            f"（journal_mode={mode}、検索 {kwargs['readers']} スレッド + インポート 1 スレッド）"
+        )
+        connection.close()
+
+        stop = threading.Event()
+        results = {'search': ([], []), 'import': ([], [])}  # (所要時間, エラー)
+
+        def worker(name, operation):
+            timings, errors = results[name]
+            rng = random.Random(name + threading.current_thread().name)
+            try:
+                while not stop.is_set():
+                    started = time.perf_counter()
+                    try:
+                        operation(rng)
+                    except OperationalError as e:
+                        errors.append(str(e))
+                    else:
+                        timings.append((time.perf_counter() - started) * 1000)
+            finally:
+                connections.close_all()
+
+        def run_search(rng):
+            videos, _ = build_search_queryset({'title': rng.choice(bench.SONGS)})
+            list(pagination.paginate(videos.select_related('channel'), per_page=100))
+
+        offset = [kwargs['rows']]
+
+        def run_import(rng):
+            # import_videos.import_chunk と同じく1チャンクを1トランザクションで登録
+            videos = list(bench.synthetic_videos(kwargs['batch_size'], channels, seed=offset[0], offset=offset[0]))
+            offset[0] += kwargs['batch_size']
+            with transaction.atomic():
+                Video.objects.bulk_create(videos, batch_size=500)
+                search.index_queryset(Video.objects.filter(youtube_id__in=[video.youtube_id for video in videos]))
+
+        threads = [threading.Thread(target=worker, args=('import', run_import))]
+        threads += [threading.Thread(target=worker, args=('search', run_search)) for _ in range(kwargs['readers'])]
+        for thread in threads:
+            thread.start()
+        time.sleep(kwargs['duration'])
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+        for name, (timings, errors) in results.items():
+            line = f"{name}: {len(timings)} 回（{len(timings) / kwargs['duration']:.1f} 回/秒）"
+            if timings:
+                summary = bench.summarize(timings)
+                line += f"、中央値 {summary['median_ms']:.1f}ms、p99 {summary['p99_ms']:.1f}ms"
+            line += f"、エラー {len(errors)} 件"
+            self.stdout.write(line)
+            for message in sorted(set(errors)):
+                self.stdout.write(f"  {message}")
@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+from videos import bench, search
+from videos.models import Video
+
+
+class Command(BaseCommand):
+    help = '合成データで icontains 検索と全文検索インデックスの応答時間を比較します（使い捨てDBを使用）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100000, help='生成する動画の件数')
+        parser.add_argument('--repeat', type=int, default=5, help='各クエリの実行回数')
+
+    def handle(self, *args, **kwargs):
+        if not search.is_available():
+            raise CommandError('全文検索インデックスはSQLiteでのみ利用できます。')
+
+        cases = [
+            {'title': '名前のない怪物'},
+            {'title': 'beyond the way'},
+            {'title': 'オリジナル曲'},
+            {'channel': 'チャンネル123 '},
+            {'title': '夜に駆ける', 'channel': 'チャンネル12'},
+        ]
+
+        with bench.scratch_database():
+            bench.seed_videos(kwargs['rows'])
+            search.rebuild_index()
+            self.stdout.write(f"{kwargs['rows']} 件の合成データで計測します（1ページ目 + 件数）")
+
+            for terms in cases:
+                query = Q()
+                for field, value in terms.items():
+                    lookup = 'channel__name__icontains' if field == 'channel' else f'{field}__icontains'
+                    query &= Q(**{lookup: value})
+                like_qs = Video.objects.filter(query).order_by('-date')
+
+                match_query, _ = search.build_match_query(**terms)
+                fts_qs = search.filter_queryset(Video.objects.order_by('-date'), match_query)
+
+                results = {}
+                for name, qs in [('icontains', like_qs), ('fts', fts_qs)]:
+                    timings = bench.measure(lambda: (qs.count(), list(qs[:100])), kwargs['repeat'])
+                    results[name] = bench.summarize(timings)['median_ms']
+
+                self.stdout.write(
+                    f"{terms}: 件数 {fts_qs.count()}, icontains {results['icontains']:.1f}ms, "
+                    f"FTS {results['fts']:.1f}ms（{results['icontains'] / results['fts']:.1f}x）"
+                )
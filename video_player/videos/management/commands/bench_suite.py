@@ -0,0 +1,198 @@
+import csv
+import json
+import os
+import platform
+import sqlite3
+import tempfile
+from datetime import datetime, timezone
+from io import StringIO
+
+import django
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from playlists.models import Playlist, PlaylistVideo
+from playlists.ordering import ORDER_GAP
+from videos import bench, pagination, search
+from videos.models import Channel, Video
+from videos.views import PER_PAGE
+
+PLAYLIST_SIZE = 1000
+
+SEARCH_CASES = {
+    'search_first_page': {},
+    'search_title_fts': {'title': '名前のない怪物'},
+    'search_title_short': {'title': 'MV'},
+    'search_channel': {'channel': 'チャンネル12'},
+    'search_date_range': {'start_date': '2022-01-01T00:00:00Z', 'end_date': '2022-06-30T23:59:59Z'},
+    'search_relevance': {'title': 'cover', 'sort': 'relevance'},
+    'search_page_number_50': {'page': 50},
+}
+
+
+class Command(BaseCommand):
+    help = '合成データで検索・プレイリスト・インポートのレイテンシ、クエリ数、メモリを計測し JSON で出力します（使い捨てDBを使用）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000], help='動画の件数（複数指定可、例: 10000 100000 1000000）')
+        parser.add_argument('--repeat', type=int, default=10, help='各ケースの実行回数')
+        parser.add_argument('--output', help='結果の JSON を書き出すファイル（省略時は標準出力）')
+        parser.add_argument('--compare', help='比較する過去の結果 JSON。悪化していればエラー終了する')
+        parser.add_argument('--threshold', type=float, default=1.5, help='中央値が何倍を超えたら悪化とみなすか')
+
+    def handle(self, *args, **kwargs):
+        report = {
+            'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'environment': {
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'sqlite': sqlite3.sqlite_version,
+            },
+            'results': {},
+        }
+        # レスポンスキャッシュを通さずにビュー本体を計測する
+        with override_settings(
+            ALLOWED_HOSTS=['testserver'],
+            CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}},
+        ):
+            for rows in kwargs['rows']:
+                with bench.scratch_database():
+                    report['results'][str(rows)] = self.run(rows, kwargs['repeat'])
+
+        output = json.dumps(report, ensure_ascii=False, indent=2)
+        if kwargs['output']:
+            with open(kwargs['output'], 'w', encoding='utf-8') as f:
+                f.write(output + '\n')
+            self.print_summary(report)
+        else:
+            self.stdout.write(output)
+
+        if kwargs['compare']:
+            self.compare(report, kwargs['compare'], kwargs['threshold'])
+
+    def run(self, rows, repeat):
+        self.stderr.write(f"{rows} 件の合成データを投入しています…")
+        bench.seed_videos(rows)
+        search.rebuild_index()
+        user = User.objects.create_user('bench', password='bench')
+        playlist = Playlist.objects.create(user=user, name='bench')
+        PlaylistVideo.objects.bulk_create([
+            PlaylistVideo(playlist=playlist, video_id=pk, order=(i + 1) * ORDER_GAP)
+            for i, pk in enumerate(Video.objects.order_by('pk').values_list('pk', flat=True)[:PLAYLIST_SIZE])
+        ])
+
+        anonymous = Client()
+        client = Client()
+        client.force_login(user)
+        results = {}
+
+        for name, params in SEARCH_CASES.items():
+            results[name] = self.measure(lambda: anonymous.get(reverse('video_search'), params), repeat)
+
+        # 10ページ目のカーソル（キーセット方式の深いページ）
+        cursor = None
+        videos = Video.objects.order_by('-date', '-id')
+        for _ in range(10):
+            cursor = pagination.paginate(videos, after=cursor, per_page=PER_PAGE).next_cursor
+        results['search_keyset_page_10'] = self.measure(
+            lambda: anonymous.get(reverse('video_search'), {'after': cursor}), repeat
+        )
+
+        results['playlist_play'] = self.measure(lambda: client.get(reverse('playlist_play', args=[playlist.pk])), repeat)
+
+        reorder_url = reverse('playlist_reorder', args=[playlist.pk])
+        ids = list(playlist.videos.values_list('id', flat=True))
+        results['playlist_reorder_move'] = self.measure(
+            lambda: client.post(reorder_url, json.dumps({'id': ids[-1], 'after': ids[0]}), content_type='application/json'),
+            repeat,
+        )
+        orders = [ids, ids[::-1]]
+
+        def reorder_all():
+            ids = orders.pop(0)
+            orders.append(ids)
+            data = [{'id': pk, 'order': (i + 1) * ORDER_GAP} for i, pk in enumerate(ids)]
+            return client.post(reorder_url, json.dumps(data), content_type='application/json')
+        results['playlist_reorder_bulk'] = self.measure(reorder_all, repeat)
+
+        results['import_videos'] = self.measure_import(rows)
+        return results
+
+    def measure(self, func, repeat):
+        response = func()  # ウォームアップ（結果の確認も兼ねる）
+        if response.status_code >= 400:
+            raise CommandError(f'HTTP {response.status_code}: {response.request["PATH_INFO"]}')
+        with CaptureQueriesContext(connection) as queries:
+            func()
+        # DEBUG=True だとクエリログが上限で回るので、この時点の件数を控えておく
+        query_count = len(queries)
+        return {
+            **bench.summarize(bench.measure(func, repeat)),
+            'queries': query_count,
+            'peak_memory_kib': bench.peak_memory(func),
+        }
+
+    def measure_import(self, rows):
+        """新規 rows/10 件（最大2万件）の CSV を import_videos で取り込む"""
+        count = min(max(rows // 10, 100), 20000)
+        channels = list(Channel.objects.all()[:500])
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'import.csv')
+            with open(path, 'w', newline='', encoding='utf-8') as f:
+                writer = csv.writer(f)
+                writer.writerow(['title', 'channel', 'date', 'url', 'playlist'])
+                for video in bench.synthetic_videos(count, channels, seed=1, offset=rows):
+                    writer.writerow([video.title, video.channel.name, video.date.isoformat(), video.url, video.playlist])
+
+            # 1回目は新規登録、2回目はすべて重複としてスキップされる
+            with CaptureQueriesContext(connection) as queries:
+                [elapsed] = bench.measure(lambda: call_command('import_videos', csv_file=path, stdout=StringIO()), 1)
+            query_count = len(queries)
+            [skip_elapsed] = bench.measure(lambda: call_command('import_videos', csv_file=path, stdout=StringIO()), 1)
+        return {
+            'rows': count,
+            'elapsed_ms': round(elapsed, 3),
+            'rows_per_second': round(count / (elapsed / 1000)),
+            'queries': query_count,
+            'duplicate_elapsed_ms': round(skip_elapsed, 3),
+        }
+
+    def print_summary(self, report):
+        for rows, results in report['results'].items():
+            self.stdout.write(f"{rows} 件")
+            for name, result in results.items():
+                if 'median_ms' in result:
+                    self.stdout.write(
+                        f"  {name}: 中央値 {result['median_ms']:.1f}ms、p99 {result['p99_ms']:.1f}ms、"
+                        f"クエリ {result['queries']}、メモリ {result['peak_memory_kib']:.0f}KiB"
+                    )
+                else:
+                    self.stdout.write(
+                        f"  {name}: {result['rows']} 件を {result['elapsed_ms']:.0f}ms"
+                        f"（{result['rows_per_second']} 行/秒、クエリ {result['queries']}）"
+                    )
+
+    def compare(self, report, path, threshold):
+        """過去の結果と比べ、中央値が threshold 倍を超えたかクエリ数が増えたケースを報告する"""
+        with open(path, encoding='utf-8') as f:
+            baseline = json.load(f)['results']
+
+        regressions = []
+        for rows, results in report['results'].items():
+            for name, result in results.items():
+                before = baseline.get(rows, {}).get(name)
+                if before is None:
+                    continue
+                time_key = 'median_ms' if 'median_ms' in result else 'elapsed_ms'
+                if result[time_key] > before[time_key] * threshold:
+                    regressions.append(f"{rows} 件 {name}: {before[time_key]:.1f}ms → {result[time_key]:.1f}ms")
+                if result['queries'] > before['queries']:
+                    regressions.append(f"{rows} 件 {name}: クエリ {before['queries']} → {result['queries']}")
+
+        if regressions:
+            raise CommandError('性能が悪化しています:\n' + '\n'.join(regressions))
+        self.stdout.write(self.style.SUCCESS(f'{path} と比べて悪化はありません。'))
@@ -0,0 +1,38 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from videos import catalogue
+from videos.models import Channel
+import csv
+
+
+class Command(BaseCommand):
+    help = 'categorize.csv からチャンネルの check / agency を取り込みます（既存チャンネルは更新）'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--csv-file', type=str,
+            default=str(settings.BASE_DIR.parent / 'csv' / 'categorize.csv'), help='CSVファイルへのパス'
+            )
+
+    def handle(self, *args, **kwargs):
+        with open(kwargs['csv_file'], newline='', encoding='utf-8-sig') as f:
+            rows = {row['channel']: row for row in csv.DictReader(f)}
+
+        existing = Channel.objects.in_bulk(list(rows), field_name='name')
+        created = []
+        updated = []
+        for name, row in rows.items():
+            checked = row['check'].strip() == '1'
+            agency = row['agency'].strip()
+            channel = existing.get(name)
+            if channel is None:
+                created.append(Channel(name=name, checked=checked, agency=agency))
+            elif (channel.checked, channel.agency) != (checked, agency):
+                channel.checked = checked
+                channel.agency = agency
+                updated.append(channel)
+
+        Channel.objects.bulk_create(created, batch_size=1000)
+        Channel.objects.bulk_update(updated, ['checked', 'agency'], batch_size=1000)
+        catalogue.invalidate()
+        self.stdout.write(self.style.SUCCESS(f"{len(created)} 件を追加、{len(updated)} 件を更新しました。"))
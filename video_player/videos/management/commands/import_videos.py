@@ -1,62 +1,313 @@
+from django.conf import settings
 from django.core.management.base import BaseCommand
-from videos.models import Video
-from datetime import datetime
+from django.db import transaction
+from django.utils import timezone as django_timezone
+from videos.models import Channel, Video, extract_youtube_id
+from videos import catalogue, search
+from datetime import datetime, timezone
 import csv
+import hashlib
+import json
+import os
+import time
+
+LEGACY_DATE_FORMATS = [
+    "%Y/%m/%d %H:%M",
+    "%Y-%m-%d %H:%M:%S",
+]
+
+
+def parse_date(date_str):
+    """ISO 8601 は fromisoformat で一度に解析し、それ以外は旧形式を順に試す"""
+    date_str = date_str.strip()
+    try:
+        parsed = datetime.fromisoformat(date_str)
+    except ValueError:
+        for fmt in LEGACY_DATE_FORMATS:
+            try:
+                parsed = datetime.strptime(date_str, fmt)
+                break
+            except ValueError:
+                continue
+        else:
+            raise ValueError(f"time data '{date_str}' does not match known formats")
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+ROW_FIELDS = ['title', 'channel', 'date', 'url', 'playlist']
+UPDATE_FIELDS = ['title', 'channel', 'date', 'url', 'playlist', 'updated_at']
+
+
+def file_checksum(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while chunk := f.read(1 << 20):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def row_hash(row):
+    """CSV の1行の内容のハッシュ（id 列は並べ替えで変わるので含めない）"""
+    return hashlib.md5('\x1f'.join(row[field] for field in ROW_FIELDS).encode()).hexdigest()
+
+
+def load_manifest(path):
+    """{CSV の絶対パス: {checksum, rows}} を読み込む（パスを持たない旧形式は捨てる）"""
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as f:
+        manifest = json.load(f)
+    return {} if 'rows' in manifest else manifest
+
+
+def save_manifest(path, manifest):
+    """一時ファイルに書いてから置き換える（途中で落ちても前回のマニフェストが残る）"""
+    # sync_youtube がこのモジュールを読み込むので、ここで読み込む
+    from videos.management.commands.sync_youtube import import_main
+    import_main().atomic_write(path, lambda f: json.dump(manifest, f), suffix='.json')
+
+
+def upsert_videos(rows):
+    """{youtube_id: {title, channel_id, date, url, playlist}} を登録・更新し (追加, 更新, 変更なし) を返す
+
+    登録済みの動画は値が変わった行だけを bulk_update する。呼び出し側でトランザクションを張ること。
+    """
+    rows = dict(rows)
+    changed = []
+    unchanged = 0
+    now = django_timezone.now()
+    for video in Video.objects.filter(youtube_id__in=list(rows)).only(*UPDATE_FIELDS, 'youtube_id'):
+        row = rows.pop(video.youtube_id)
+        if all(getattr(video, field) == value for field, value in row.items()):
+            unchanged += 1
+            continue
+        for field, value in row.items():
+            setattr(video, field, value)
+        video.updated_at = now  # bulk_update は auto_now を更新しない
+        changed.append(video)
+
+    Video.objects.bulk_update(changed, UPDATE_FIELDS, batch_size=500)
+    # ignore_conflicts では登録できた行が分からないので、登録前の最大 id より後の行を数える
+    last_pk = Video.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+    Video.objects.bulk_create(
+        [Video(youtube_id=youtube_id, **row) for youtube_id, row in rows.items()],
+        batch_size=500, ignore_conflicts=True,
+    )
+    created = Video.objects.filter(youtube_id__in=list(rows), pk__gt=last_pk).count()
+    # bulk_create / bulk_update はシグナルを送らないので明示的に登録
+    search.index_queryset(Video.objects.filter(youtube_id__in=[*rows, *(video.youtube_id for video in changed)]))
+    return created, len(changed), unchanged
 
 
 class Command(BaseCommand):
-    help = 'CSVファイルからVideoデータをインポートします（重複URLはスキップ）'
+    help = 'CSVファイルからVideoデータをインポートします（登録済みの動画IDはスキップ）'
 
     def add_arguments(self, parser):
         parser.add_argument(
             '--csv-file', type=str,
             default=r'C:\Users\user\PycharmProjects\MyUtilProject\MyApp\vtuber-music\video_player\videos\data\filtered_data.csv', help='CSVファイルへのパス'
             )
+        parser.add_argument('--batch-size', type=int, default=2000, help='1トランザクションで処理する行数')
+        parser.add_argument(
+            '--diff', action='store_true',
+            help='前回のマニフェストと比べて、追加・変更・削除された行だけを反映する（登録済みの動画も更新する）'
+        )
+        parser.add_argument(
+            '--manifest', type=str, default=str(settings.BASE_DIR / 'import_manifest.json'),
+            help='--diff で使う、CSV ファイルごとの前回のチェックサムと行ごとのハッシュ'
+        )
 
     def handle(self, *args, **kwargs):
         csv_file = kwargs['csv_file']
-        videos = []
-
-        existing_urls = set(Video.objects.values_list('url', flat=True))
+        batch_size = kwargs['batch_size']
+        self.verbosity = kwargs['verbosity']
+        self.channel_ids = {}
+        self.processed = self.imported = self.skipped = 0
+        self.started = time.perf_counter()
 
-        def parse_date_flexibly(date_str):
-            formats = [
-                "%Y-%m-%dT%H:%M:%SZ",
-                "%Y/%m/%d %H:%M",
-                "%Y-%m-%d %H:%M:%S",
-            ]
-            for fmt in formats:
-                try:
-                    return datetime.strptime(date_str.strip(), fmt)
-                except ValueError:
-                    continue
-            raise ValueError(f"time data '{date_str}' does not match known formats")
+        if kwargs['diff']:
+            self.import_diff(csv_file, kwargs['manifest'], batch_size)
+            return
 
+        chunk = {}
         with open(csv_file, newline='', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
+            for row in csv.DictReader(f):
+                self.processed += 1
                 try:
-                    url = row['url'].strip()
-
-                    if url in existing_urls:
-                        self.stderr.write(f"スキップ（重複）: {row.get('title', '不明')}")
+                    youtube_id = self.youtube_id(row)
+                    if youtube_id in chunk:  # CSV内での重複も防止
+                        self.skip(row)
                         continue
 
-                    parsed_date = parse_date_flexibly(row['date'])
+                    chunk[youtube_id] = self.parse_row(row)
+                except Exception as e:
+                    self.stderr.write(f"スキップ（エラー）: {row.get('title', '不明')} 理由: {e}")
+
+                if len(chunk) >= batch_size:
+                    self.import_chunk(chunk)
+                    chunk = {}
+
+        self.import_chunk(chunk)
+        catalogue.invalidate()
+
+        elapsed = time.perf_counter() - self.started
+        self.stdout.write(self.style.SUCCESS(
+            f"{self.imported} 件の動画をインポートしました。"
+            f"（{self.processed} 行、重複 {self.skipped} 件、{elapsed:.1f} 秒、{self.processed / max(elapsed, 1e-9):.0f} 行/秒）"
+        ))
+
+    def youtube_id(self, row):
+        url = row['url'].strip()
+        youtube_id = extract_youtube_id(url)
+        if not youtube_id:
+            raise ValueError(f"動画IDを取得できないURLです: {url}")
+        return youtube_id
+
+    def parse_row(self, row):
+        return {
+            'title': row['title'],
+            'channel': row['channel'],
+            'date': parse_date(row['date']),
+            'url': row['url'],
+            'playlist': row['playlist'].strip() if row['playlist'].strip() else 'Not listed in a playlist',
+        }
+
+    def skip(self, row):
+        self.skipped += 1
+        if self.verbosity >= 2:
+            self.stderr.write(f"スキップ（重複）: {row.get('title', '不明')}")
+
+    def import_chunk(self, chunk):
+        """1チャンクを1トランザクションで登録（重複判定は youtube_id の一意インデックスで行う）"""
+        if not chunk:
+            return
+
+        with transaction.atomic():
+            existing = set(Video.objects.filter(youtube_id__in=list(chunk)).values_list('youtube_id', flat=True))
+            for youtube_id in existing:
+                self.skip(chunk.pop(youtube_id))
+
+            self.resolve_channels({row['channel'] for row in chunk.values()})
+            Video.objects.bulk_create([
+                Video(
+                    title=row['title'],
+                    channel_id=self.channel_ids[row['channel']],
+                    date=row['date'],
+                    url=row['url'],
+                    youtube_id=youtube_id,
+                    playlist=row['playlist'],
+                )
+                for youtube_id, row in chunk.items()
+            ], batch_size=500, ignore_conflicts=True)
+
+            # bulk_create はシグナルを送らないので明示的に登録
+            search.index_queryset(Video.objects.filter(youtube_id__in=list(chunk)))
 
-                    video = Video(
-                        title=row['title'],
-                        channel=row['channel'],
-                        date=parsed_date,
-                        url=row['url'],
-                        playlist=row['playlist'].strip() if row['playlist'].strip() else 'Not listed in a playlist'
-                    )
+        self.imported += len(chunk)
+        if self.verbosity >= 1:
+            elapsed = time.perf_counter() - self.started
+            self.stdout.write(f"{self.processed} 行処理（{self.processed / max(elapsed, 1e-9):.0f} 行/秒）")
 
-                    videos.append(video)
-                    existing_urls.add(url)  # CSV内での重複も防止
+    def resolve_channels(self, names):
+        """チャンネル名 → ID を解決し、未登録のチャンネルはまとめて作成"""
+        missing = [name for name in names if name not in self.channel_ids]
+        if not missing:
+            return
+        Channel.objects.bulk_create([Channel(name=name) for name in missing], batch_size=500, ignore_conflicts=True)
+        self.channel_ids.update(Channel.objects.filter(name__in=missing).values_list('name', 'id'))
 
+    def import_diff(self, csv_file, manifest_file, batch_size):
+        """前回のマニフェストとの差分だけを反映する
+
+        ファイルのチェックサムが同じなら CSV を解析せずに終わる。行ごとのハッシュが
+        変わった動画だけを解析して登録・更新し、前回あって今回ない動画は削除する。
+        削除するのは前回このファイルから取り込んだ動画だけ（他の経路で登録した動画には触れない）。
+        マニフェストは CSV の絶対パスごとに持つので、別のファイルの動画は削除しない。
+        ユーザーのプレイリストに入っている動画も削除せず、次回の差分で改めて削除を試みる。
+        """
+        manifest = load_manifest(manifest_file)
+        key = os.path.abspath(csv_file)
+        entry = manifest.get(key, {'checksum': None, 'rows': {}})
+        checksum = file_checksum(csv_file)
+        if checksum == entry['checksum']:
+            self.stdout.write(self.style.SUCCESS(f"{csv_file} は前回から変わっていません。"))
+            return
+
+        previous = entry['rows']
+        seen = set()
+        hashes = {}
+        self.created = self.updated = 0
+        chunk = {}
+        with open(csv_file, newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                self.processed += 1
+                try:
+                    youtube_id = self.youtube_id(row)
+                    if youtube_id in seen:  # CSV内での重複は先の行を使う
+                        self.skip(row)
+                        continue
+                    seen.add(youtube_id)
+
+                    digest = row_hash(row)
+                    if previous.get(youtube_id) != digest:
+                        chunk[youtube_id] = self.parse_row(row)
+                    # 解析に失敗した行はハッシュを残さず、次回もう一度取り込む
+                    hashes[youtube_id] = digest
                 except Exception as e:
                     self.stderr.write(f"スキップ（エラー）: {row.get('title', '不明')} 理由: {e}")
 
-        Video.objects.bulk_create(videos)
-        self.stdout.write(self.style.SUCCESS(f"{len(videos)} 件の動画をインポートしました。"))
+                if len(chunk) >= batch_size:
+                    self.apply_diff(chunk)
+                    chunk = {}
+
+        self.apply_diff(chunk)
+
+        unchanged = len(hashes) - self.created - self.updated
+        removed = [youtube_id for youtube_id in previous if youtube_id not in seen]
+        deleted = kept = 0
+        for start in range(0, len(removed), batch_size):
+            batch = removed[start:start + batch_size]
+            with transaction.atomic():
+                # 削除すると PlaylistVideo も消えるので、プレイリストに入っている動画は残す
+                in_playlists = set(
+                    Video.objects.filter(youtube_id__in=batch, playlistvideo__isnull=False)
+                    .values_list('youtube_id', flat=True)
+                )
+                _, counts = Video.objects.filter(youtube_id__in=batch).exclude(youtube_id__in=in_playlists).delete()
+                deleted += counts.get('videos.Video', 0)
+            for youtube_id in in_playlists:
+                hashes[youtube_id] = previous[youtube_id]
+            kept += len(in_playlists)
+
+        manifest[key] = {'checksum': checksum, 'rows': hashes}
+        save_manifest(manifest_file, manifest)
+        catalogue.invalidate()
+
+        elapsed = time.perf_counter() - self.started
+        self.stdout.write(self.style.SUCCESS(
+            f"{self.created} 件を追加、{self.updated} 件を更新、{deleted} 件を削除しました。"
+            f"（{self.processed} 行、変更なし {unchanged} 件、{elapsed:.1f} 秒）"
+        ))
+        if kept:
+            self.stdout.write(self.style.WARNING(
+                f"CSV から消えた {kept} 件はプレイリストに入っているため削除しませんでした。"
+            ))
+
+    def apply_diff(self, chunk):
+        """変わった行を1トランザクションで登録・更新する"""
+        if not chunk:
+            return
+        with transaction.atomic():
+            self.resolve_channels({row['channel'] for row in chunk.values()})
+            created, updated, _ = upsert_videos({
+                youtube_id: {
+                    'title': row['title'],
+                    'channel_id': self.channel_ids[row['channel']],
+                    'date': row['date'],
+                    'url': row['url'],
+                    'playlist': row['playlist'],
+                }
+                for youtube_id, row in chunk.items()
+            })
+        self.created += created
+        self.updated += updated
@@ -0,0 +1,79 @@
+import http.client
+import itertools
+import threading
+import time
+from urllib.parse import quote, urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+from videos import bench
+
+DEFAULT_PATHS = [
+    '/search/?title=cover',
+    '/search/?channel=にじさんじ',
+    '/api/search/?fields=id,title,youtube_id&per_page=50',
+    '/video/1/',
+]
+
+
+class Command(BaseCommand):
+    help = '起動中のサーバーに並列でリクエストを送り、リクエスト/秒と p99 レイテンシを比較します'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--target', action='append', required=True,
+            help='名前=ベースURL（例: wsgi=http://127.0.0.1:8000 asgi=http://127.0.0.1:8001）。複数指定可',
+        )
+        parser.add_argument('--path', action='append', help=f'リクエストするパス（既定: {", ".join(DEFAULT_PATHS)}）')
+        parser.add_argument('--concurrency', type=int, default=16, help='同時接続数')
+        parser.add_argument('--duration', type=float, default=10, help='ターゲットごとの計測時間（秒）')
+
+    def handle(self, *args, **kwargs):
+        paths = [quote(path, safe="/?=&,%") for path in kwargs['path'] or DEFAULT_PATHS]
+        for target in kwargs['target']:
+            name, sep, base_url = target.partition('=')
+            if not sep or not base_url.startswith('http://'):
+                raise CommandError(f'--target は 名前=http://ホスト:ポート の形式で指定してください: {target}')
+            timings, errors = self.run(urlsplit(base_url), paths, kwargs['concurrency'], kwargs['duration'])
+
+            line = f"{name}: {len(timings)} 件（{len(timings) / kwargs['duration']:.1f} リクエスト/秒）"
+            if timings:
+                summary = bench.summarize(timings)
+                line += f"、中央値 {summary['median_ms']:.1f}ms、p99 {summary['p99_ms']:.1f}ms"
+            line += f"、エラー {len(errors)} 件"
+            self.stdout.write(line)
+            for message in sorted(set(errors))[:5]:
+                self.stdout.write(f"  {message}")
+
+    def run(self, url, paths, concurrency, duration):
+        """concurrency 本のスレッドがそれぞれ keep-alive の接続で paths を順に送り続ける"""
+        stop = threading.Event()
+        timings, errors = [], []
+
+        def worker(offset):
+            conn = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=30)
+            for path in itertools.islice(itertools.cycle(paths), offset, None):
+                if stop.is_set():
+                    break
+                started = time.perf_counter()
+                try:
+                    conn.request('GET', url.path.rstrip('/') + path)
+                    response = conn.getresponse()
+                    response.read()
+                except (OSError, http.client.HTTPException) as e:
+                    errors.append(f'{path}: {e!r}')
+                    conn.close()
+                    continue
+                if response.status >= 400:
+                    errors.append(f'{path}: HTTP {response.status}')
+                else:
+                    timings.append((time.perf_counter() - started) * 1000)
+            conn.close()
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        time.sleep(duration)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        return timings, errors
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand, CommandError
+from videos import catalogue, search
+
+
+class Command(BaseCommand):
+    help = '動画の全文検索インデックス（FTS5）を作り直します'
+
+    def handle(self, *args, **kwargs):
+        if not search.is_available():
+            raise CommandError('全文検索インデックスはSQLiteでのみ利用できます。')
+
+        count = search.rebuild_index()
+        catalogue.invalidate()  # キャッシュ済みの検索結果も作り直させる
+        self.stdout.write(self.style.SUCCESS(f"{count} 件の動画をインデックスに登録しました。"))
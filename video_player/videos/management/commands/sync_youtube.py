@@ -0,0 +1,102 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from videos.models import Channel, extract_youtube_id
+from videos import catalogue
+from videos.management.commands.import_videos import parse_date, upsert_videos
+import sys
+import time
+
+# 状態ファイルに取り込み対象だったチャンネルを記録するキー（プレイリストIDとは重ならない）
+CHECKED_CHANNELS_KEY = '_checked_channels'
+
+
+def import_main():
+    """リポジトリ直下の main.py（YouTube からの取得処理）を読み込む"""
+    root = str(settings.BASE_DIR.parent)
+    if root not in sys.path:
+        sys.path.insert(0, root)
+    import main
+    return main
+
+
+class Command(BaseCommand):
+    help = 'YouTube のプレイリストを取得し、check=1 のチャンネルの動画を CSV を経由せずに登録・更新します'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--state-file', type=str, default=str(settings.BASE_DIR / 'youtube_sync_state.json'),
+            help='プレイリストごとの ETag と取得済み項目を保存するファイル（main.py の SYNC_STATE_JSON とは別にする）'
+        )
+        parser.add_argument('--full', action='store_true', help='保存済みの状態を使わずに全プレイリストを取得し直す')
+        parser.add_argument('--batch-size', type=int, default=2000, help='1トランザクションで処理する動画数')
+
+    def handle(self, *args, **kwargs):
+        main = import_main()
+        state_file = kwargs['state_file']
+        batch_size = kwargs['batch_size']
+        self.created = self.updated = self.unchanged = self.filtered = 0
+        started = time.perf_counter()
+
+        self.channel_ids = dict(Channel.objects.filter(checked=True).values_list('name', 'id'))
+        sync_state = {} if kwargs['full'] else main.load_sync_state(state_file)
+        # 前回の対象外チャンネルの動画は取り込んでいないので、check=1 になったチャンネルがあれば全件取得し直す
+        # （記録のない古い状態ファイルも、どのチャンネルを取り込んだか分からないので取得し直す）
+        previous = sync_state.get(CHECKED_CHANNELS_KEY)
+        if sync_state and (previous is None or not set(self.channel_ids) <= set(previous)):
+            self.stdout.write("check=1 のチャンネルが前回から増えたため、全件を取得し直します。")
+            sync_state = {}
+        playlists = main.get_playlists(main.API_KEY, main.CHANNEL_ID)
+        # 項目数が前回と同じプレイリストは取得しない（変わったものも差分だけ取得される）
+        targets = [
+            playlist for playlist in playlists
+            if playlist['video_count'] != len(sync_state.get(playlist['playlist_id'], {}).get('item_ids', ()))
+        ]
+        self.stdout.write(f"{len(playlists)} 件中 {len(targets)} 件のプレイリストを取得します。")
+        if not targets:
+            return
+
+        results = main.fetch_playlists_concurrently(targets, sync_state=sync_state)
+        videos = [video for _, items, _ in results for video in items]
+
+        for start in range(0, len(videos), batch_size):
+            self.upsert(videos[start:start + batch_size])
+        catalogue.invalidate()
+
+        # DB に書き込めたプレイリストだけ状態を進める（取得に失敗したものは次回やり直す）
+        for playlist, _, sync_entry in results:
+            sync_state[playlist['playlist_id']] = sync_entry
+        sync_state[CHECKED_CHANNELS_KEY] = sorted(self.channel_ids)
+        main.save_sync_state(sync_state, state_file)
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"{self.created} 件を追加、{self.updated} 件を更新しました。"
+            f"（取得 {len(videos)} 件、変更なし {self.unchanged} 件、対象外チャンネル {self.filtered} 件、{elapsed:.1f} 秒）"
+        ))
+
+    def upsert(self, items):
+        """取得した動画を youtube_id で突き合わせ、新規は登録・変わった行だけ更新する"""
+        rows = {}
+        for item in items:
+            channel_id = self.channel_ids.get(item['channel'])
+            if channel_id is None:
+                self.filtered += 1
+                continue
+            youtube_id = extract_youtube_id(item['url'])
+            if youtube_id and youtube_id not in rows:  # 複数のプレイリストにある動画は先に取得した方を使う
+                rows[youtube_id] = {
+                    'title': item['title'],
+                    'channel_id': channel_id,
+                    'date': parse_date(item['date']),
+                    'url': item['url'],
+                    'playlist': item['playlist'],
+                }
+        if not rows:
+            return
+
+        with transaction.atomic():
+            created, updated, unchanged = upsert_videos(rows)
+        self.created += created
+        self.updated += updated
+        self.unchanged += unchanged
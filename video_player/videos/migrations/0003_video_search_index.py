@@ -0,0 +1,29 @@
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS videos_video_fts USING fts5(title, channel, tokenize='trigram')"
+    )
+    schema_editor.execute(
+        "INSERT INTO videos_video_fts(rowid, title, channel) SELECT id, title, channel FROM videos_video"
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute("DROP TABLE IF EXISTS videos_video_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videos', '0002_remove_video_playlist_name_remove_video_youtube_id_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,113 @@
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+from urllib.parse import urlparse, parse_qs
+
+
+def extract_youtube_id(url):
+    try:
+        parsed = urlparse(url)
+        if parsed.hostname == "youtu.be":
+            return parsed.path[1:]
+        elif parsed.hostname and "youtube" in parsed.hostname:
+            return parse_qs(parsed.query).get("v", [""])[0]
+    except ValueError:
+        pass
+    return ""
+
+
+def normalize_channels(apps, schema_editor):
+    Channel = apps.get_model('videos', 'Channel')
+    Video = apps.get_model('videos', 'Video')
+
+    names = Video.objects.values_list('channel_name', flat=True).distinct()
+    Channel.objects.bulk_create([Channel(name=name) for name in names], batch_size=1000)
+    Video.objects.update(channel=Subquery(
+        Channel.objects.filter(name=OuterRef('channel_name')).values('pk')[:1]
+    ))
+
+    # 同じ動画IDが複数行ある場合は最初の1件だけにIDを入れる
+    seen = set()
+    batch = []
+    for video in Video.objects.only('id', 'url').order_by('id').iterator(chunk_size=2000):
+        youtube_id = extract_youtube_id(video.url) or None
+        if youtube_id in seen:
+            youtube_id = None
+        elif youtube_id:
+            seen.add(youtube_id)
+        video.youtube_id = youtube_id
+        batch.append(video)
+        if len(batch) >= 2000:
+            Video.objects.bulk_update(batch, ['youtube_id'])
+            batch = []
+    Video.objects.bulk_update(batch, ['youtube_id'])
+
+
+def denormalize_channels(apps, schema_editor):
+    Channel = apps.get_model('videos', 'Channel')
+    Video = apps.get_model('videos', 'Video')
+    Video.objects.update(channel_name=Subquery(
+        Channel.objects.filter(pk=OuterRef('channel_id')).values('name')[:1]
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videos', '0003_video_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Channel',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('checked', models.BooleanField(default=False)),
+                ('agency', models.CharField(blank=True, max_length=100)),
+            ],
+        ),
+        migrations.RenameField(
+            model_name='video',
+            old_name='channel',
+            new_name='channel_name',
+        ),
+        migrations.AlterField(
+            model_name='video',
+            name='channel_name',
+            field=models.CharField(max_length=255, null=True),
+        ),
+        migrations.AddField(
+            model_name='video',
+            name='channel',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='videos', to='videos.channel'),
+        ),
+        migrations.AddField(
+            model_name='video',
+            name='youtube_id',
+            field=models.CharField(blank=True, max_length=20, null=True),
+        ),
+        migrations.RunPython(normalize_channels, denormalize_channels),
+        migrations.RemoveField(
+            model_name='video',
+            name='channel_name',
+        ),
+        migrations.AlterField(
+            model_name='video',
+            name='channel',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, related_name='videos', to='videos.channel'),
+        ),
+        migrations.AlterField(
+            model_name='video',
+            name='youtube_id',
+            field=models.CharField(blank=True, max_length=20, null=True, unique=True),
+        ),
+        migrations.AddIndex(
+            model_name='video',
+            index=models.Index(fields=['-date', '-id'], name='video_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='video',
+            index=models.Index(fields=['channel', '-date'], name='video_channel_date_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videos', '0004_channel_video_youtube_id_and_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='video',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
@@ -0,0 +1,36 @@
+from django.db import migrations
+
+# SQLite の FTS5 インデックス（0003）に相当するもの。PostgreSQL では全文検索を使わず
+# icontains（UPPER(...) LIKE UPPER(...)）になるので、同じ式の pg_trgm GIN インデックスを張る
+TRIGRAM_INDEXES = [
+    ('video_title_trgm_idx', 'videos_video', 'title'),
+    ('channel_name_trgm_idx', 'videos_channel', 'name'),
+]
+
+
+def create_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for name, table, column in TRIGRAM_INDEXES:
+        schema_editor.execute(
+            f"CREATE INDEX IF NOT EXISTS {name} ON {table} USING gin (UPPER({column}::text) gin_trgm_ops)"
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, _, _ in TRIGRAM_INDEXES:
+        schema_editor.execute(f"DROP INDEX IF EXISTS {name}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videos', '0005_video_updated_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
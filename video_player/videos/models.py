@@ -2,21 +2,72 @@ from django.db import models
 from urllib.parse import urlparse, parse_qs
 
 
+def extract_youtube_id(url):
+    """YouTubeのURLから動画IDを取り出す（取り出せなければ空文字）"""
+    try:
+        parsed = urlparse(url)
+        if parsed.hostname == "youtu.be":
+            return parsed.path[1:]
+        elif parsed.hostname and "youtube" in parsed.hostname:
+            return parse_qs(parsed.query).get("v", [""])[0]
+    except ValueError:
+        pass
+    return ""
+
+
+class Channel(models.Model):
+    name = models.CharField(max_length=255, unique=True)
+    checked = models.BooleanField(default=False)  # categorize.csv の check 列
+    agency = models.CharField(max_length=100, blank=True)
+
+    def __str__(self):
+        return self.name
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if 'name' in field_names:
+            instance._saved_name = values[field_names.index('name')]
+        return instance
+
+    def name_changed(self):
+        """読み込んでから name が変わったか（signals で全文検索インデックスの更新に使う）"""
+        return 'name' in self.__dict__ and self.name != getattr(self, '_saved_name', self.name)
+
+
 class Video(models.Model):
     title = models.CharField(max_length=255)
-    channel = models.CharField(max_length=255)
+    # (channel, -date) の複合インデックスが単独インデックスを兼ねる
+    channel = models.ForeignKey(Channel, on_delete=models.PROTECT, related_name='videos', db_index=False)
     date = models.DateTimeField()
     url = models.URLField()
+    youtube_id = models.CharField(max_length=20, unique=True, null=True, blank=True)
     playlist = models.CharField(max_length=255, blank=True, null=True)
+    # 条件付きGET（ETag / Last-Modified）用。update() / bulk_update() では自分で設定すること
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-date', '-id'], name='video_date_idx'),
+            models.Index(fields=['channel', '-date'], name='video_channel_date_idx'),
+        ]
 
-    @property
-    def youtube_id(self):
-        try:
-            parsed = urlparse(self.url)
-            if parsed.hostname == "youtu.be":
-                return parsed.path[1:]
-            elif "youtube" in parsed.hostname:
-                return parse_qs(parsed.query).get("v", [""])[0]
-        except:
-            return ""
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if 'url' in field_names:
+            instance._saved_url = values[field_names.index('url')]
+        return instance
 
+    def save(self, *args, **kwargs):
+        if self._state.adding:
+            self.youtube_id = extract_youtube_id(self.url) or self.youtube_id or None
+        elif 'url' in self.__dict__ and self.url != getattr(self, '_saved_url', self.url):
+            # URL が変わったときだけ取り出し直す。重複のため NULL のまま残した動画
+            # （移行 0004・backfill_youtube_ids）は、新しい ID が使われていれば値を変えない
+            youtube_id = extract_youtube_id(self.url)
+            if youtube_id and not Video.objects.filter(youtube_id=youtube_id).exclude(pk=self.pk).exists():
+                self.youtube_id = youtube_id
+        super().save(*args, **kwargs)
+        if 'url' in self.__dict__:
+            self._saved_url = self.url
@@ -0,0 +1,98 @@
+"""(date, id) をキーにしたキーセット（シーク）ページネーション
+
+OFFSET と COUNT(*) を使わないので、何ページ目でも1ページ目と同じコストで取得できる。
+クエリセットは -date, -id 順で渡すこと（video_date_idx インデックスと一致する）。
+values() のクエリセットも渡せる（date と id を含めること）。
+"""
+import base64
+from datetime import datetime
+
+from django.db.models import Q
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(video):
+    date, pk = (video['date'], video['id']) if isinstance(video, dict) else (video.date, video.pk)
+    raw = f'{date.isoformat()}|{pk}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        date, pk = raw.rsplit('|', 1)
+        return datetime.fromisoformat(date), int(pk)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise InvalidCursor(f'不正なカーソルです: {cursor}') from e
+
+
+class KeysetPage:
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+
+def _window(queryset, after=None, before=None, per_page=100):
+    """カーソルの位置から per_page + 1 件（次があるかの判定用に1件多く）を取るクエリセット"""
+    if before:
+        date, pk = decode_cursor(before)
+        return queryset.filter(Q(date__gt=date) | Q(date=date, pk__gt=pk)).order_by('date', 'id')[:per_page + 1]
+    if after:
+        date, pk = decode_cursor(after)
+        queryset = queryset.filter(Q(date__lt=date) | Q(date=date, pk__lt=pk))
+    return queryset.order_by('-date', '-id')[:per_page + 1]
+
+
+def _page(rows, after=None, before=None, per_page=100):
+    has_more = len(rows) > per_page
+    if before:
+        rows = rows[:per_page][::-1]
+        return KeysetPage(
+            rows,
+            next_cursor=encode_cursor(rows[-1]) if rows else before,
+            previous_cursor=encode_cursor(rows[0]) if has_more else None,
+        )
+    rows = rows[:per_page]
+    return KeysetPage(
+        rows,
+        next_cursor=encode_cursor(rows[-1]) if has_more else None,
+        previous_cursor=encode_cursor(rows[0]) if after and rows else None,
+    )
+
+
+def paginate(queryset, after=None, before=None, per_page=100):
+    """after（次ページ）/ before（前ページ）のカーソル位置から per_page 件を取得"""
+    return _page(list(_window(queryset, after, before, per_page)), after, before, per_page)
+
+
+async def apaginate(queryset, after=None, before=None, per_page=100):
+    """paginate の非同期版"""
+    rows = [row async for row in _window(queryset, after, before, per_page)]
+    return _page(rows, after, before, per_page)
+
+
+def estimated_count(queryset, cap=10000):
+    """件数を cap 件までで打ち切って数える。(件数, cap を超えたか) を返す"""
+    count = queryset.order_by()[:cap + 1].count()
+    return min(count, cap), count > cap
+
+
+async def aestimated_count(queryset, cap=10000):
+    count = await queryset.order_by()[:cap + 1].acount()
+    return min(count, cap), count > cap
@@ -0,0 +1,79 @@
+"""未ログインユーザー向けの検索結果レスポンスのキャッシュ
+
+未ログイン時の検索結果はクエリ文字列だけで決まるので、正規化したパラメータと
+カタログの世代（catalogue.generation）をキーにレンダリング結果を保存する。
+動画の保存や import_videos で世代が進むと、古いエントリは使われなくなる。
+"""
+import hashlib
+from functools import wraps
+from urllib.parse import urlencode
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.core.cache import cache
+from django.http import HttpResponse
+
+from . import catalogue
+from .shortcuts import auser
+
+KEY_PREFIX = 'videos:response'
+TIMEOUT = 60 * 5
+
+# 検索結果に影響するパラメータ（これ以外は無視してキーを揃える）
+SEARCH_PARAMS = (
+    'title', 'channel', 'start_date', 'end_date', 'sort', 'estimate', 'page', 'after', 'before', 'per_page', 'fields',
+)
+
+
+def cache_key(name, params):
+    """空の値と未知のパラメータを除き、並び順を揃えてキーにする"""
+    items = sorted((key, value) for key in SEARCH_PARAMS for value in params.getlist(key) if value)
+    digest = hashlib.sha1(urlencode(items).encode()).hexdigest()
+    return f'{KEY_PREFIX}:{name}:{catalogue.generation()}:{digest}'
+
+
+def cache_anonymous(name, timeout=TIMEOUT):
+    """未ログインの GET リクエストのレスポンス（200 のみ）をキャッシュするデコレータ
+
+    同期ビュー・非同期ビューのどちらにも使える。
+    """
+    def cacheable(request, user):
+        return request.method == 'GET' and not user.is_authenticated
+
+    def store(key, response, timeout):
+        if response.status_code == 200 and not response.streaming:
+            cache.set(key, (response.content, response['Content-Type']), timeout)
+
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                if not cacheable(request, await auser(request)):
+                    return await view(request, *args, **kwargs)
+
+                key = await sync_to_async(cache_key)(name, request.GET)
+                cached = await cache.aget(key)
+                if cached is not None:
+                    content, content_type = cached
+                    return HttpResponse(content, content_type=content_type)
+
+                response = await view(request, *args, **kwargs)
+                await sync_to_async(store)(key, response, timeout)
+                return response
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if not cacheable(request, request.user):
+                return view(request, *args, **kwargs)
+
+            key = cache_key(name, request.GET)
+            cached = cache.get(key)
+            if cached is not None:
+                content, content_type = cached
+                return HttpResponse(content, content_type=content_type)
+
+            response = view(request, *args, **kwargs)
+            store(key, response, timeout)
+            return response
+        return wrapper
+    return decorator
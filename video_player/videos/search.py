@@ -0,0 +1,100 @@
+"""Video.title / channel の全文検索インデックス（SQLite FTS5 trigram）
+
+trigram トークナイザのフレーズ検索は大文字小文字を区別しない部分一致になるので、
+icontains と同じ結果をインデックス経由で得られる。3文字未満の語は trigram で
+検索できないため、呼び出し側で icontains にフォールバックする。
+"""
+from django.db import connection
+from django.db.models.expressions import RawSQL
+
+FTS_TABLE = 'videos_video_fts'
+MIN_TERM_LENGTH = 3
+SEARCH_FIELDS = ('title', 'channel')
+
+
+def is_available():
+    return connection.vendor == 'sqlite'
+
+
+def create_index(cursor):
+    cursor.execute(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} "
+        f"USING fts5(title, channel, tokenize='trigram')"
+    )
+
+
+def drop_index(cursor):
+    cursor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+
+def index_videos(videos):
+    """動画をインデックスに登録（既存の行は置き換え）"""
+    if not is_available():
+        return
+    rows = [(video.pk, video.title, video.channel.name) for video in videos]
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f"INSERT OR REPLACE INTO {FTS_TABLE}(rowid, title, channel) VALUES (%s, %s, %s)", rows
+        )
+
+
+def index_queryset(queryset):
+    """クエリセットの動画をインデックスに登録（モデルを生成せずに値だけ読む）"""
+    if not is_available():
+        return
+    rows = queryset.values_list('pk', 'title', 'channel__name')
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f"INSERT OR REPLACE INTO {FTS_TABLE}(rowid, title, channel) VALUES (%s, %s, %s)", list(rows)
+        )
+
+
+def remove_videos(pks):
+    if not is_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [(pk,) for pk in pks])
+
+
+def rebuild_index():
+    """videos_video の全行からインデックスを作り直し、登録件数を返す"""
+    with connection.cursor() as cursor:
+        create_index(cursor)
+        cursor.execute(f"DELETE FROM {FTS_TABLE}")
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE}(rowid, title, channel) "
+            f"SELECT v.id, v.title, c.name FROM videos_video v JOIN videos_channel c ON c.id = v.channel_id"
+        )
+        return cursor.rowcount
+
+
+def build_match_query(**terms):
+    """{'title': 'xxx', ...} からFTS5のMATCH式を組み立てる
+
+    インデックスで検索できない語（空・3文字未満）は対象外とし、
+    (MATCH式またはNone, 残りの条件) を返す。
+    """
+    clauses = []
+    remaining = {}
+    for field, value in terms.items():
+        if not value:
+            continue
+        if field in SEARCH_FIELDS and is_available() and len(value) >= MIN_TERM_LENGTH:
+            phrase = value.replace('"', '""')
+            clauses.append(f'{field}:"{phrase}"')
+        else:
+            remaining[field] = value
+    return (' AND '.join(clauses) or None), remaining
+
+
+def filter_queryset(queryset, match_query, ranked=False):
+    """MATCH式で絞り込む。ranked=True なら bm25 の関連度順に並べる"""
+    queryset = queryset.filter(
+        pk__in=RawSQL(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [match_query])
+    )
+    if ranked:
+        queryset = queryset.annotate(search_rank=RawSQL(
+            f"SELECT rank FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s AND rowid = videos_video.id",
+            [match_query],
+        )).order_by('search_rank', '-date')
+    return queryset
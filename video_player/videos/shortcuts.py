@@ -0,0 +1,27 @@
+"""非同期ビュー用のショートカット（django.shortcuts の非同期版）"""
+from asgiref.sync import sync_to_async
+from django.http import Http404
+from django.shortcuts import render
+
+
+async def aget_object_or_404(queryset, **kwargs):
+    try:
+        return await queryset.aget(**kwargs)
+    except queryset.model.DoesNotExist:
+        raise Http404(f'{queryset.model._meta.object_name} が見つかりません')
+
+
+async def auser(request):
+    """request.auser() の結果を request.user にも入れる
+
+    request.user と request.auser() は別々にユーザーを読み込んでキャッシュするので、
+    非同期ビューから同期のコード（テンプレートなど）を呼ぶ前に揃えておく。
+    """
+    request.user = await request.auser()
+    return request.user
+
+
+async def arender(request, template_name, context=None):
+    """テンプレートは request.user などを遅延評価でDBから読むので、描画はスレッドで行う"""
+    await auser(request)
+    return await sync_to_async(render)(request, template_name, context)
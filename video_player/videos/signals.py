@@ -0,0 +1,37 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import catalogue, search
+from .models import Channel, Video
+
+
+@receiver(post_save, sender=Video)
+def index_saved_video(sender, instance, **kwargs):
+    search.index_videos([instance])
+    catalogue.invalidate()
+
+
+@receiver(post_delete, sender=Video)
+def unindex_deleted_video(sender, instance, **kwargs):
+    search.remove_videos([instance.pk])
+    catalogue.invalidate()
+
+
+@receiver(post_save, sender=Channel)
+@receiver(post_delete, sender=Channel)
+def invalidate_channel_catalogue(sender, **kwargs):
+    catalogue.invalidate()
+
+
+@receiver(post_save, sender=Channel)
+def touch_channel_videos(sender, instance, created, **kwargs):
+    """動画ページにはチャンネル名も描画されるので、名前が変わったら動画の updated_at も進める
+
+    checked などほかの列の変更や、何も変えない保存では ETag を無効にしない。
+    """
+    if not created and instance.name_changed():
+        instance.videos.update(updated_at=timezone.now())
+        # 全文検索インデックスはチャンネル名を文字列で持つので登録し直す
+        search.index_queryset(instance.videos.all())
+    instance._saved_name = instance.name
@@ -1,3 +1,994 @@
-from django.test import TestCase
+import os
+import threading
+import time
+from contextlib import redirect_stdout
+from io import StringIO
+import tempfile
+from datetime import datetime, timezone
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import iscoroutinefunction
+import pandas as pd
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.db import IntegrityError, connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from . import catalogue, pagination, search, views
+from .models import Channel, Video, extract_youtube_id
+from .management.commands.sync_youtube import import_main
+from playlists.models import Playlist, PlaylistVideo
+from video_player import profiling
+from video_player.database import database_config
+
+
+def import_benchmark():
+    """リポジトリ直下の benchmark.py（YouTube API のフェイク）を読み込む"""
+    import_main()  # リポジトリ直下を sys.path に入れる
+    import benchmark
+    return benchmark
+
+
+def make_video(title, channel='フレン・E・ルスタリオ', day=1, **kwargs):
+    return Video.objects.create(
+        title=title,
+        channel=Channel.objects.get_or_create(name=channel)[0],
+        date=datetime(2025, 8, day, tzinfo=timezone.utc),
+        url=kwargs.pop('url', f'https://www.youtube.com/watch?v={title[:11]}'),
+        **kwargs,
+    )
+
+
+class VideoModelTests(TestCase):
+    def test_extract_youtube_id(self):
+        self.assertEqual(extract_youtube_id('https://www.youtube.com/watch?v=EeN5pVtG_9U&t=1'), 'EeN5pVtG_9U')
+        self.assertEqual(extract_youtube_id('https://youtu.be/EeN5pVtG_9U'), 'EeN5pVtG_9U')
+        self.assertEqual(extract_youtube_id('https://example.com/watch?v=x'), '')
+        self.assertEqual(extract_youtube_id('not a url'), '')
+
+    def test_youtube_id_is_stored_on_save_and_unique(self):
+        video = make_video('first', url='https://www.youtube.com/watch?v=EeN5pVtG_9U')
+        self.assertEqual(Video.objects.get(pk=video.pk).youtube_id, 'EeN5pVtG_9U')
+        with self.assertRaises(IntegrityError):
+            make_video('same video', url='https://youtu.be/EeN5pVtG_9U')
+
+    def test_youtube_id_follows_url_changes(self):
+        video = make_video('moved', url='https://www.youtube.com/watch?v=EeN5pVtG_9U')
+        video.url = 'https://youtu.be/aaaaaaaaaaa'
+        video.save()
+        self.assertEqual(Video.objects.get(pk=video.pk).youtube_id, 'aaaaaaaaaaa')
+
+    def test_duplicate_left_without_youtube_id_can_be_saved(self):
+        make_video('original', url='https://www.youtube.com/watch?v=EeN5pVtG_9U')
+        duplicate = make_video('duplicate', url='https://www.youtube.com/watch?v=aaaaaaaaaaa')
+        # 移行 0004 で重複として NULL にされた状態を再現する
+        Video.objects.filter(pk=duplicate.pk).update(url='https://youtu.be/EeN5pVtG_9U', youtube_id=None)
+
+        duplicate = Video.objects.get(pk=duplicate.pk)
+        duplicate.title = 'renamed'
+        duplicate.save()
+        duplicate.url = 'https://www.youtube.com/watch?v=EeN5pVtG_9U&t=3'  # 別の書き方でも使用中の ID
+        duplicate.save()
+        self.assertIsNone(Video.objects.get(pk=duplicate.pk).youtube_id)
+
+        duplicate.url = 'https://youtu.be/bbbbbbbbbbb'
+        duplicate.save()
+        self.assertEqual(Video.objects.get(pk=duplicate.pk).youtube_id, 'bbbbbbbbbbb')
+
+    def test_backfill_youtube_ids(self):
+        make_video('kept', url='https://www.youtube.com/watch?v=aaaaaaaaaaa')
+        channel = Channel.objects.get()
+        date = datetime(2025, 8, 1, tzinfo=timezone.utc)
+        # bulk_create は save() を通らないので youtube_id が空のまま
+        Video.objects.bulk_create([
+            Video(title='b', channel=channel, date=date, url='https://www.youtube.com/watch?v=bbbbbbbbbbb'),
+            Video(title='c', channel=channel, date=date, url='https://youtu.be/ccccccccccc'),
+            Video(title='c again', channel=channel, date=date, url='https://www.youtube.com/watch?v=ccccccccccc'),
+            Video(title='a again', channel=channel, date=date, url='https://youtu.be/aaaaaaaaaaa'),
+            Video(title='other', channel=channel, date=date, url='https://example.com/video'),
+        ])
+
+        stdout = StringIO()
+        call_command('backfill_youtube_ids', batch_size=2, stdout=stdout)
+        self.assertEqual(
+            sorted(Video.objects.values_list('title', 'youtube_id')),
+            [('a again', None), ('b', 'bbbbbbbbbbb'), ('c', 'ccccccccccc'), ('c again', None),
+             ('kept', 'aaaaaaaaaaa'), ('other', None)],
+        )
+        self.assertIn('2 件の動画IDを設定しました。（重複 2 件、ID を取り出せない URL 1 件）', stdout.getvalue())
+
+
+
+class ChannelAutocompleteTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        make_video('a', channel='holostars - VTuber Group', url='https://www.youtube.com/watch?v=aaaaaaaaaaa')
+        make_video('b', channel='Hololive English', url='https://www.youtube.com/watch?v=bbbbbbbbbbb')
+        make_video('c', channel='にじさんじ', url='https://www.youtube.com/watch?v=ccccccccccc')
+        Channel.objects.create(name='Holo without videos')
+
+    def autocomplete(self, q, **params):
+        response = self.client.get(reverse('channel_autocomplete'), {'q': q, **params})
+        return response.json()['channels']
+
+    def test_prefix_match_is_case_insensitive(self):
+        self.assertEqual(self.autocomplete('HOLO'), ['Hololive English', 'holostars - VTuber Group'])
+        self.assertEqual(self.autocomplete('にじ'), ['にじさんじ'])
+        self.assertEqual(self.autocomplete('holo', limit=1), ['Hololive English'])
+        self.assertEqual(self.autocomplete('VTuber'), [])
+
+    def test_catalogue_is_cached_and_invalidated_on_save(self):
+        self.autocomplete('holo')
+        with self.assertNumQueries(0):
+            self.autocomplete('holo')
+
+        make_video('d', channel='Holoearth', url='https://www.youtube.com/watch?v=ddddddddddd')
+        self.assertEqual(self.autocomplete('holoe'), ['Holoearth'])
+
+    def test_search_page_does_not_list_channels(self):
+        response = self.client.get(reverse('video_search'))
+        self.assertNotIn('channels', response.context)
+        self.assertNotContains(response, '<option value="にじさんじ">')
+
+
+class VideoSearchIndexTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.cover = make_video('明日の私に幸あれ / Covered by フレン', day=5)
+        self.monster = make_video('名前のない怪物 歌わせていただきました(Cover)', channel='来栖 夏芽【にじさんじ】', day=3)
+        self.other = make_video('オリジナル曲 MV', channel='Shizuka Rin Official', day=1)
+
+    def search(self, **params):
+        response = self.client.get(reverse('video_search'), params)
+        return list(response.context['page_obj'])
+
+    def test_title_search_matches_icontains(self):
+        self.assertEqual(self.search(title='cover'), [self.cover, self.monster])
+        self.assertEqual(
+            self.search(title='のない怪物'),
+            list(Video.objects.filter(title__icontains='のない怪物').order_by('-date')),
+        )
+
+    def test_short_terms_fall_back_to_icontains(self):
+        match_query, remaining = search.build_match_query(title='MV', channel='にじさんじ')
+        self.assertEqual(match_query, 'channel:"にじさんじ"')
+        self.assertEqual(remaining, {'title': 'MV'})
+        self.assertEqual(self.search(title='MV'), [self.other])
+        self.assertEqual(self.search(channel='来栖'), [self.monster])
+
+    def test_renamed_channel_is_reindexed(self):
+        channel = Channel.objects.get(name='来栖 夏芽【にじさんじ】')
+        channel.name = '来栖夏芽 Ch.'
+        channel.save()
+        self.assertEqual(self.search(channel='来栖夏芽 Ch'), [self.monster])
+        self.assertEqual(self.search(channel='にじさんじ'), [])
+
+    def test_relevance_sort(self):
+        make_video('Cover cover cover', channel='someone', day=2)
+        results = self.search(title='cover', sort='relevance')
+        self.assertEqual(len(results), 3)
+        self.assertEqual(results[0].title, 'Cover cover cover')
+
+    def test_index_follows_save_and_delete(self):
+        self.other.title = 'Beyond the way'
+        self.other.save()
+        self.assertEqual(self.search(title='beyond'), [self.other])
+        self.assertEqual(self.search(title='オリジナル'), [])
+
+        self.cover.delete()
+        self.assertEqual(self.search(title='cover'), [self.monster])
+
+    def test_rebuild_command(self):
+        Video.objects.filter(pk=self.other.pk).update(title='強風オールバック')  # update() は索引を更新しない
+        self.assertEqual(self.search(title='オールバック'), [])
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(self.search(title='オールバック'), [self.other])
+
+
+class ImportCommandTests(TestCase):
+    def write_csv(self, text):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False, encoding='utf-8') as f:
+            f.write(text)
+        self.addCleanup(os.remove, f.name)
+        return f.name
+
+    def test_import_channels_creates_and_updates(self):
+        Channel.objects.create(name='Ayunda Risu Ch. hololive-ID')
+        path = self.write_csv('\ufeffchannel,check,agency\n'
+                              'holostars - VTuber Group,1,ホロライブ\n'
+                              'Ayunda Risu Ch. hololive-ID,1,ホロライブ\n'
+                              'someone,0,個人\n')
+        call_command('import_channels', csv_file=path, stdout=StringIO())
+
+        self.assertEqual(Channel.objects.count(), 3)
+        self.assertQuerySetEqual(
+            Channel.objects.filter(checked=True).order_by('name').values_list('name', 'agency'),
+            [('Ayunda Risu Ch. hololive-ID', 'ホロライブ'), ('holostars - VTuber Group', 'ホロライブ')],
+        )
+
+    def test_import_videos_dedupes_by_youtube_id(self):
+        make_video('existing', url='https://www.youtube.com/watch?v=aaaaaaaaaaa')
+        path = self.write_csv('id,title,channel,date,url,playlist\n'
+                              '1,dup,Ch A,2025-08-05T03:44:27Z,https://youtu.be/aaaaaaaaaaa,List 1\n'
+                              '2,new,Ch A,2025-08-05T03:44:27Z,https://www.youtube.com/watch?v=bbbbbbbbbbb,List 1\n'
+                              '3,new again,Ch A,2025-08-05T03:44:27Z,https://www.youtube.com/watch?v=bbbbbbbbbbb&t=3,\n')
+        call_command('import_videos', csv_file=path, stdout=StringIO(), stderr=StringIO())
+
+        self.assertEqual(
+            sorted(Video.objects.values_list('youtube_id', 'title')),
+            [('aaaaaaaaaaa', 'existing'), ('bbbbbbbbbbb', 'new')],
+        )
+        self.assertEqual(Video.objects.get(youtube_id='bbbbbbbbbbb').channel.name, 'Ch A')
+
+    def test_import_videos_in_small_chunks(self):
+        make_video('existing', url='https://www.youtube.com/watch?v=ccccccccccc')
+        path = self.write_csv('id,title,channel,date,url,playlist\n'
+                              '1,a,Ch A,2025-08-05T03:44:27Z,https://www.youtube.com/watch?v=aaaaaaaaaaa,List 1\n'
+                              '2,b,Ch B,2024/7/8 8:00,https://www.youtube.com/watch?v=bbbbbbbbbbb,List 1\n'
+                              '3,c,Ch A,2025-08-05 03:44:27,https://www.youtube.com/watch?v=ccccccccccc,List 1\n'
+                              '4,a again,Ch A,2025-08-05T03:44:27Z,https://www.youtube.com/watch?v=aaaaaaaaaaa,\n'
+                              '5,bad date,Ch A,yesterday,https://www.youtube.com/watch?v=ddddddddddd,\n'
+                              '6,e,Ch C,2025-08-06T00:00:00Z,https://www.youtube.com/watch?v=eeeeeeeeeee,\n')
+        stdout, stderr = StringIO(), StringIO()
+        call_command('import_videos', csv_file=path, batch_size=2, stdout=stdout, stderr=stderr)
+
+        self.assertEqual(
+            sorted(Video.objects.values_list('youtube_id', 'title')),
+            [('aaaaaaaaaaa', 'a'), ('bbbbbbbbbbb', 'b'), ('ccccccccccc', 'existing'), ('eeeeeeeeeee', 'e')],
+        )
+        self.assertEqual(Video.objects.get(youtube_id='bbbbbbbbbbb').date, datetime(2024, 7, 8, 8, 0, tzinfo=timezone.utc))
+        self.assertIn('3 件の動画をインポートしました', stdout.getvalue())
+        self.assertIn('重複 2 件', stdout.getvalue())
+        self.assertIn('bad date', stderr.getvalue())
+        self.assertEqual(Channel.objects.filter(name__startswith='Ch ').count(), 3)
+
+    def test_imported_videos_are_indexed(self):
+        path = self.write_csv('id,title,channel,date,url,playlist\n'
+                              '1,夜に駆ける covered,Ch A,2025-08-05T03:44:27Z,https://www.youtube.com/watch?v=aaaaaaaaaaa,List 1\n'
+                              '2,シャルル,Ch B,2024/7/8 8:00,https://www.youtube.com/watch?v=bbbbbbbbbbb,\n')
+        call_command('import_videos', csv_file=path, stdout=StringIO())
+
+        self.assertEqual(Video.objects.count(), 2)
+        match_query, _ = search.build_match_query(title='夜に駆ける')
+        self.assertEqual(
+            list(search.filter_queryset(Video.objects.all(), match_query).values_list('title', flat=True)),
+            ['夜に駆ける covered'],
+        )
+
+    def test_import_videos_diff_applies_changes(self):
+        make_video('other source', url='https://www.youtube.com/watch?v=zzzzzzzzzzz')
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        manifest = os.path.join(tmpdir.name, 'manifest.json')
+        header = 'id,title,channel,date,url,playlist\n'
+        a = '1,a,Ch A,2025-08-05T03:44:27Z,https://www.youtube.com/watch?v=aaaaaaaaaaa,List 1\n'
+        b = '2,b,Ch A,2025-08-05T03:44:27Z,https://www.youtube.com/watch?v=bbbbbbbbbbb,List 1\n'
+        c = '3,c,Ch B,2025-08-06T00:00:00Z,https://www.youtube.com/watch?v=ccccccccccc,List 2\n'
+
+        path = self.write_csv(header + a + b)
+        call_command('import_videos', csv_file=path, diff=True, manifest=manifest, stdout=StringIO())
+        self.assertEqual(Video.objects.count(), 3)
+
+        # 同じ内容のファイルなら解析もクエリもしない
+        Path(path).write_text(header + a + b, encoding='utf-8')
+        stdout = StringIO()
+        with self.assertNumQueries(0):
+            call_command('import_videos', csv_file=path, diff=True, manifest=manifest, stdout=stdout)
+        self.assertIn('変わっていません', stdout.getvalue())
+
+        # b のタイトル変更・a の削除・c の追加（id 列の振り直しは変更とみなさない）
+        Path(path).write_text(header + b.replace(',b,', ',b2,').replace('2,', '1,', 1) + c, encoding='utf-8')
+        stdout = StringIO()
+        call_command('import_videos', csv_file=path, diff=True, manifest=manifest, stdout=stdout)
+        self.assertIn('1 件を追加、1 件を更新、1 件を削除しました', stdout.getvalue())
+        self.assertEqual(
+            sorted(Video.objects.values_list('youtube_id', 'title')),
+            [('bbbbbbbbbbb', 'b2'), ('ccccccccccc', 'c'), ('zzzzzzzzzzz', 'other source')],
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT title FROM {search.FTS_TABLE} ORDER BY title')
+            self.assertEqual([title for title, in cursor.fetchall()], ['b2', 'c', 'other source'])
+        self.assertEqual(Video.objects.get(youtube_id='ccccccccccc').channel.name, 'Ch B')
+
+    def test_import_videos_diff_keeps_other_files_and_playlist_videos(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        manifest = os.path.join(tmpdir.name, 'manifest.json')
+        header = 'id,title,channel,date,url,playlist\n'
+        a = '1,a,Ch A,2025-08-05T03:44:27Z,https://www.youtube.com/watch?v=aaaaaaaaaaa,List 1\n'
+        b = '2,b,Ch A,2025-08-05T03:44:27Z,https://www.youtube.com/watch?v=bbbbbbbbbbb,List 1\n'
+        c = '3,c,Ch B,2025-08-06T00:00:00Z,https://www.youtube.com/watch?v=ccccccccccc,List 2\n'
+        path = self.write_csv(header + a + b)
+        call_command('import_videos', csv_file=path, diff=True, manifest=manifest, stdout=StringIO())
+
+        # 別のファイルを取り込んでも、前のファイルの動画は削除しない
+        stdout = StringIO()
+        call_command('import_videos', csv_file=self.write_csv(header + c), diff=True, manifest=manifest, stdout=stdout)
+        self.assertIn('1 件を追加、0 件を更新、0 件を削除しました', stdout.getvalue())
+        self.assertEqual(Video.objects.count(), 3)
+
+        # プレイリストに入っている動画は CSV から消えても削除しない
+        user = User.objects.create_user(username='u', password='pw')
+        playlist = Playlist.objects.create(user=user, name='P')
+        PlaylistVideo.objects.create(playlist=playlist, video=Video.objects.get(youtube_id='aaaaaaaaaaa'))
+        Path(path).write_text(header, encoding='utf-8')
+        stdout = StringIO()
+        call_command('import_videos', csv_file=path, diff=True, manifest=manifest, stdout=stdout)
+        self.assertIn('0 件を追加、0 件を更新、1 件を削除しました', stdout.getvalue())
+        self.assertIn('1 件はプレイリストに入っているため削除しませんでした', stdout.getvalue())
+        self.assertEqual(sorted(Video.objects.values_list('youtube_id', flat=True)), ['aaaaaaaaaaa', 'ccccccccccc'])
+        self.assertEqual(playlist.videos.count(), 1)
+
+        # プレイリストから外れたら次の差分で削除する
+        PlaylistVideo.objects.all().delete()
+        Path(path).write_text(header + '\n', encoding='utf-8')
+        call_command('import_videos', csv_file=path, diff=True, manifest=manifest, stdout=StringIO())
+        self.assertEqual(list(Video.objects.values_list('youtube_id', flat=True)), ['ccccccccccc'])
+
+    def test_sync_youtube_upserts_checked_channels(self):
+        make_video('old title', channel='Ch A', url='https://www.youtube.com/watch?v=aaaaaaaaaaa', playlist='List 1')
+        make_video('same', channel='Ch A', url='https://www.youtube.com/watch?v=ccccccccccc', playlist='List 1', day=5)
+        Channel.objects.filter(name='Ch A').update(checked=True)
+        Channel.objects.create(name='Ch B')
+        playlist = {'title': 'List 2', 'playlist_id': 'PL2', 'video_count': 4}
+        videos = [
+            {'title': 'new title', 'channel': 'Ch A', 'date': '2025-08-01T00:00:00Z',
+             'url': 'https://www.youtube.com/watch?v=aaaaaaaaaaa', 'playlist': 'List 1'},
+            {'title': 'added', 'channel': 'Ch A', 'date': '2025-08-06T00:00:00Z',
+             'url': 'https://www.youtube.com/watch?v=bbbbbbbbbbb', 'playlist': 'List 2'},
+            {'title': 'same', 'channel': 'Ch A', 'date': '2025-08-05T00:00:00Z',
+             'url': 'https://www.youtube.com/watch?v=ccccccccccc', 'playlist': 'List 1'},
+            {'title': 'unchecked', 'channel': 'Ch B', 'date': '2025-08-06T00:00:00Z',
+             'url': 'https://www.youtube.com/watch?v=ddddddddddd', 'playlist': 'List 2'},
+        ]
+        main = import_main()
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        state_file = os.path.join(tmpdir.name, 'state.json')
+        sync_entry = {'etag': 'e', 'item_ids': ['1', '2', '3', '4']}
+        stdout = StringIO()
+        with mock.patch.object(main, 'get_playlists', return_value=[playlist]), \
+                mock.patch.object(main, 'fetch_playlists_concurrently', return_value=[(playlist, videos, sync_entry)]) as fetch:
+            call_command('sync_youtube', state_file=state_file, stdout=stdout)
+            # 項目数が変わっていなければ取得しない
+            call_command('sync_youtube', state_file=state_file, stdout=StringIO())
+
+        self.assertEqual(fetch.call_count, 1)
+        self.assertEqual(
+            sorted(Video.objects.values_list('youtube_id', 'title', 'playlist')),
+            [('aaaaaaaaaaa', 'new title', 'List 1'), ('bbbbbbbbbbb', 'added', 'List 2'), ('ccccccccccc', 'same', 'List 1')],
+        )
+        self.assertIn('1 件を追加、1 件を更新しました', stdout.getvalue())
+        self.assertIn('対象外チャンネル 1 件', stdout.getvalue())
+        self.assertEqual(main.load_sync_state(state_file), {'PL2': sync_entry, '_checked_channels': ['Ch A']})
+
+        # check=1 になったチャンネルの動画は取り込んでいないので、項目数が同じでも全件取得し直す
+        Channel.objects.filter(name='Ch B').update(checked=True)
+        stdout = StringIO()
+        with mock.patch.object(main, 'get_playlists', return_value=[playlist]), \
+                mock.patch.object(main, 'fetch_playlists_concurrently', return_value=[(playlist, videos, sync_entry)]) as fetch:
+            call_command('sync_youtube', state_file=state_file, stdout=stdout)
+            call_command('sync_youtube', state_file=state_file, stdout=StringIO())
+        self.assertEqual(fetch.call_count, 1)
+        self.assertIn('全件を取得し直します', stdout.getvalue())
+        self.assertEqual(Video.objects.get(youtube_id='ddddddddddd').title, 'unchecked')
+        self.assertEqual(main.load_sync_state(state_file)['_checked_channels'], ['Ch A', 'Ch B'])
+
+
+# レスポンスキャッシュを通さずにビュー本体のクエリを確かめる
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}})
+class KeysetPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        channel = Channel.objects.create(name='Ch')
+        # 日付の重複が多い状態で (date, id) の順序が崩れないことを確かめる
+        Video.objects.bulk_create([
+            Video(title=f'video {i}', channel=channel, date=datetime(2025, 8, 1 + i % 7, tzinfo=timezone.utc),
+                  url=f'https://www.youtube.com/watch?v={i:011d}', youtube_id=f'{i:011d}')
+            for i in range(250)
+        ])
+        cls.expected = list(Video.objects.order_by('-date', '-id').values_list('pk', flat=True))
+
+    def get_page(self, **params):
+        response = self.client.get(reverse('video_search'), params)
+        return response.context['page_obj']
+
+    def test_walks_forward_and_backward(self):
+        pages = [self.get_page()]
+        while pages[-1].has_next():
+            pages.append(self.get_page(after=pages[-1].next_cursor))
+        self.assertEqual([len(page) for page in pages], [100, 100, 50])
+        self.assertEqual([video.pk for page in pages for video in page], self.expected)
+        self.assertFalse(pages[0].has_previous())
+
+        back = self.get_page(before=pages[2].previous_cursor)
+        self.assertEqual([video.pk for video in back], [video.pk for video in pages[1]])
+        back = self.get_page(before=back.previous_cursor)
+        self.assertEqual([video.pk for video in back], [video.pk for video in pages[0]])
+        self.assertFalse(back.has_previous())
+
+    def test_deep_pages_cost_the_same_as_the_first(self):
+        cursor = self.get_page(after=self.get_page().next_cursor).next_cursor
+        with self.assertNumQueries(1):
+            self.get_page()
+        with self.assertNumQueries(1):
+            self.get_page(after=cursor)
+
+    def test_legacy_page_number_still_works(self):
+        page = self.get_page(page=2)
+        self.assertEqual(page.number, 2)
+        self.assertEqual([video.pk for video in page], self.expected[100:200])
+
+    def test_estimated_count(self):
+        response = self.client.get(reverse('video_search'), {'estimate': 1})
+        self.assertEqual(response.context['estimated_count'], (250, False))
+        videos = Video.objects.all()
+        self.assertEqual(pagination.estimated_count(videos, cap=100), (100, True))
+
+    def test_json_api(self):
+        url = reverse('video_search_api')
+        data = self.client.get(url, {'per_page': 200, 'estimate': 1}).json()
+        self.assertEqual(len(data['results']), 100)
+        self.assertEqual(data['estimated_count'], 250)
+        self.assertIsNone(data['previous'])
+        self.assertEqual(data['results'][0]['id'], self.expected[0])
+
+        data = self.client.get(url, {'after': data['next']}).json()
+        self.assertEqual([row['id'] for row in data['results']], self.expected[100:200])
+
+        # 1 未満は 1 件として扱う
+        for per_page in (0, -5):
+            response = self.client.get(url, {'per_page': per_page})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual([row['id'] for row in response.json()['results']], self.expected[:1])
+
+    def test_invalid_cursor(self):
+        self.assertEqual(self.client.get(reverse('video_search'), {'after': '!!'}).status_code, 404)
+        self.assertEqual(self.client.get(reverse('video_search_api'), {'after': 'bm9wZQ'}).status_code, 400)
+
+
+class SearchResponseCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        make_video('Cover one', day=1)
+
+    def get(self, **params):
+        return self.client.get(reverse('video_search'), params)
+
+    def test_anonymous_search_is_served_from_cache(self):
+        first = self.get(title='cover', channel='')
+        with self.assertNumQueries(0):
+            second = self.get(channel='', utm_source='x', title='cover')
+        self.assertEqual(second.content, first.content)
+
+        data = self.client.get(reverse('video_search_api'), {'title': 'cover'}).json()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(reverse('video_search_api'), {'title': 'cover'}).json(), data)
+
+    def test_saves_and_imports_bump_the_generation(self):
+        self.get(title='cover')
+        generation = catalogue.generation()
+
+        make_video('Cover two', day=2)
+        self.assertGreater(catalogue.generation(), generation)
+        self.assertEqual(len(self.get(title='cover').context['page_obj']), 2)
+
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False, encoding='utf-8') as f:
+            f.write('title,channel,date,url,playlist\n'
+                    'Cover three,Ch,2025-08-03T00:00:00Z,https://www.youtube.com/watch?v=ccccccccccc,\n')
+        self.addCleanup(os.remove, f.name)
+        call_command('import_videos', csv_file=f.name, stdout=StringIO())
+        self.assertEqual(len(self.get(title='cover').context['page_obj']), 3)
+
+    def test_logged_in_users_are_not_cached(self):
+        self.client.force_login(User.objects.create_user('alice', password='pw'))
+        self.get(title='cover')
+        response = self.get(title='cover')
+        self.assertIsNotNone(response.context)
+
+
+class VideoApiTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.video = make_video('Cover one', channel='Ch', day=1, url='https://youtu.be/aaaaaaaaaaa')
+        make_video('Cover two', channel='Ch', day=2, url='https://youtu.be/bbbbbbbbbbb')
+
+    def test_fields_projection_reads_only_requested_columns(self):
+        with CaptureQueriesContext(connection) as queries:
+            data = self.client.get(reverse('video_search_api'), {'fields': 'title,youtube_id'}).json()
+        self.assertEqual(data['results'][0], {'title': 'Cover two', 'youtube_id': 'bbbbbbbbbbb'})
+        sql = queries[-1]['sql']
+        self.assertNotIn('videos_channel', sql)
+        self.assertNotIn('"url"', sql)
+
+        response = self.client.get(reverse('video_search_api'), {'fields': 'title,secret'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_cursor_works_with_projection(self):
+        url = reverse('video_search_api')
+        data = self.client.get(url, {'fields': 'title', 'per_page': 1}).json()
+        data = self.client.get(url, {'fields': 'title', 'per_page': 1, 'after': data['next']}).json()
+        self.assertEqual(data['results'], [{'title': 'Cover one'}])
+        self.assertIsNone(data['next'])
+
+    def test_detail_etag_and_gzip(self):
+        url = reverse('api_video_detail', args=[self.video.pk])
+        response = self.client.get(url, {'fields': 'id,channel'})
+        self.assertEqual(response.json(), {'id': self.video.pk, 'channel': 'Ch'})
+        response = self.client.get(url, {'fields': 'id,channel'}, headers={'if-none-match': response['ETag']})
+        self.assertEqual(response.status_code, 304)
+
+        response = self.client.get(reverse('video_search_api'), headers={'accept-encoding': 'gzip'})
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(self.client.get(reverse('api_video_detail', args=[0])).status_code, 404)
+
+    def test_list_not_modified_without_searching(self):
+        url = reverse('video_search_api')
+        response = self.client.get(url, {'title': 'Cover'})
+        self.assertIn('Last-Modified', response)
+        with self.assertNumQueries(0):  # 集計はカタログの世代ごとにキャッシュされる
+            response = self.client.get(url, {'title': 'Cover'}, headers={'if-none-match': response['ETag']})
+        self.assertEqual(response.status_code, 304)
+
+        etag = response['ETag']
+        Video.objects.filter(pk=self.video.pk).delete()
+        response = self.client.get(url, {'title': 'Cover'}, headers={'if-none-match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['results']), 1)
+
+    def test_list_rejects_relevance_sort(self):
+        response = self.client.get(reverse('video_search_api'), {'title': 'Cover', 'sort': 'relevance'})
+        self.assertEqual(response.status_code, 400)
+
+
+
+class PlayerConditionalGetTests(TestCase):
+    def setUp(self):
+        self.video = make_video('Cover one', channel='Ch', url='https://youtu.be/aaaaaaaaaaa')
+        self.url = reverse('video_player', args=[self.video.pk])
+
+    def revalidate(self, response):
+        return self.client.get(self.url, headers={'if-none-match': response['ETag']})
+
+    def test_not_modified_until_video_or_channel_changes(self):
+        response = self.client.get(self.url)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.revalidate(response).status_code, 304)
+
+        self.video.title = 'Cover one (short ver.)'
+        self.video.save()
+        self.assertEqual(self.revalidate(response).status_code, 200)
+
+        response = self.client.get(self.url)
+        channel = Channel.objects.get(pk=self.video.channel_id)
+        # 名前以外の変更や何も変えない保存では動画ページを無効にしない
+        channel.checked = True
+        channel.save()
+        channel.save()
+        self.assertEqual(self.revalidate(response).status_code, 304)
+
+        channel.name = 'Ch renamed'
+        channel.save()
+        self.assertEqual(self.revalidate(response).status_code, 200)
+
+    def test_etag_depends_on_user(self):
+        response = self.client.get(self.url)
+        user = User.objects.create_user('alice', password='pw')
+        self.client.force_login(user)
+        self.assertEqual(self.revalidate(response).status_code, 200)
+
+        response = self.client.get(self.url)
+        self.assertEqual(self.revalidate(response).status_code, 304)
+        Playlist.objects.create(user=user, name='new')
+        self.assertEqual(self.revalidate(response).status_code, 200)
+
+    def test_etag_changes_when_csrf_token_is_rotated(self):
+        User.objects.create_user('alice', password='pw')
+        credentials = {'username': 'alice', 'password': 'pw'}
+        self.client.post(reverse('login'), credentials)
+        response = self.client.get(self.url)
+        self.assertNotIn('Last-Modified', response)
+        self.assertEqual(self.revalidate(response).status_code, 304)
+
+        # ログインし直すと CSRF トークンが変わるので、古いページを 304 で使わせない
+        self.client.post(reverse('login'), credentials)
+        self.assertEqual(self.revalidate(response).status_code, 200)
+
+    def test_missing_video_is_404(self):
+        self.assertEqual(self.client.get(reverse('video_player', args=[0])).status_code, 404)
+
+
+class DatabaseSettingsTests(TestCase):
+    def test_sqlite_connection_is_tuned(self):
+        with connection.cursor() as cursor:
+            self.assertEqual(cursor.execute('PRAGMA busy_timeout').fetchone()[0], 5000)
+            self.assertEqual(cursor.execute('PRAGMA synchronous').fetchone()[0], 1)  # NORMAL
+        self.assertEqual(connection.transaction_mode, 'IMMEDIATE')
+
+    def test_database_config_from_env(self):
+        config = database_config(Path('/srv'), env={'SQLITE_BUSY_TIMEOUT': '100', 'CONN_MAX_AGE': '0'})
+        self.assertEqual(config['NAME'], Path('/srv/db.sqlite3'))
+        self.assertIn('PRAGMA journal_mode=WAL', config['OPTIONS']['init_command'])
+        self.assertIn('PRAGMA busy_timeout=100', config['OPTIONS']['init_command'])
+        self.assertEqual(config['CONN_MAX_AGE'], 0)
+
+        config = database_config(Path('/srv'), env={'DATABASE_ENGINE': 'postgresql', 'DATABASE_HOST': 'db'})
+        self.assertEqual(config['ENGINE'], 'django.db.backends.postgresql')
+        self.assertEqual(config['HOST'], 'db')
+        with self.assertRaises(ImproperlyConfigured):
+            database_config(Path('/srv'), env={'DATABASE_ENGINE': 'mysql'})
+
+
+@override_settings(
+    MIDDLEWARE=['video_player.profiling.ProfilingMiddleware', *settings.MIDDLEWARE],
+    PROFILING_SAMPLE_RATE=1.0,
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}},
+)
+class ProfilingMiddlewareTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        make_video('Cover one', channel='Ch')
+        cls.staff = User.objects.create_user('staff', password='pw', is_staff=True)
+
+    def setUp(self):
+        profiling.stats.reset()
+
+    def test_server_timing_counts_queries_of_async_view(self):
+        response = self.client.get(reverse('video_search'))
+        timing = response['Server-Timing']
+        self.assertRegex(timing, r'^app;dur=[\d.]+, db;dur=[\d.]+;desc="1 queries", db-slowest;dur=')
+
+    def test_stats_are_grouped_by_url_name(self):
+        for _ in range(3):
+            self.client.get(reverse('video_search'))
+        self.client.force_login(self.staff)
+        data = self.client.get(reverse('profiling_stats')).json()
+        self.assertEqual(data['views']['video_search']['count'], 3)
+        self.assertEqual(data['views']['video_search']['queries_max'], 1)
+        self.assertIn('videos_video', data['views']['video_search']['slowest_query']['sql'])
+
+    @override_settings(PROFILING_SAMPLE_RATE=0)
+    def test_unsampled_requests_are_not_recorded(self):
+        response = self.client.get(reverse('video_search'))
+        self.assertNotIn('Server-Timing', response)
+        self.assertEqual(profiling.stats.snapshot(), {})
+
+    def test_stats_require_staff(self):
+        response = self.client.get(reverse('profiling_stats'))
+        self.assertEqual(response.status_code, 302)
+
+
+class AsyncViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.video = make_video('Cover one', channel='Ch', url='https://youtu.be/aaaaaaaaaaa')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_views_are_coroutines(self):
+        for view in [views.video_search, views.video_player, views.ajax_add_to_playlist]:
+            self.assertTrue(iscoroutinefunction(view), view)
+
+    async def test_search_and_player_under_async_client(self):
+        response = await self.async_client.get(reverse('video_search'), {'title': 'cover'})
+        self.assertContains(response, 'Cover one')
+        response = await self.async_client.get(reverse('video_search'), {'page': 1})
+        self.assertEqual(response.context['page_obj'].paginator.count, 1)
+
+        url = reverse('video_player', args=[self.video.pk])
+        response = await self.async_client.get(url)
+        self.assertContains(response, 'embed/aaaaaaaaaaa')
+        response = await self.async_client.get(url, headers={'if-none-match': response['ETag']})
+        self.assertEqual(response.status_code, 304)
+        response = await self.async_client.get(reverse('video_player', args=[0]))
+        self.assertEqual(response.status_code, 404)
+
+
+class SyncMetricsTests(SimpleTestCase):
+    def setUp(self):
+        self.main = import_main()
+
+    def test_metered_http_labels_calls_by_api_method(self):
+        http = mock.Mock()
+        http.request.return_value = (mock.Mock(status=200), b'{}')
+        sync_metrics = self.main.SyncMetrics()
+        metered = self.main.MeteredHttp(http, sync_metrics)
+        metered.request('https://youtube.googleapis.com/youtube/v3/playlistItems?part=snippet')
+        metered.request('https://youtube.googleapis.com/youtube/v3/videos/getRating?id=x')
+        metered.request('https://youtube.googleapis.com/youtube/v3/playlists', 'POST')
+        self.assertEqual(
+            dict(sync_metrics.calls), {'playlistItems.list': 1, 'videos.getRating': 1, 'playlists.insert': 1},
+        )
+
+    def test_fetch_records_into_the_given_metrics(self):
+        fake = import_benchmark().FakeYouTube({'PL1': 60})
+        playlist = {'title': 'List 1', 'playlist_id': 'PL1', 'video_count': 60}
+        sync_metrics = self.main.SyncMetrics()
+        self.main.fetch_playlists_concurrently(
+            [playlist], client_factory=lambda: fake, rate_limiter=self.main.TokenBucket(0), sync_metrics=sync_metrics,
+        )
+        report = sync_metrics.report()
+        self.assertEqual(report['rows'], {'parsed': 60})
+        self.assertEqual([p['pages'] for p in report['playlists']], [2])
+        # 計測は実行ごとに作るので、モジュールに共有の計測値は残らない
+        self.assertFalse(hasattr(self.main, 'metrics'))
+
+
+class FetchConcurrencyTests(SimpleTestCase):
+    def setUp(self):
+        self.main = import_main()
+        self.benchmark = import_benchmark()
+
+    def test_token_bucket_waits_for_refill(self):
+        now = [0.0]
+        waits = []
+
+        def sleep(seconds):
+            waits.append(seconds)
+            now[0] += seconds
+
+        bucket = self.main.TokenBucket(2, 2, clock=lambda: now[0], sleep=sleep)
+        for _ in range(5):
+            bucket.acquire()
+        # 最初の2回はバーストで通り、その後は 1/rate 秒ごとに1回
+        self.assertEqual(waits, [0.5, 0.5, 0.5])
+        self.assertEqual(now[0], 1.5)
+
+        unlimited = self.main.TokenBucket(0, sleep=sleep)
+        for _ in range(100):
+            unlimited.acquire()
+        self.assertEqual(len(waits), 3)
+
+    def test_one_client_per_worker_and_input_order(self):
+        benchmark = self.benchmark
+        playlists = benchmark.make_playlists(8, 120)
+        item_counts = {p['playlist_id']: p['video_count'] for p in playlists}
+        delays = {p['playlist_id']: 0.002 * (len(playlists) - i) for i, p in enumerate(playlists)}
+
+        class SlowFirst(benchmark.FakeYouTube):
+            """先に投入したプレイリストほど遅く返す（完了順を入力順と逆にする）"""
+            def page(self, playlist_id, page_token, if_none_match=None):
+                self.threads.add(threading.get_ident())
+                time.sleep(delays.get(playlist_id, 0))
+                return super().page(playlist_id, page_token, if_none_match)
+
+        clients = []
+
+        def client_factory():
+            client = SlowFirst(item_counts)
+            client.threads = set()
+            clients.append(client)
+            return client
+
+        playlists.insert(3, {'title': 'broken', 'playlist_id': 'PLmissing', 'video_count': 1})
+        stdout = StringIO()
+        with redirect_stdout(stdout):
+            results = self.main.fetch_playlists_concurrently(
+                playlists, client_factory=client_factory, max_workers=3, rate_limiter=self.main.TokenBucket(0),
+            )
+
+        self.assertLessEqual(len(clients), 3)
+        for client in clients:
+            self.assertLessEqual(len(client.threads), 1)
+        self.assertEqual(sum(client.calls for client in clients), 8 * 3 + 1)
+        # 失敗したプレイリストは除き、残りは入力順のまま返す
+        self.assertEqual(
+            [playlist['playlist_id'] for playlist, _, _ in results],
+            [p['playlist_id'] for p in playlists if p['playlist_id'] != 'PLmissing'],
+        )
+        self.assertTrue(all(len(videos) == 120 for _, videos, _ in results))
+        self.assertIn('『broken』の取得に失敗しました', stdout.getvalue())
+
+
+class DeltaSyncTests(SimpleTestCase):
+    """fetch_playlist_items の差分取得（先頭ページの ETag と取得済み playlistItem ID）"""
+
+    def setUp(self):
+        self.main = import_main()
+        self.benchmark = import_benchmark()
+        self.fake = self.benchmark.FakeYouTube({'PL1': 120})
+        self.videos, self.entry = self.fetch()
+        self.fake.calls = 0
+
+    def fetch(self, count=None, sync_entry=None, youtube=None):
+        count = self.fake.item_counts['PL1'] if count is None else count
+        playlist = {'title': 'List 1', 'playlist_id': 'PL1', 'video_count': count}
+        return self.main.fetch_playlist_items(youtube or self.fake, playlist, sync_entry=sync_entry)
+
+    def test_not_modified(self):
+        videos, entry = self.fetch(sync_entry=self.entry)
+        self.assertEqual(videos, [])
+        self.assertIs(entry, self.entry)
+        self.assertEqual(self.fake.calls, 1)
+
+    def test_unchanged_etag_without_304(self):
+        class IgnoresIfNoneMatch(self.benchmark.FakeYouTube):
+            def page(self, playlist_id, page_token, if_none_match=None):
+                return super().page(playlist_id, page_token)
+
+        youtube = IgnoresIfNoneMatch({'PL1': 120})
+        videos, entry = self.fetch(sync_entry=self.entry, youtube=youtube)
+        # 先頭ページがすべて既知なら残りのページは読まない
+        self.assertEqual(videos, [])
+        self.assertEqual(youtube.calls, 1)
+        self.assertEqual(entry['etag'], self.entry['etag'])
+        self.assertEqual(sorted(entry['item_ids']), sorted(self.entry['item_ids']))
+
+    def test_grown_playlist_fetches_only_new_items(self):
+        self.fake.item_counts['PL1'] = 130
+        videos, entry = self.fetch(sync_entry=self.entry)
+        self.assertEqual([video['title'] for video in videos], [f'video {i}' for i in reversed(range(120, 130))])
+        self.assertEqual(self.fake.calls, 1)
+        self.assertEqual(len(entry['item_ids']), 130)
+        self.assertEqual(set(entry['item_ids']), {f'PL1-item-{i}' for i in range(130)})
+        self.assertNotEqual(entry['etag'], self.entry['etag'])
+
+    def test_shrunk_playlist_stores_exactly_the_remaining_items(self):
+        self.fake.item_counts['PL1'] = 100
+        videos, entry = self.fetch(sync_entry=self.entry)
+        self.assertEqual(videos, [])
+        self.assertEqual(self.fake.calls, 2)  # 削除された項目を知るため全ページを読む
+        self.assertEqual(sorted(entry['item_ids']), sorted(f'PL1-item-{i}' for i in range(100)))
+
+    def test_reordered_items_are_not_fetched_again(self):
+        class Reordered(self.benchmark.FakeYouTube):
+            """同じ項目を古い順に返す（並べ替えで ETag だけが変わるので 304 にはならない）"""
+            def page(self, playlist_id, page_token, if_none_match=None):
+                response = super().page(playlist_id, page_token)
+                response['etag'] += '-reordered'
+                for item in response['items']:
+                    i = int(item['id'].rsplit('-', 1)[1])
+                    item['id'] = f'{playlist_id}-item-{self.item_counts[playlist_id] - 1 - i}'
+                return response
+
+        youtube = Reordered({'PL1': 120})
+        videos, entry = self.fetch(sync_entry=self.entry, youtube=youtube)
+        self.assertEqual(videos, [])
+        self.assertEqual(youtube.calls, 1)
+        self.assertEqual(entry['etag'], self.entry['etag'] + '-reordered')
+        self.assertEqual(sorted(entry['item_ids']), sorted(self.entry['item_ids']))
+
+
+class DedupeIndexTests(SimpleTestCase):
+    """DEDUPE_INDEX_DB を使った main-data への追記"""
+
+    def setUp(self):
+        self.main = import_main()
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        for name, value in {
+            'MAIN_DATA_CSV': os.path.join(tmpdir.name, 'main-data.csv'),
+            'PLAYLISTS_CSV': os.path.join(tmpdir.name, 'playlists.csv'),
+            'MAIN_DATA_STORE': None,
+            'DEDUPE_INDEX_DB': os.path.join(tmpdir.name, 'dedupe.sqlite3'),
+        }.items():
+            patcher = mock.patch.object(self.main, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def video(self, video_id, day, playlist):
+        return {'title': f'title {video_id}', 'channel': 'Ch', 'date': f'2025-08-{day:02d}T00:00:00Z',
+                'url': f'https://www.youtube.com/watch?v={video_id}', 'playlist': playlist}
+
+    def save(self, *results):
+        stdout = StringIO()
+        with redirect_stdout(stdout):
+            self.main.save_sync_results([
+                ({'title': title, 'playlist_id': f'PL{title}', 'video_count': len(videos)}, videos, {'item_ids': []})
+                for title, videos in results
+            ])
+        return stdout.getvalue()
+
+    def rows(self):
+        df = self.main.load_main_data()
+        return list(zip(df['id'], df['url'].str.rsplit('=', n=1).str[1]))
+
+    def test_append_keeps_ids_and_inserts_by_date(self):
+        self.save(('A', [self.video('a', 1, 'A'), self.video('c', 3, 'A')]))
+        self.assertEqual(self.rows(), [(2, 'c'), (1, 'a')])
+
+        self.save(('A', [self.video('d', 4, 'A'), self.video('b', 2, 'A'), self.video('a', 1, 'A')]))
+        # 既存の行の id は変えず、新しい行は日付の位置に挿入する
+        self.assertEqual(self.rows(), [(3, 'd'), (2, 'c'), (4, 'b'), (1, 'a')])
+
+    def test_duplicates_across_playlists_are_written_once(self):
+        output = self.save(
+            ('A', [self.video('a', 1, 'A'), self.video('b', 2, 'A')]),
+            ('B', [self.video('b', 2, 'B'), self.video('c', 3, 'B'), self.video('c', 3, 'B')]),
+        )
+        self.assertEqual(self.rows(), [(3, 'c'), (2, 'b'), (1, 'a')])
+        # プレイリストごとの件数は重複を除いたあとの件数
+        self.assertIn('『A』の動画データを追記しました（2件）', output)
+        self.assertIn('『B』の動画データを追記しました（1件）', output)
+        self.assertIn('合計 3 件を書き込みました', output)
+
+        output = self.save(('A', [self.video('a', 1, 'A')]), ('B', [self.video('d', 4, 'B')]))
+        self.assertIn('『A』の動画データを追記しました（0件）', output)
+        self.assertIn('『B』の動画データを追記しました（1件）', output)
+        self.assertEqual(len(self.rows()), 4)
+
+    def test_merge_sorted_puts_existing_rows_first_on_equal_dates(self):
+        dates = pd.to_datetime(['2025-08-03', '2025-08-02', '2025-08-01'], utc=True)
+        existing = pd.DataFrame({'id': [1, 2, 3], 'date': dates})
+        new = pd.DataFrame({'id': [4, 5, 6], 'date': pd.to_datetime(['2025-08-02', '2025-08-04', '2025-07-31'], utc=True)})
+        self.assertEqual(list(self.main.merge_sorted(existing, new)['id']), [5, 1, 2, 4, 3, 6])
+
+
+class MainUtilityTests(SimpleTestCase):
+    def setUp(self):
+        self.main = import_main()
+
+    def test_normalize_playlist_ids_matches_scalar_version(self):
+        pids = pd.Series([
+            'https://www.youtube.com/playlist?list=PLabc',
+            'PLbare',
+            'https://www.youtube.com/watch?v=x&list=PLwatch&index=2',
+            'https://x?list=PLone&list=PLtwo',
+            'https://www.youtube.com/playlist?list=',
+            float('nan'),
+            5,
+        ], index=range(10, 17))
+        normalized = self.main.normalize_playlist_ids(pids)
+        self.assertEqual(list(normalized.index), list(pids.index))
+        self.assertEqual(
+            normalized.tolist()[:5], ['PLabc', 'PLbare', 'PLwatch&index=2', 'PLone&', ''],
+        )
+        self.assertEqual(normalized.tolist()[5:], pids.tolist()[5:])
+        self.assertEqual(normalized.tolist()[:5], pids.apply(self.main.normalize_playlist_id).tolist()[:5])
+
+    def test_legacy_local_dates_round_trip_as_utc(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        path = os.path.join(tmpdir.name, 'main-data.csv')
+        Path(path).write_text(
+            'id,title,channel,date,url,playlist\n'
+            '1,a,Ch,2025-08-05T03:44:27Z,https://www.youtube.com/watch?v=a,List\n'
+            '2,b,Ch,2024/7/8 8:00,https://www.youtube.com/watch?v=b,List\n'
+            '3,c,Ch,2024-07-08 08:00:00,https://www.youtube.com/watch?v=c,List\n',
+            encoding='utf-8',
+        )
+        with mock.patch.object(self.main, 'MAIN_DATA_CSV', path), mock.patch.object(self.main, 'MAIN_DATA_STORE', None):
+            for _ in range(2):  # 書き戻した値を読み直しても変わらない
+                self.main.save_main_data(self.main.load_main_data())
+                # タイムゾーンのない旧形式は日本時間として UTC に変換する
+                self.assertEqual(
+                    pd.read_csv(path)['date'].tolist(),
+                    ['2025-08-05T03:44:27Z', '2024-07-07T23:00:00Z', '2024-07-07T23:00:00Z'],
+                )
+
+
+class ApiCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.main = import_main()
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.cache_dir = tmpdir.name
+
+    def store(self, uri, now):
+        http = mock.Mock()
+        http.request.return_value = (self.main.httplib2.Response({'status': 200}), b'{"etag": "e"}')
+        caching = self.main.CachingHttp(self.cache_dir, ttl=60, http=http, clock=lambda: now)
+        caching.request(uri)
+        return caching.path(uri)
+
+    def test_prune_and_load_use_stored_at(self):
+        old = self.store('https://youtube.googleapis.com/youtube/v3/playlists?page=1', now=0)
+        fresh = self.store('https://youtube.googleapis.com/youtube/v3/playlists?page=2', now=100)
+        # コピーや touch で mtime が逆転しても、期限は保存時刻で判定する
+        os.utime(old, (200, 200))
+        os.utime(fresh, (0, 0))
+        Path(self.cache_dir, 'broken.json').write_text('{', encoding='utf-8')
+
+        reader = self.main.CachingHttp(self.cache_dir, ttl=60, http=mock.Mock(), clock=lambda: 120)
+        self.assertIsNone(reader.load(old))
+        self.assertIsNotNone(reader.load(fresh))
+
+        self.assertEqual(self.main.prune_api_cache(self.cache_dir, ttl=60, clock=lambda: 120), 2)
+        self.assertEqual(os.listdir(self.cache_dir), [os.path.basename(fresh)])
@@ -1,9 +1,12 @@
 from django.urls import path
-from . import views
+from . import api, views
 
 urlpatterns = [
     path('', views.video_search, name='search'),
     path('search/', views.video_search, name='video_search'),
+    path('api/search/', api.video_list, name='video_search_api'),
+    path('api/videos/<int:pk>/', api.video_detail, name='api_video_detail'),
     path('video/<int:pk>/', views.video_player, name='video_player'),
     path('video/<int:pk>/add/', views.ajax_add_to_playlist, name='ajax_add_to_playlist'),
+    path('channels/autocomplete/', views.channel_autocomplete, name='channel_autocomplete'),
 ]
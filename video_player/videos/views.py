@@ -1,70 +1,126 @@
 from .models import Video
+from . import catalogue, pagination, search
+from .conditional import conditional_view, latest, user_state
+from .response_cache import cache_anonymous
+from .shortcuts import aget_object_or_404, arender, auser
+from asgiref.sync import sync_to_async
 from django.core.paginator import Paginator
 from django.db.models import Q
-from django.shortcuts import render, get_object_or_404
-from django.http import JsonResponse
+from django.http import Http404, JsonResponse
 from django.contrib.auth.decorators import login_required
-from playlists.models import Playlist, PlaylistVideo
+from playlists.models import Playlist, PlaylistVideo, atouch_playlist
+from playlists import ordering
 from django.views.decorators.http import require_POST
-from django.db import models
 
 
-def video_player(request, pk):
-    video = get_object_or_404(Video, pk=pk)
-    user_playlists = []
-    if request.user.is_authenticated:
-        user_playlists = Playlist.objects.filter(user=request.user)
-    return render(request, 'videos/player.html', {
+def video_player_validators(request, pk):
+    updated_at = Video.objects.filter(pk=pk).values_list('updated_at', flat=True).first()
+    if updated_at is None:
+        return None
+    user = user_state(request)
+    return (pk, updated_at, user), latest(updated_at, user[2])
+
+
+async def get_user_playlists(request):
+    user = await auser(request)
+    if not user.is_authenticated:
+        return []
+    return [playlist async for playlist in Playlist.objects.filter(user=user)]
+
+
+@conditional_view(video_player_validators)
+async def video_player(request, pk):
+    video = await aget_object_or_404(Video.objects.select_related('channel'), pk=pk)
+    return await arender(request, 'videos/player.html', {
         'video': video,
-        'user_playlists': user_playlists,
+        'user_playlists': await get_user_playlists(request),
     })
 
 
-def video_search(request):
+PER_PAGE = 100
+
+
+def build_search_queryset(params):
+    """検索条件から (クエリセット, 関連度順か) を組み立てる"""
     query = Q()
-    title = request.GET.get('title', '')
-    channel = request.GET.get('channel', '')
-    start_date = request.GET.get('start_date', '')
-    end_date = request.GET.get('end_date', '')
+    title = params.get('title', '')
+    channel = params.get('channel', '')
+    start_date = params.get('start_date', '')
+    end_date = params.get('end_date', '')
 
-    if title:
+    # 3文字以上のタイトル・チャンネル条件は全文検索インデックスで絞り込む
+    match_query, remaining = search.build_match_query(title=title, channel=channel)
+    if remaining.get('title'):
         query &= Q(title__icontains=title)
-    if channel:
-        query &= Q(channel__icontains=channel)
+    if remaining.get('channel'):
+        query &= Q(channel__name__icontains=channel)
     if start_date:
         query &= Q(date__gte=start_date)
     if end_date:
         query &= Q(date__lte=end_date)
 
-    videos = Video.objects.filter(query).order_by('-date')
-    paginator = Paginator(videos, 100)
-    page_number = request.GET.get("page")
-    page_obj = paginator.get_page(page_number)
+    ranked = bool(match_query) and params.get('sort') == 'relevance'
+    videos = Video.objects.filter(query).order_by('-date', '-id')
+    if match_query:
+        videos = search.filter_queryset(videos, match_query, ranked=ranked)
+    return videos, ranked
+
 
-    channels = Video.objects.values_list('channel', flat=True).distinct()
+def get_numbered_page(videos, number):
+    """Paginator は非同期に対応していないので、ページの中身まで読んでから返す"""
+    page = Paginator(videos, PER_PAGE).get_page(number)
+    page.object_list = list(page.object_list)
+    return page
 
-    user_playlists = []
-    if request.user.is_authenticated:
-        user_playlists = Playlist.objects.filter(user=request.user)
 
-    return render(request, 'videos/search.html', {
+async def paginate_search(request, videos, ranked):
+    """page 指定・関連度順は従来のページ番号方式、それ以外は (date, id) のキーセット方式"""
+    if ranked or 'page' in request.GET:
+        return await sync_to_async(get_numbered_page)(videos, request.GET.get('page'))
+    try:
+        return await pagination.apaginate(
+            videos, after=request.GET.get('after'), before=request.GET.get('before'), per_page=PER_PAGE
+        )
+    except pagination.InvalidCursor:
+        raise Http404('不正なカーソルです')
+
+
+@cache_anonymous('search')
+async def video_search(request):
+    videos, ranked = build_search_queryset(request.GET)
+    page_obj = await paginate_search(request, videos.select_related('channel'), ranked)
+
+    count = None
+    if request.GET.get('estimate'):
+        count = await pagination.aestimated_count(videos)
+
+    return await arender(request, 'videos/search.html', {
         'page_obj': page_obj,
-        'channels': channels,
-        'user_playlists': user_playlists,
+        'estimated_count': count,
+        'user_playlists': await get_user_playlists(request),
     })
 
 
+def channel_autocomplete(request):
+    """チャンネル名の前方一致候補をJSONで返す"""
+    try:
+        limit = min(int(request.GET.get('limit', 20)), 100)
+    except ValueError:
+        limit = 20
+    return JsonResponse({'channels': catalogue.match_prefix(request.GET.get('q', ''), limit)})
+
+
 @login_required
 @require_POST
-def ajax_add_to_playlist(request, pk):
+async def ajax_add_to_playlist(request, pk):
     playlist_id = request.POST.get('playlist_id')
-    video = get_object_or_404(Video, pk=pk)
-    playlist = get_object_or_404(Playlist, pk=playlist_id, user=request.user)
+    video = await aget_object_or_404(Video.objects.all(), pk=pk)
+    playlist = await aget_object_or_404(Playlist.objects.all(), pk=playlist_id, user=await auser(request))
 
-    if PlaylistVideo.objects.filter(playlist=playlist, video=video).exists():
+    if await PlaylistVideo.objects.filter(playlist=playlist, video=video).aexists():
         return JsonResponse({'success': False, 'message': 'この動画はすでにプレイリストに追加されています。'})
 
-    max_order = playlist.videos.aggregate(max_order=models.Max('order'))['max_order'] or 0
-    PlaylistVideo.objects.create(playlist=playlist, video=video, order=max_order + 1)
+    await PlaylistVideo.objects.acreate(playlist=playlist, video=video, order=await ordering.anext_order(playlist))
+    await atouch_playlist(playlist.pk)
 
     return JsonResponse({'success': True, 'message': f'動画「{video.title}」をプレイリスト「{playlist.name}」に追加しました。'})